@@ -8,7 +8,7 @@ import sys
 import logging
 import argparse
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Set
 from dotenv import load_dotenv
 import sqlite3
 
@@ -42,6 +42,7 @@ class GmailBankClassifier:
         
         self.dry_run = dry_run
         self.db_path = os.getenv('DATABASE_PATH', './gmail_classifier.db')
+        self._conn = None
         
         # Inicializar componentes
         logger.info("Inicializando componentes...")
@@ -53,9 +54,27 @@ class GmailBankClassifier:
         
         logger.info("Clasificador inicializado correctamente")
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """Conexión persistente a la BD, abierta la primera vez que se usa"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path)
+            # WAL: las escrituras no bloquean lecturas y cada commit no
+            # fuerza un fsync del archivo principal
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA temp_store=MEMORY')
+            self._conn.execute('PRAGMA cache_size=-20000')
+        return self._conn
+
+    def close(self):
+        """Cierra la conexión a la BD"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
     def _init_database(self):
         """Inicializa la base de datos SQLite"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -84,7 +103,6 @@ class GmailBankClassifier:
         ''')
         
         conn.commit()
-        conn.close()
         logger.info("Base de datos inicializada")
     
     def process_emails(self, max_emails: int = 50):
@@ -110,10 +128,14 @@ class GmailBankClassifier:
         urgent_emails = []
         normal_emails = []
         low_emails = []
+        classified = []
+        
+        # Una sola consulta para saber cuáles ya fueron procesados
+        processed_ids = self._get_processed_ids([email['id'] for email in emails])
         
         for email in emails:
             # Verificar si ya fue procesado
-            if self._is_processed(email['id']):
+            if email['id'] in processed_ids:
                 logger.info(f"Email {email['id']} ya procesado, saltando...")
                 continue
             
@@ -131,8 +153,7 @@ class GmailBankClassifier:
                 **classification
             }
             
-            # Guardar en BD
-            self._save_processed_email(email_data)
+            classified.append(email_data)
             
             # Categorizar por prioridad
             if classification['priority'] == 'urgent':
@@ -142,6 +163,9 @@ class GmailBankClassifier:
             else:
                 low_emails.append(email_data)
         
+        # Guardar todos en una sola transacción
+        self._save_processed_emails(classified)
+        
         # Enviar notificaciones de urgentes inmediatamente
         if urgent_emails and not self.dry_run:
             logger.info(f"Enviando notificación de {len(urgent_emails)} correos urgentes")
@@ -166,7 +190,7 @@ class GmailBankClassifier:
         logger.info("Generando resumen diario...")
         
         # Obtener estadísticas del día
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         today = datetime.now().date()
@@ -209,7 +233,6 @@ class GmailBankClassifier:
             for row in cursor.fetchall()
         ]
         
-        conn.close()
         
         # Preparar resumen
         summary_data = {
@@ -226,7 +249,6 @@ class GmailBankClassifier:
             
             if success:
                 # Registrar envío
-                conn = sqlite3.connect(self.db_path)
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR REPLACE INTO daily_summaries 
@@ -241,44 +263,55 @@ class GmailBankClassifier:
                     datetime.now()
                 ))
                 conn.commit()
-                conn.close()
                 logger.info("Resumen diario enviado correctamente")
             else:
                 logger.error("Error al enviar resumen diario")
         else:
             logger.info("Modo dry-run o sin correos para resumir")
     
-    def _is_processed(self, email_id: str) -> bool:
-        """Verifica si un correo ya fue procesado"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1 FROM processed_emails WHERE email_id = ?', (email_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+    def _get_processed_ids(self, email_ids: List[str]) -> Set[str]:
+        """Retorna cuáles de email_ids ya fueron procesados"""
+        conn = self._get_connection()
+        processed = set()
+        # Pocos parámetros por consulta: SQLite antiguos limitan a 999
+        for start in range(0, len(email_ids), 500):
+            chunk = email_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'SELECT email_id FROM processed_emails WHERE email_id IN ({placeholders})',
+                chunk
+            )
+            processed.update(row[0] for row in cursor)
+        return processed
     
     def _save_processed_email(self, email_data: Dict):
         """Guarda un correo procesado en la BD"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO processed_emails
-            (email_id, subject, sender, category, priority, summary, amount, processed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            email_data['id'],
-            email_data['subject'],
-            email_data['sender'],
-            email_data['category'],
-            email_data['priority'],
-            email_data['summary'],
-            email_data.get('amount'),
-            datetime.now()
-        ))
-        
-        conn.commit()
-        conn.close()
+        self._save_processed_emails([email_data])
+    
+    def _save_processed_emails(self, emails: List[Dict]):
+        """Guarda varios correos procesados con un solo commit"""
+        if not emails:
+            return
+        now = datetime.now()
+        conn = self._get_connection()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO processed_emails
+                (email_id, subject, sender, category, priority, summary, amount, processed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (
+                    email_data['id'],
+                    email_data['subject'],
+                    email_data['sender'],
+                    email_data['category'],
+                    email_data['priority'],
+                    email_data['summary'],
+                    email_data.get('amount'),
+                    now
+                )
+                for email_data in emails
+            ])
     
     def _get_sample_emails(self) -> List[Dict]:
         """Genera correos de ejemplo para testing"""
@@ -337,8 +370,7 @@ class GmailBankClassifier:
         # Test Base de datos
         print("\n3. Probando base de datos...")
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.close()
+            self._get_connection().execute('SELECT 1')
             print(f"   ✅ Base de datos OK - {self.db_path}")
         except Exception as e:
             print(f"   ❌ Error con BD: {e}")
@@ -356,6 +388,7 @@ def main():
     
     args = parser.parse_args()
     
+    classifier = None
     try:
         classifier = GmailBankClassifier(dry_run=args.dry_run)
         
@@ -372,6 +405,10 @@ def main():
     except Exception as e:
         logger.error(f"Error fatal: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        # La conexión a SQLite se cierra también tras un error o Ctrl+C
+        if classifier is not None:
+            classifier.close()
 
 
 if __name__ == '__main__':
@@ -3,23 +3,128 @@ Clasificador especializado para correos bancarios
 Identifica prioridades y extrae montos de transacciones
 """
 
+import asyncio
+import logging
 import re
-from typing import Dict, Optional, List
+from typing import Dict, FrozenSet, Optional, List, Tuple
 
 from ..core.interfaces import EmailClassifier, AIProvider
 from ..core.models import EmailClassification
 from ..config import ClassifierConfig
-from ..utils import RequestsHttpClient
+from ..providers.cache import DEFAULT_CACHE_TTL, ResponseCache
+from ..utils import KeywordMatcher, clean_text, get_shared_http_client
+
+logger = logging.getLogger(__name__)
+
+# Caracteres del cuerpo que se envían al LLM
+MAX_BODY_CHARS = 1000
+# Caracteres del cuerpo original que se limpian: margen para el HTML que se
+# descarta sin procesar cuerpos arbitrariamente largos
+MAX_RAW_BODY_CHARS = 4 * MAX_BODY_CHARS
+MAX_SUBJECT_CHARS = 200
+
+# Instrucciones fijas al inicio y datos del correo al final: todas las
+# peticiones comparten el mismo prefijo, que los proveedores con caché de
+# prompts (OpenAI, Groq, Gemini...) reutilizan entre llamadas
+CLASSIFICATION_PROMPT_PREFIX = """Eres un asistente que clasifica correos bancarios en español.
+
+Analiza el correo que aparece al final y responde SOLO con un JSON (sin explicaciones adicionales).
+
+Clasifica el correo en:
+
+1. CATEGORÍA (elige una):
+   - "pago": Pagos que debo hacer, cargos, domiciliaciones
+   - "transferencia": Transferencias recibidas o realizadas
+   - "estado_cuenta": Estados de cuenta, resúmenes
+   - "movimiento": Movimientos, retiros, depósitos
+   - "promocion": Promociones, ofertas, publicidad
+   - "notificacion": Notificaciones generales del banco
+   - "otro": Otros
+
+2. PRIORIDAD (elige una):
+   - "urgente": Requiere acción inmediata (pagos pendientes, verificaciones)
+   - "normal": Informativo importante (movimientos, transferencias)
+   - "sin_prioridad": No requiere acción (promociones, newsletter)
+
+3. RESUMEN: Una línea describiendo el correo. Si es un pago o transferencia,
+   menciona el monto así: "Pago de $X en [lugar]" o "Transferencia de $X"
+
+4. CONFIANZA: Número entre 0 y 1 que indica qué tan seguro estás de la
+   clasificación
+
+Responde EXACTAMENTE en este formato JSON:
+{
+  "category": "categoria_aqui",
+  "priority": "prioridad_aqui",
+  "summary": "resumen_aqui",
+  "action_required": true/false,
+  "confidence": 0.0-1.0
+}
+
+"""
+
+# Única parte que cambia entre correos; solo esta se formatea en cada llamada
+CLASSIFICATION_PROMPT_EMAIL = """Correo:
+Remitente: {sender}
+Asunto: {subject}
+Cuerpo: {body}"""
+
+
+# Categoría de respaldo cuando el LLM falla; gana la primera que coincide
+FALLBACK_CATEGORY_KEYWORDS = (
+    ('pago', ('pago', 'cargo', 'compra')),
+    ('transferencia', ('transferencia', 'depósito')),
+    ('estado_cuenta', ('estado de cuenta', 'resumen')),
+    ('promocion', ('promoción', 'oferta', 'descuento')),
+)
+
+# Grupos de prioridad en el KeywordMatcher
+_URGENT = 'urgente'
+_LOW_PRIORITY = 'sin_prioridad'
+_PROMO_SENDER = 'promo_sender'
+
+
+def _compile_any(patterns) -> Optional[re.Pattern]:
+    """
+    Une los patrones en una alternación que indica si alguno aparece
+
+    Retorna None si no hay patrones o no se pueden combinar (p.ej. flags
+    en línea), en cuyo caso no se usa el filtro previo.
+    """
+    if not patterns:
+        return None
+    try:
+        return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def _parse_confidence(value) -> Optional[float]:
+    """Confianza del LLM acotada a [0, 1]; None si falta o no es un número"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
 
 
 class BankEmailClassifier(EmailClassifier):
     """Clasificador especializado para correos bancarios"""
 
+    # Remitentes típicos de publicidad (parte antes de la @)
+    PROMO_SENDER_PREFIXES = ('promociones@', 'promocion@', 'promo@', 'ofertas@',
+                             'newsletter@', 'marketing@', 'publicidad@')
+
     def __init__(
         self,
         config: ClassifierConfig = None,
         ai_provider: AIProvider = None,
-        http_client=None
+        http_client=None,
+        fast_path: bool = True,
+        cache_size: int = 1024,
+        cache_path: Optional[str] = None,
+        cache_ttl: Optional[float] = DEFAULT_CACHE_TTL
     ):
         """
         Inicializa el clasificador
@@ -28,10 +133,23 @@ class BankEmailClassifier(EmailClassifier):
             config: Configuración del clasificador (keywords, patterns)
             ai_provider: Proveedor de IA para clasificación
             http_client: Cliente HTTP (para modo legacy Ollama directo)
+            fast_path: Clasificar sin LLM los correos promocionales evidentes
+            cache_size: Respuestas del LLM a recordar por correo (0 la desactiva)
+            cache_path: Archivo donde persistir la caché entre ejecuciones
+                (se carga aquí y se guarda con save_cache)
+            cache_ttl: Segundos de vigencia de cada respuesta cacheada, también
+                entre ejecuciones (None = sin vencimiento)
         """
         self.config = config or ClassifierConfig()
         self.ai_provider = ai_provider
-        self.http_client = http_client or RequestsHttpClient()
+        self.http_client = http_client or get_shared_http_client()
+        self.fast_path = fast_path
+        # Respuestas del LLM por (remitente, asunto, cuerpo): las plantillas
+        # repetidas no vuelven a consultar al proveedor
+        self._cache = ResponseCache(cache_size, ttl=cache_ttl)
+        self.cache_path = cache_path
+        if cache_path:
+            self._cache.load(cache_path)
 
         # Cargar patrones y keywords desde config
         self.amount_patterns = self.config.amount_patterns
@@ -39,16 +157,34 @@ class BankEmailClassifier(EmailClassifier):
         self.payment_keywords = self.config.payment_keywords
         self.low_priority_keywords = self.config.low_priority_keywords
 
+        # Compilar una sola vez; las keywords de prioridad y de categoría se
+        # buscan juntas en una sola pasada por el texto
+        self._amount_regexes = [re.compile(p, re.IGNORECASE) for p in self.amount_patterns]
+        self._any_amount_re = _compile_any(self.amount_patterns)
+        self._keywords = KeywordMatcher({
+            _URGENT: self.urgent_keywords,
+            _LOW_PRIORITY: self.low_priority_keywords,
+            **dict(FALLBACK_CATEGORY_KEYWORDS),
+        })
+
         # Cargar listas de remitentes por prioridad
         self.low_priority_senders = [s.lower() for s in (self.config.low_priority_senders or [])]
         self.high_priority_senders = [s.lower() for s in (self.config.high_priority_senders or [])]
+        self._senders = KeywordMatcher({
+            _URGENT: self.high_priority_senders,
+            _LOW_PRIORITY: self.low_priority_senders,
+            _PROMO_SENDER: self.PROMO_SENDER_PREFIXES,
+        })
 
     @classmethod
-    def with_provider_manager(cls, provider_manager, config: ClassifierConfig = None):
+    def with_provider_manager(cls, provider_manager, config: ClassifierConfig = None,
+                              cache_path: Optional[str] = None,
+                              cache_ttl: Optional[float] = DEFAULT_CACHE_TTL):
         """
         Factory method para crear clasificador con provider manager.
         """
-        return cls(config=config, ai_provider=provider_manager)
+        return cls(config=config, ai_provider=provider_manager,
+                   cache_path=cache_path, cache_ttl=cache_ttl)
 
     @classmethod
     def with_ollama(cls, host: str = "http://localhost:11434",
@@ -61,6 +197,19 @@ class BankEmailClassifier(EmailClassifier):
         provider = OllamaProvider(host=host, model=model)
         return cls(config=config, ai_provider=provider)
 
+    def clear_cache(self):
+        """Vacía la caché de respuestas del LLM"""
+        self._cache.clear()
+
+    def save_cache(self):
+        """Guarda la caché de respuestas en cache_path (si se configuró)"""
+        if not self.cache_path:
+            return
+        try:
+            self._cache.save(self.cache_path)
+        except OSError as e:
+            logger.warning("No se pudo guardar la caché de clasificaciones: %s", e)
+
     def extract_amount(self, text: str) -> Optional[str]:
         """
         Extrae el monto de una transacción del texto
@@ -71,10 +220,15 @@ class BankEmailClassifier(EmailClassifier):
         Returns:
             Monto encontrado o None
         """
-        for pattern in self.amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                amount = matches[0].strip()
+        # La mayoría de correos no trae montos: una sola pasada lo descarta
+        if self._any_amount_re is not None and not self._any_amount_re.search(text):
+            return None
+
+        # Los patrones se prueban en orden: el primero que encuentra gana
+        for regex in self._amount_regexes:
+            match = regex.search(text)
+            if match:
+                amount = (match.group(1) if regex.groups else match.group(0)).strip()
                 if not amount.startswith('$'):
                     amount = f"${amount}"
                 return amount
@@ -91,14 +245,12 @@ class BankEmailClassifier(EmailClassifier):
         Returns:
             'urgente', 'sin_prioridad', o None si no hay coincidencia
         """
-        sender_lower = sender.lower()
+        matched = self._senders.find(sender.lower())
 
-        # Primero verificar remitentes de alta prioridad
-        if any(s in sender_lower for s in self.high_priority_senders):
+        # Los remitentes de alta prioridad ganan sobre los de baja
+        if _URGENT in matched:
             return 'urgente'
-
-        # Luego verificar remitentes de baja prioridad
-        if any(s in sender_lower for s in self.low_priority_senders):
+        if _LOW_PRIORITY in matched:
             return 'sin_prioridad'
 
         return None
@@ -115,22 +267,40 @@ class BankEmailClassifier(EmailClassifier):
         Returns:
             'urgente', 'normal', o 'sin_prioridad'
         """
+        return self._priority_from_text(f"{subject} {body}".lower(), sender)
+
+    def _priority_from_text(self, text: str, sender: str = "",
+                            matched: Optional[FrozenSet[str]] = None) -> str:
+        """
+        Igual que detect_priority_by_keywords sobre el texto ya en minúsculas
+
+        matched permite reutilizar los grupos ya encontrados en text.
+        """
         # Primero verificar por remitente (tiene prioridad sobre keywords)
         sender_priority = self.detect_priority_by_sender(sender)
         if sender_priority:
             return sender_priority
 
-        text = f"{subject} {body}".lower()
-
-        if any(keyword in text for keyword in self.urgent_keywords):
+        if matched is None:
+            matched = self._keywords.find(text)
+        if _URGENT in matched:
             return 'urgente'
-
-        if any(keyword in text for keyword in self.low_priority_keywords):
+        if _LOW_PRIORITY in matched:
             return 'sin_prioridad'
 
         return 'normal'
 
-    def classify_with_llm(self, subject: str, body: str, sender: str = "") -> Dict:
+    def _build_prompt(self, subject: str, body: str, sender: str = "") -> str:
+        """Construye el prompt de clasificación para un correo"""
+        # Sin HTML ni espacios repetidos caben más datos útiles en el límite
+        return CLASSIFICATION_PROMPT_PREFIX + CLASSIFICATION_PROMPT_EMAIL.format(
+            sender=sender,
+            subject=subject[:MAX_SUBJECT_CHARS],
+            body=clean_text(body[:MAX_RAW_BODY_CHARS])[:MAX_BODY_CHARS]
+        )
+
+    def classify_with_llm(self, subject: str, body: str, sender: str = "",
+                          text_lower: Optional[str] = None) -> Dict:
         """
         Clasifica un correo usando el proveedor de IA configurado
 
@@ -138,73 +308,142 @@ class BankEmailClassifier(EmailClassifier):
             subject: Asunto del correo
             body: Cuerpo del correo (primeros 1000 caracteres)
             sender: Remitente del correo
+            text_lower: Asunto y cuerpo ya en minúsculas, si se tienen
 
         Returns:
             Diccionario con clasificación del LLM
         """
-        body_truncated = body[:1000] if len(body) > 1000 else body
+        prompt = self._build_prompt(subject, body, sender)
+
+        try:
+            if self.ai_provider:
+                result = self._cache.get(prompt)
+                if result is None:
+                    result = self.ai_provider.generate(prompt)
+                    self._cache.put(prompt, result)
+                return result
+            else:
+                return self._fallback_classification(subject, body, sender, text_lower)
 
-        prompt = f"""Eres un asistente que clasifica correos bancarios en español.
+        except Exception as e:
+            logger.warning("Error clasificando con LLM: %s", e)
+            return self._fallback_classification(subject, body, sender, text_lower)
 
-Analiza este correo y responde SOLO con un JSON (sin explicaciones adicionales):
+    async def classify_with_llm_async(self, subject: str, body: str, sender: str = "",
+                                      text_lower: Optional[str] = None) -> Dict:
+        """Versión asíncrona de classify_with_llm"""
+        if not self.ai_provider:
+            return self._fallback_classification(subject, body, sender, text_lower)
 
-Remitente: {sender}
-Asunto: {subject}
-Cuerpo: {body_truncated}
+        prompt = self._build_prompt(subject, body, sender)
+        result = self._cache.get(prompt)
+        if result is not None:
+            return result
 
-Clasifica el correo en:
+        try:
+            result = await self.ai_provider.generate_async(prompt)
+        except Exception as e:
+            logger.warning("Error clasificando con LLM: %s", e)
+            return self._fallback_classification(subject, body, sender, text_lower)
 
-1. CATEGORÍA (elige una):
-   - "pago": Pagos que debo hacer, cargos, domiciliaciones
-   - "transferencia": Transferencias recibidas o realizadas
-   - "estado_cuenta": Estados de cuenta, resúmenes
-   - "movimiento": Movimientos, retiros, depósitos
-   - "promocion": Promociones, ofertas, publicidad
-   - "notificacion": Notificaciones generales del banco
-   - "otro": Otros
+        self._cache.put(prompt, result)
+        return result
 
-2. PRIORIDAD (elige una):
-   - "urgente": Requiere acción inmediata (pagos pendientes, verificaciones)
-   - "normal": Informativo importante (movimientos, transferencias)
-   - "sin_prioridad": No requiere acción (promociones, newsletter)
+    def _fast_classify(self, subject: str, body: str, sender: str = "",
+                       text_lower: Optional[str] = None) -> Optional[Dict]:
+        """
+        Clasifica sin LLM los correos promocionales evidentes
 
-3. RESUMEN: Una línea describiendo el correo. Si es un pago o transferencia,
-   menciona el monto así: "Pago de $X en [lugar]" o "Transferencia de $X"
+        Requiere que coincidan tanto el remitente (lista de baja prioridad o
+        dirección tipo promociones@) como una keyword de baja prioridad.
 
-Responde EXACTAMENTE en este formato JSON:
-{{
-  "category": "categoria_aqui",
-  "priority": "prioridad_aqui",
-  "summary": "resumen_aqui",
-  "action_required": true/false
-}}"""
+        Returns:
+            Diccionario con la clasificación o None si hay que consultar al LLM
+        """
+        if not self.fast_path or not self.low_priority_keywords:
+            return None
+
+        sender_matched = self._senders.find(sender.lower())
+        # Los remitentes de alta prioridad siempre pasan por el LLM
+        if _URGENT in sender_matched:
+            return None
+        if _LOW_PRIORITY not in sender_matched and _PROMO_SENDER not in sender_matched:
+            return None
+
+        if text_lower is None:
+            text_lower = f"{subject} {body}".lower()
+        matched = self._keywords.find(text_lower)
+        if _URGENT in matched or _LOW_PRIORITY not in matched:
+            return None
+
+        # Coinciden remitente y keyword: la regla es tan fiable como el LLM
+        return {
+            'category': 'promocion',
+            'priority': 'sin_prioridad',
+            'summary': subject[:100],
+            'action_required': False,
+            'confidence': 1.0
+        }
 
-        try:
-            if self.ai_provider:
-                return self.ai_provider.generate(prompt)
-            else:
-                return self._fallback_classification(subject, body, sender)
+    def classify_batch_with_llm(self, emails: List[Tuple[str, str, str]]) -> List[Dict]:
+        """
+        Clasifica varios correos con una sola llamada al proveedor de IA
+
+        Si la respuesta en lote falla o no corresponde con los correos,
+        clasifica cada correo por separado.
+
+        Args:
+            emails: Lista de (asunto, cuerpo, remitente)
+
+        Returns:
+            Lista de diccionarios con la clasificación del LLM, en orden
+        """
+        if not self.ai_provider:
+            return [self._fallback_classification(*email) for email in emails]
+
+        prompts = [self._build_prompt(*email) for email in emails]
+        results = [self._cache.get(prompt) for prompt in prompts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        # Correos de una misma plantilla comparten clave de caché: se envía
+        # un solo prompt por clave y la respuesta se copia a los demás
+        groups: Dict[bytes, List[int]] = {}
+        for i in missing:
+            groups.setdefault(self._cache.make_key(prompts[i]), []).append(i)
+        unique = [indexes[0] for indexes in groups.values()]
 
+        try:
+            batch = self.ai_provider.generate_batch([prompts[i] for i in unique])
+            if len(batch) == len(unique):
+                for indexes, result in zip(groups.values(), batch):
+                    self._cache.put(prompts[indexes[0]], result)
+                    results[indexes[0]] = result
+                    for i in indexes[1:]:
+                        results[i] = dict(result)
+                return results
+            logger.warning("Respuesta en lote incompleta, clasificando uno por uno")
         except Exception as e:
-            print(f"Error clasificando con LLM: {e}")
-            return self._fallback_classification(subject, body, sender)
+            logger.warning("Error clasificando en lote con LLM: %s", e)
 
-    def _fallback_classification(self, subject: str, body: str, sender: str = "") -> Dict:
-        """Clasificación de respaldo cuando el LLM falla"""
-        text_lower = f"{subject} {body}".lower()
+        return [
+            result if result is not None else self.classify_with_llm(*email)
+            for result, email in zip(results, emails)
+        ]
 
-        if any(kw in text_lower for kw in ['pago', 'cargo', 'compra']):
-            category = 'pago'
-        elif any(kw in text_lower for kw in ['transferencia', 'depósito']):
-            category = 'transferencia'
-        elif any(kw in text_lower for kw in ['estado de cuenta', 'resumen']):
-            category = 'estado_cuenta'
-        elif any(kw in text_lower for kw in ['promoción', 'oferta', 'descuento']):
-            category = 'promocion'
-        else:
-            category = 'notificacion'
+    def _fallback_classification(self, subject: str, body: str, sender: str = "",
+                                 text_lower: Optional[str] = None) -> Dict:
+        """Clasificación de respaldo cuando el LLM falla"""
+        if text_lower is None:
+            text_lower = f"{subject} {body}".lower()
+        matched = self._keywords.find(text_lower)
 
-        priority = self.detect_priority_by_keywords(subject, body, sender)
+        category = next(
+            (name for name, _ in FALLBACK_CATEGORY_KEYWORDS if name in matched),
+            'notificacion'
+        )
+        priority = self._priority_from_text(text_lower, sender, matched)
 
         return {
             'category': category,
@@ -225,17 +464,91 @@ Responde EXACTAMENTE en este formato JSON:
         Returns:
             EmailClassification con toda la información
         """
-        llm_result = self.classify_with_llm(subject, body, sender)
+        # El texto combinado se arma y se pasa a minúsculas una sola vez
+        text = f"{subject} {body}"
+        text_lower = text.lower()
+
+        llm_result = self._fast_classify(subject, body, sender, text_lower)
+        if llm_result is None:
+            llm_result = self.classify_with_llm(subject, body, sender, text_lower)
+        return self._build_classification(subject, body, llm_result, text)
+
+    def classify_batch(self, emails: List[Tuple[str, str, str]],
+                       batch_size: int = 8) -> List[EmailClassification]:
+        """
+        Clasifica varios correos enviando hasta batch_size por llamada al LLM
+
+        Args:
+            emails: Lista de (asunto, cuerpo, remitente)
+            batch_size: Correos por llamada al proveedor de IA
+
+        Returns:
+            Lista de EmailClassification en el mismo orden
+        """
+        texts = [f"{subject} {body}" for subject, body, _ in emails]
+        fast_results = [
+            self._fast_classify(*email, text.lower())
+            for email, text in zip(emails, texts)
+        ]
+        pending = [email for email, result in zip(emails, fast_results) if result is None]
+
+        llm_results = []
+        for start in range(0, len(pending), batch_size):
+            llm_results.extend(self.classify_batch_with_llm(pending[start:start + batch_size]))
+
+        remaining = iter(llm_results)
+        return [
+            self._build_classification(
+                subject, body, result if result is not None else next(remaining), text
+            )
+            for (subject, body, _), result, text in zip(emails, fast_results, texts)
+        ]
+
+    async def classify_many(self, emails: List[Tuple[str, str, str]],
+                            concurrency: int = 4) -> List[EmailClassification]:
+        """
+        Clasifica varios correos con llamadas concurrentes al LLM
+
+        Mientras un correo espera la respuesta de red se lanzan los demás,
+        hasta concurrency llamadas a la vez.
+
+        Args:
+            emails: Lista de (asunto, cuerpo, remitente)
+            concurrency: Máximo de llamadas simultáneas al proveedor de IA
+
+        Returns:
+            Lista de EmailClassification en el mismo orden
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def classify_one(subject: str, body: str, sender: str) -> EmailClassification:
+            text = f"{subject} {body}"
+            text_lower = text.lower()
+
+            llm_result = self._fast_classify(subject, body, sender, text_lower)
+            if llm_result is None:
+                async with semaphore:
+                    llm_result = await self.classify_with_llm_async(
+                        subject, body, sender, text_lower
+                    )
+            return self._build_classification(subject, body, llm_result, text)
+
+        return list(await asyncio.gather(*(classify_one(*email) for email in emails)))
 
-        full_text = f"{subject} {body}"
-        amount = self.extract_amount(full_text)
+    def _build_classification(self, subject: str, body: str, llm_result: Dict,
+                              text: Optional[str] = None) -> EmailClassification:
+        """Combina la respuesta del LLM con el monto extraído del texto"""
+        if text is None:
+            text = f"{subject} {body}"
+        amount = self.extract_amount(text)
 
         return EmailClassification(
             category=llm_result.get('category', 'otro'),
             priority=llm_result.get('priority', 'normal'),
             summary=llm_result.get('summary', subject),
             amount=amount,
-            action_required=llm_result.get('action_required', False)
+            action_required=llm_result.get('action_required', False),
+            confidence=_parse_confidence(llm_result.get('confidence'))
         )
 
 
@@ -16,6 +16,7 @@ from .settings import (
     AIProviderConfig,
     AppConfig,
     load_config_from_env,
+    get_app_config,
     load_classification_rules,
 )
 
@@ -33,5 +34,6 @@ __all__ = [
     "AIProviderConfig",
     "AppConfig",
     "load_config_from_env",
+    "get_app_config",
     "load_classification_rules",
 ]
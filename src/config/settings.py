@@ -3,54 +3,79 @@ Configuración centralizada para el sistema de clasificación de correos.
 Permite inyectar configuración en tests sin depender de variables de entorno.
 """
 
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Sequence, Tuple
 import os
+import sys
 from pathlib import Path
 
 import yaml
 
+# Loader de libyaml (C) si está disponible; el de Python puro si no
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-@dataclass
+# Las configuraciones son inmutables; dataclass(slots=True) solo existe
+# desde Python 3.10
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(frozen=True, **_SLOTS)
 class OllamaConfig:
     """Configuración para Ollama local"""
     host: str = "http://localhost:11434"
     model: str = "llama3.2"
+    # Máximo de tokens a generar; la clasificación es un JSON corto
+    num_predict: int = 512
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class GroqConfig:
     """Configuración para Groq API"""
     api_key: str = ""
     model: str = "mixtral-8x7b-32768"
     base_url: str = "https://api.groq.com/openai/v1"
+    # Límite de peticiones por minuto (None = el del plan gratuito)
+    requests_per_minute: Optional[int] = None
+    # Bytes a partir de los cuales el cuerpo va comprimido con gzip (None = nunca)
+    compress_threshold: Optional[int] = None
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class CerebrasConfig:
     """Configuración para Cerebras API"""
     api_key: str = ""
     model: str = "llama3.1-8b"
     base_url: str = "https://api.cerebras.ai/v1"
+    # Límite de peticiones por minuto (None = el del plan gratuito)
+    requests_per_minute: Optional[int] = None
+    # Bytes a partir de los cuales el cuerpo va comprimido con gzip (None = nunca)
+    compress_threshold: Optional[int] = None
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class GeminiConfig:
     """Configuración para Google Gemini API"""
     api_key: str = ""
     model: str = "gemini-1.5-flash"
     base_url: str = "https://generativelanguage.googleapis.com/v1beta"
+    # Límite de peticiones por minuto (None = el del plan gratuito)
+    requests_per_minute: Optional[int] = None
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class OpenRouterConfig:
     """Configuración para OpenRouter API"""
     api_key: str = ""
     model: str = "meta-llama/llama-3.2-3b-instruct:free"
     base_url: str = "https://openrouter.ai/api/v1"
+    # Límite de peticiones por minuto (None = el del plan gratuito)
+    requests_per_minute: Optional[int] = None
+    # Bytes a partir de los cuales el cuerpo va comprimido con gzip (None = nunca)
+    compress_threshold: Optional[int] = None
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class TelegramConfig:
     """Configuración para Telegram"""
     bot_token: str = ""
@@ -58,12 +83,12 @@ class TelegramConfig:
     api_url: str = "https://api.telegram.org"
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class GmailConfig:
     """Configuración para Gmail API"""
     credentials_path: str = "./config/credentials.json"
     token_path: str = "./config/token.json"
-    scopes: List[str] = field(default_factory=lambda: ['https://www.googleapis.com/auth/gmail.modify'])
+    scopes: Sequence[str] = ('https://www.googleapis.com/auth/gmail.modify',)
     # Modo headless: 'auto', 'browser', 'manual', 'token_env'
     # - auto: intenta browser, si falla usa manual
     # - browser: usa navegador local (requiere GUI)
@@ -72,13 +97,13 @@ class GmailConfig:
     auth_mode: str = "auto"
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class DatabaseConfig:
     """Configuración para base de datos"""
     path: str = "./data/emails.db"
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class ScheduleConfig:
     """Configuración de modo de ejecución"""
     # Modo: 'hourly' o 'daily'
@@ -89,6 +114,9 @@ class ScheduleConfig:
     check_interval_hours: int = 2
     # Minutos extra para cubrir delays
     check_buffer_minutes: int = 1
+    # Si es mayor que 0, el proceso queda corriendo y repite la revisión
+    # cada N minutos en lugar de salir (0 = una sola ejecución, p.ej. cron)
+    daemon_interval_minutes: int = 0
 
 
 def _get_default_rules_path() -> str:
@@ -96,38 +124,63 @@ def _get_default_rules_path() -> str:
     return str(Path(__file__).parent.parent.parent / "config" / "classification_rules.yaml")
 
 
-def load_classification_rules(rules_path: str = None) -> dict:
+# Reglas ya leídas: ruta absoluta -> (mtime del archivo, reglas)
+_rules_cache: Dict[str, Tuple[float, Mapping]] = {}
+
+
+def load_classification_rules(rules_path: str = None) -> Mapping:
     """
     Carga las reglas de clasificación desde un archivo YAML.
 
+    El resultado se cachea por ruta y solo se vuelve a leer si el archivo
+    cambia (según su mtime). Es de solo lectura porque se comparte entre
+    todas las configuraciones.
+
     Args:
         rules_path: Ruta al archivo YAML. Si es None, usa la ruta por defecto.
 
     Returns:
-        Diccionario con las reglas de clasificación
+        Diccionario (de solo lectura) con las reglas de clasificación
     """
     if rules_path is None:
         rules_path = _get_default_rules_path()
 
-    path = Path(rules_path)
+    path = Path(rules_path).resolve()
+    key = str(path)
 
-    if not path.exists():
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
         print(f"Archivo de reglas no encontrado: {rules_path}")
         print("Usando reglas por defecto.")
-        return {}
+        return MappingProxyType({})
+
+    cached = _rules_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
     try:
         with open(path, 'r', encoding='utf-8') as f:
-            rules = yaml.safe_load(f)
-            return rules if rules else {}
+            rules = yaml.load(f, Loader=_YAML_LOADER)
     except Exception as e:
         print(f"Error cargando reglas desde {rules_path}: {e}")
         print("Usando reglas por defecto.")
-        return {}
-
-
-# Valores por defecto (usados si el archivo YAML no existe o hay errores)
-_DEFAULT_URGENT_KEYWORDS = [
+        return MappingProxyType({})
+
+    if not isinstance(rules, dict):
+        rules = {}
+    # Las listas de reglas se guardan como tuplas: el resultado se comparte
+    rules = MappingProxyType({
+        name: tuple(value) if isinstance(value, list) else value
+        for name, value in rules.items()
+    })
+    _rules_cache[key] = (mtime, rules)
+    return rules
+
+
+# Valores por defecto (usados si el archivo YAML no existe o hay errores).
+# Son tuplas: todas las configuraciones comparten la misma instancia
+_DEFAULT_URGENT_KEYWORDS = (
     'pago pendiente',
     'pago vencido',
     'acción requerida',
@@ -143,9 +196,9 @@ _DEFAULT_URGENT_KEYWORDS = [
     'saldo insuficiente',
     'cuenta bloqueada',
     'suspensión',
-]
+)
 
-_DEFAULT_PAYMENT_KEYWORDS = [
+_DEFAULT_PAYMENT_KEYWORDS = (
     'pago',
     'cargo',
     'compra',
@@ -155,9 +208,9 @@ _DEFAULT_PAYMENT_KEYWORDS = [
     'comisión',
     'intereses',
     'domiciliación',
-]
+)
 
-_DEFAULT_LOW_PRIORITY_KEYWORDS = [
+_DEFAULT_LOW_PRIORITY_KEYWORDS = (
     'promoción',
     'oferta',
     'descuento',
@@ -171,53 +224,74 @@ _DEFAULT_LOW_PRIORITY_KEYWORDS = [
     'evento',
     'encuesta',
     'noticia',
-]
+)
 
-_DEFAULT_AMOUNT_PATTERNS = [
+_DEFAULT_AMOUNT_PATTERNS = (
     r'\$\s*[\d,]+\.?\d{0,2}',
     r'[\d,]+\.?\d{0,2}\s*(?:pesos|MXN|USD|EUR|COP)',
     r'(?:total|monto|importe|cantidad|cargo):\s*\$?\s*[\d,]+\.?\d{0,2}',
-]
+)
+
+
+def _rule(value: Sequence[str], rules: Mapping, key: str,
+          default: Sequence[str] = ()) -> Tuple[str, ...]:
+    """Valor explícito, el del YAML o el default, como tupla inmutable"""
+    return tuple(value or rules.get(key, default) or ())
 
 
-@dataclass
+def _keywords(keywords: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Keywords en minúsculas, sin espacios sobrantes, internadas y sin
+    duplicados ni vacías (se conserva el orden)
+
+    Se comparan contra texto ya en minúsculas, así que se normalizan una vez
+    al cargar y no en cada correo.
+    """
+    normalized = (k.lower().strip() for k in keywords)
+    return tuple(dict.fromkeys(sys.intern(k) for k in normalized if k))
+
+
+# Reglas de ClassifierConfig: (campo, valor por defecto, normalizar como keywords).
+# Los patrones son regex y no se pasan a minúsculas; los remitentes solo
+# vienen del YAML
+_CLASSIFIER_RULES = (
+    ('urgent_keywords', _DEFAULT_URGENT_KEYWORDS, True),
+    ('payment_keywords', _DEFAULT_PAYMENT_KEYWORDS, True),
+    ('low_priority_keywords', _DEFAULT_LOW_PRIORITY_KEYWORDS, True),
+    ('amount_patterns', _DEFAULT_AMOUNT_PATTERNS, False),
+    ('low_priority_senders', (), True),
+    ('high_priority_senders', (), True),
+)
+
+
+@dataclass(frozen=True, **_SLOTS)
 class ClassifierConfig:
     """Configuración para el clasificador de correos"""
     # Ruta al archivo YAML de reglas (None = usar ruta por defecto)
     rules_path: Optional[str] = None
 
     # Keywords y patrones (se cargan desde YAML o usan defaults)
-    urgent_keywords: List[str] = field(default_factory=list)
-    payment_keywords: List[str] = field(default_factory=list)
-    low_priority_keywords: List[str] = field(default_factory=list)
-    amount_patterns: List[str] = field(default_factory=list)
+    urgent_keywords: Sequence[str] = ()
+    payment_keywords: Sequence[str] = ()
+    low_priority_keywords: Sequence[str] = ()
+    amount_patterns: Sequence[str] = ()
 
     # Remitentes por prioridad (nuevo desde YAML)
-    low_priority_senders: List[str] = field(default_factory=list)
-    high_priority_senders: List[str] = field(default_factory=list)
+    low_priority_senders: Sequence[str] = ()
+    high_priority_senders: Sequence[str] = ()
 
     def __post_init__(self):
         """Carga las reglas desde YAML después de inicializar"""
         rules = load_classification_rules(self.rules_path)
 
-        # Cargar desde YAML o usar defaults
-        if not self.urgent_keywords:
-            self.urgent_keywords = rules.get('urgent_keywords', _DEFAULT_URGENT_KEYWORDS)
-        if not self.payment_keywords:
-            self.payment_keywords = rules.get('payment_keywords', _DEFAULT_PAYMENT_KEYWORDS)
-        if not self.low_priority_keywords:
-            self.low_priority_keywords = rules.get('low_priority_keywords', _DEFAULT_LOW_PRIORITY_KEYWORDS)
-        if not self.amount_patterns:
-            self.amount_patterns = rules.get('amount_patterns', _DEFAULT_AMOUNT_PATTERNS)
-
-        # Remitentes (solo desde YAML, vacío por defecto)
-        if not self.low_priority_senders:
-            self.low_priority_senders = rules.get('low_priority_senders', [])
-        if not self.high_priority_senders:
-            self.high_priority_senders = rules.get('high_priority_senders', [])
+        # Cargar desde YAML o usar defaults. La instancia es inmutable, así
+        # que los valores finales se asignan con object.__setattr__
+        for name, default, normalize in _CLASSIFIER_RULES:
+            value = _rule(getattr(self, name), rules, name, default)
+            object.__setattr__(self, name, _keywords(value) if normalize else value)
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class AIProviderConfig:
     """Configuración general de proveedores de IA"""
     provider_type: str = "ollama"  # 'ollama', 'api', 'auto'
@@ -228,7 +302,7 @@ class AIProviderConfig:
     openrouter: OpenRouterConfig = field(default_factory=OpenRouterConfig)
 
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class AppConfig:
     """Configuración completa de la aplicación"""
     ai_provider: AIProviderConfig = field(default_factory=AIProviderConfig)
@@ -239,53 +313,125 @@ class AppConfig:
     schedule: ScheduleConfig = field(default_factory=ScheduleConfig)
 
 
-def load_config_from_env() -> AppConfig:
+# Proveedores remotos: (campo en AIProviderConfig, clase de config, prefijo en .env)
+API_PROVIDER_SPECS = (
+    ('groq', GroqConfig, 'GROQ'),
+    ('cerebras', CerebrasConfig, 'CEREBRAS'),
+    ('gemini', GeminiConfig, 'GEMINI'),
+    ('openrouter', OpenRouterConfig, 'OPENROUTER'),
+)
+
+
+def _load_api_provider_configs(environ: Mapping[str, str]) -> dict:
+    """Construye la config de cada proveedor remoto desde las variables de entorno"""
+    configs = {}
+    for field_name, config_class, prefix in API_PROVIDER_SPECS:
+        rpm = environ.get(f'{prefix}_RPM')
+        # Con slots el atributo de clase ya no guarda el valor por defecto
+        defaults = {f.name: f.default for f in fields(config_class)}
+        kwargs = {}
+        # Solo los proveedores compatibles con OpenAI admiten gzip
+        if 'compress_threshold' in defaults:
+            threshold = environ.get(f'{prefix}_COMPRESS_THRESHOLD')
+            kwargs['compress_threshold'] = int(threshold) if threshold else None
+        configs[field_name] = config_class(
+            api_key=environ.get(f'{prefix}_API_KEY', ''),
+            model=environ.get(f'{prefix}_MODEL', defaults['model']),
+            requests_per_minute=int(rpm) if rpm else None,
+            **kwargs,
+        )
+    return configs
+
+
+# Último .env cargado: (ruta, mtime)
+_dotenv_loaded: Optional[Tuple[str, float]] = None
+
+
+def _load_dotenv_if_changed():
+    """
+    Carga el .env en os.environ solo si cambió desde la última carga.
+
+    Sin override, las variables ya definidas en el entorno no se tocan, así
+    que volver a leer un archivo sin cambios no aporta nada.
+    """
+    global _dotenv_loaded
+    from dotenv import find_dotenv, load_dotenv
+
+    path = find_dotenv()
+    if not path:
+        return
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return
+    if _dotenv_loaded == (path, mtime):
+        return
+    load_dotenv(path, override=False)
+    _dotenv_loaded = (path, mtime)
+
+
+def load_config_from_env(environ: Optional[Mapping[str, str]] = None) -> AppConfig:
     """
     Carga la configuración desde variables de entorno.
     Útil para producción, pero en tests se puede crear AppConfig directamente.
+
+    Args:
+        environ: Variables a usar en lugar del entorno del proceso (no se
+            lee el .env). Por defecto se toma una copia de os.environ.
     """
-    from dotenv import load_dotenv
-    load_dotenv()
+    if environ is None:
+        _load_dotenv_if_changed()
+        # Una sola copia: cada lectura es una búsqueda en un dict, sin
+        # codificar y decodificar en os.environ
+        environ = dict(os.environ)
 
     return AppConfig(
         ai_provider=AIProviderConfig(
-            provider_type=os.getenv('AI_PROVIDER', 'ollama'),
+            provider_type=environ.get('AI_PROVIDER', 'ollama'),
             ollama=OllamaConfig(
-                host=os.getenv('OLLAMA_HOST', 'http://localhost:11434'),
-                model=os.getenv('OLLAMA_MODEL', 'llama3.2'),
-            ),
-            groq=GroqConfig(
-                api_key=os.getenv('GROQ_API_KEY', ''),
-                model=os.getenv('GROQ_MODEL', 'mixtral-8x7b-32768'),
-            ),
-            cerebras=CerebrasConfig(
-                api_key=os.getenv('CEREBRAS_API_KEY', ''),
-                model=os.getenv('CEREBRAS_MODEL', 'llama3.1-8b'),
-            ),
-            gemini=GeminiConfig(
-                api_key=os.getenv('GEMINI_API_KEY', ''),
-                model=os.getenv('GEMINI_MODEL', 'gemini-1.5-flash'),
-            ),
-            openrouter=OpenRouterConfig(
-                api_key=os.getenv('OPENROUTER_API_KEY', ''),
-                model=os.getenv('OPENROUTER_MODEL', 'meta-llama/llama-3.2-3b-instruct:free'),
+                host=environ.get('OLLAMA_HOST', 'http://localhost:11434'),
+                model=environ.get('OLLAMA_MODEL', 'llama3.2'),
+                num_predict=int(environ.get('OLLAMA_NUM_PREDICT', '512')),
             ),
+            **_load_api_provider_configs(environ),
         ),
         telegram=TelegramConfig(
-            bot_token=os.getenv('TELEGRAM_BOT_TOKEN', ''),
-            chat_id=os.getenv('TELEGRAM_CHAT_ID', ''),
+            bot_token=environ.get('TELEGRAM_BOT_TOKEN', ''),
+            chat_id=environ.get('TELEGRAM_CHAT_ID', ''),
         ),
         gmail=GmailConfig(
-            credentials_path=os.getenv('GMAIL_CREDENTIALS_PATH', './config/credentials.json'),
-            token_path=os.getenv('GMAIL_TOKEN_PATH', './config/token.json'),
-            auth_mode=os.getenv('GMAIL_AUTH_MODE', 'auto'),
+            credentials_path=environ.get('GMAIL_CREDENTIALS_PATH', './config/credentials.json'),
+            token_path=environ.get('GMAIL_TOKEN_PATH', './config/token.json'),
+            auth_mode=environ.get('GMAIL_AUTH_MODE', 'auto'),
         ),
         database=DatabaseConfig(
-            path=os.getenv('DATABASE_PATH', './data/emails.db'),
+            path=environ.get('DATABASE_PATH', './data/emails.db'),
         ),
         schedule=ScheduleConfig(
-            check_mode=os.getenv('CHECK_MODE', 'daily'),
-            check_interval_hours=int(os.getenv('CHECK_INTERVAL_HOURS', '2')),
-            check_buffer_minutes=int(os.getenv('CHECK_BUFFER_MINUTES', '1')),
+            check_mode=environ.get('CHECK_MODE', 'daily'),
+            check_interval_hours=int(environ.get('CHECK_INTERVAL_HOURS', '2')),
+            check_buffer_minutes=int(environ.get('CHECK_BUFFER_MINUTES', '1')),
+            daemon_interval_minutes=int(environ.get('DAEMON_INTERVAL_MINUTES', '0')),
         ),
     )
+
+
+# Configuración del proceso, cargada la primera vez que se pide
+_app_config: Optional[AppConfig] = None
+
+
+def get_app_config(reload: bool = False) -> AppConfig:
+    """
+    Retorna la configuración compartida por todo el proceso.
+
+    Se carga con load_config_from_env la primera vez (o si reload=True);
+    las siguientes llamadas no vuelven a leer el .env ni el entorno. Es
+    inmutable, así que se puede compartir sin copias.
+
+    Args:
+        reload: Fuerza a cargar de nuevo la configuración
+    """
+    global _app_config
+    if _app_config is None or reload:
+        _app_config = load_config_from_env()
+    return _app_config
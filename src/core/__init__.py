@@ -2,7 +2,7 @@
 Módulo core - Interfaces, modelos y procesador principal
 """
 
-from .models import Email, EmailClassification, HttpResponse, HttpError
+from .models import Email, EmailClassification, FetchResult, HttpResponse, HttpError, ProviderError
 from .interfaces import (
     HttpClient,
     EmailFetcher,
@@ -17,8 +17,10 @@ __all__ = [
     # Models
     "Email",
     "EmailClassification",
+    "FetchResult",
     "HttpResponse",
     "HttpError",
+    "ProviderError",
     # Interfaces
     "HttpClient",
     "EmailFetcher",
@@ -3,8 +3,9 @@ Interfaces y protocolos para el sistema de clasificación de correos.
 Define contratos que permiten inyección de dependencias y testing.
 """
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Protocol
+from typing import Callable, Iterable, Iterator, List, Mapping, Dict, Optional, Protocol, Set, Tuple
 
 from .models import Email, EmailClassification, HttpResponse
 
@@ -34,7 +35,8 @@ class EmailFetcher(ABC):
         self,
         max_results: int = 100,
         since_yesterday: bool = True,
-        custom_query: str = None
+        custom_query: str = None,
+        exclude: Callable[[List[str]], Set[str]] = None
     ) -> List[Email]:
         """
         Obtiene correos según criterios de fecha.
@@ -46,6 +48,8 @@ class EmailFetcher(ABC):
             max_results: Número máximo de correos
             since_yesterday: Si True, correos desde ayer. Si False, solo no leídos.
             custom_query: Query personalizada de Gmail
+            exclude: Recibe los ids listados y retorna los que no hace falta
+                     descargar (p.ej. los ya procesados)
         """
         pass
 
@@ -68,16 +72,55 @@ class EmailRepository(ABC):
         """Verifica si un correo ya fue procesado"""
         pass
 
+    def get_processed_ids(self, email_ids: Iterable[str]) -> Set[str]:
+        """
+        Retorna cuáles de email_ids ya fueron procesados.
+
+        Por defecto consulta uno por uno.
+        """
+        return {email_id for email_id in email_ids if self.is_processed(email_id)}
+
     @abstractmethod
     def save_classification(self, email: Email, classification: EmailClassification) -> None:
         """Guarda la clasificación de un correo"""
         pass
 
+    def save_classifications(
+        self, items: List[Tuple[Email, EmailClassification]]
+    ) -> None:
+        """
+        Guarda varias clasificaciones (correo, clasificación).
+
+        Por defecto guarda una por una.
+        """
+        for email, classification in items:
+            self.save_classification(email, classification)
+
     @abstractmethod
     def get_daily_stats(self, date: str) -> List[Dict]:
         """Obtiene estadísticas del día"""
         pass
 
+    def iter_daily_stats(self, date: str) -> Iterator[Mapping]:
+        """
+        Recorre las estadísticas del día sin materializarlas.
+
+        Cada fila permite acceder por nombre a priority, subject, summary y
+        amount. Por defecto recorre get_daily_stats.
+        """
+        return iter(self.get_daily_stats(date))
+
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """
+        Obtiene un valor de estado de sincronización (p.ej. el historyId).
+
+        Por defecto no se persiste estado.
+        """
+        return None
+
+    def set_sync_state(self, key: str, value: str) -> None:
+        """Guarda un valor de estado de sincronización"""
+
 
 class Notifier(ABC):
     """Interfaz para envío de notificaciones"""
@@ -111,10 +154,21 @@ class EmailClassifier(ABC):
         """Clasifica un correo electrónico"""
         pass
 
+    def classify_batch(self, emails: List[Tuple[str, str, str]]) -> List[EmailClassification]:
+        """
+        Clasifica varios correos (asunto, cuerpo, remitente).
+
+        Por defecto clasifica uno por uno.
+        """
+        return [self.classify(subject, body, sender) for subject, body, sender in emails]
+
 
 class AIProvider(ABC):
     """Interfaz base para proveedores de IA"""
 
+    # Límite de peticiones por minuto del plan gratuito (None = sin límite)
+    requests_per_minute: Optional[int] = None
+
     @abstractmethod
     def get_name(self) -> str:
         """Retorna el nombre del proveedor"""
@@ -124,3 +178,29 @@ class AIProvider(ABC):
     def generate(self, prompt: str) -> Dict:
         """Genera una respuesta del modelo"""
         pass
+
+    async def generate_async(self, prompt: str) -> Dict:
+        """
+        Versión asíncrona de generate.
+
+        Por defecto ejecuta generate en un hilo para no bloquear el event loop
+        mientras se espera la respuesta de red.
+        """
+        return await asyncio.to_thread(self.generate, prompt)
+
+    def health_check(self, timeout: float = 3.0) -> bool:
+        """
+        Verifica que el proveedor responde con una petición liviana.
+
+        Por defecto asume que está disponible.
+        """
+        return True
+
+    def generate_batch(self, prompts: List[str]) -> List[Dict]:
+        """
+        Genera una respuesta por cada prompt.
+
+        Por defecto hace una llamada por prompt; los proveedores que lo
+        soporten pueden empaquetar varios prompts en una sola petición.
+        """
+        return [self.generate(prompt) for prompt in prompts]
@@ -2,23 +2,37 @@
 Modelos de datos para el sistema de clasificación de correos.
 """
 
-from dataclasses import dataclass
-from typing import Dict, Optional
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
+# dataclass(slots=True) solo existe desde Python 3.10
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(frozen=True, **_SLOTS)
 class EmailClassification:
-    """Resultado de clasificación de un correo"""
+    """
+    Resultado de clasificación de un correo
+
+    Inmutable y hashable: puede guardarse en sets o usarse como clave.
+    """
     category: str
     priority: str  # 'urgente', 'normal', 'sin_prioridad'
     summary: str
     amount: Optional[str] = None
     action_required: bool = False
+    confidence: Optional[float] = None  # 0-1 según el LLM; None si no la dio
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Email:
-    """Representa un correo electrónico"""
+    """
+    Representa un correo electrónico
+
+    Con slots (Python 3.10+) cada instancia ocupa menos memoria y no tiene
+    __dict__; se crean hasta max_results por consulta a Gmail.
+    """
     id: str
     subject: str
     sender: str
@@ -26,16 +40,33 @@ class Email:
     date: str = ""
 
 
+@dataclass
+class FetchResult:
+    """
+    Resultado de una sincronización de correos.
+
+    history_id es el punto de partida de la próxima sincronización; solo
+    debe guardarse si no hubo fallos (failed == 0), para que los correos
+    que no se pudieron obtener se vuelvan a pedir.
+    """
+    emails: List[Email]
+    history_id: Optional[str] = None
+    # Correos que no se pudieron descargar (o 1 si falló el listado)
+    failed: int = 0
+
+
 @dataclass
 class HttpResponse:
     """Respuesta HTTP estandarizada"""
     status_code: int
     text: str
+    # Cuerpo original en bytes; si está presente se parsea sin pasar por str
+    content: Optional[bytes] = field(default=None, repr=False)
 
     def json(self) -> Dict:
         """Parsea el contenido como JSON"""
-        import json
-        return json.loads(self.text)
+        from ..utils.serialization import json_loads
+        return json_loads(self.content if self.content is not None else self.text)
 
     def raise_for_status(self):
         """Lanza excepción si el status code indica error"""
@@ -46,3 +77,20 @@ class HttpResponse:
 class HttpError(Exception):
     """Error en petición HTTP"""
     pass
+
+
+class ProviderError(Exception):
+    """
+    Error de un proveedor de IA.
+
+    Conserva el proveedor, la excepción original y el status HTTP (si lo hay)
+    para que quien reintenta pueda distinguir el tipo de fallo.
+    """
+    __slots__ = ("provider", "original", "status_code")
+
+    def __init__(self, provider: str, message, original: Exception = None,
+                 status_code: int = None):
+        super().__init__(f"Error en {provider}: {message}")
+        self.provider = provider
+        self.original = original
+        self.status_code = status_code
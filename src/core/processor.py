@@ -3,24 +3,33 @@ Procesador principal de correos
 Integra Gmail API, clasificación con LLM y notificaciones Telegram
 """
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Union
 
 from .interfaces import EmailFetcher, EmailRepository, Notifier, EmailClassifier
-from .models import Email, EmailClassification
-from ..config import AppConfig, load_config_from_env
+from .models import Email, EmailClassification, FetchResult
+from ..config import AppConfig, get_app_config
+
+logger = logging.getLogger(__name__)
 
 
 class EmailProcessor:
     """Procesador principal de correos bancarios"""
 
+    # Clave del repositorio donde se guarda el historyId de Gmail
+    HISTORY_STATE_KEY = 'gmail_history_id'
+
     def __init__(
         self,
         email_fetcher: EmailFetcher = None,
         repository: EmailRepository = None,
         classifier: EmailClassifier = None,
         notifier: Notifier = None,
-        config: AppConfig = None
+        config: AppConfig = None,
+        max_workers: int = 4
     ):
         """
         Inicializa el procesador con dependencias inyectables.
@@ -31,8 +40,11 @@ class EmailProcessor:
             classifier: Clasificador de correos
             notifier: Servicio de notificaciones
             config: Configuración de la aplicación
+            max_workers: Clasificaciones simultáneas (cada una espera la
+                respuesta de red del proveedor de IA)
         """
         self.config = config
+        self.max_workers = max(1, max_workers)
         self._email_fetcher = email_fetcher
         self._repository = repository
         self._classifier = classifier
@@ -51,17 +63,24 @@ class EmailProcessor:
         from ..providers import create_provider_from_config
 
         if config is None:
-            config = load_config_from_env()
+            config = get_app_config()
 
         repository = SQLiteEmailRepository(config.database)
         repository.init_database()
 
         email_fetcher = GmailFetcher(config.gmail)
 
-        provider_manager = create_provider_from_config(config.ai_provider)
+        # El clasificador ya cachea (y persiste) las respuestas: una segunda
+        # caché en el gestor solo duplicaría memoria
+        provider_manager = create_provider_from_config(
+            config.ai_provider, warmup=True, cache_size=0
+        )
+        # Las respuestas del LLM se guardan junto a la base de datos para
+        # reutilizarlas en la siguiente ejecución
         classifier = BankEmailClassifier.with_provider_manager(
             provider_manager,
-            config.classifier
+            config.classifier,
+            cache_path=str(Path(config.database.path).with_name('llm_cache.json'))
         )
 
         notifier = None
@@ -138,19 +157,20 @@ class EmailProcessor:
             print("Falta inicializar email fetcher o clasificador")
             return {'processed': 0, 'urgent': 0, 'normal': 0, 'errors': 0, 'important_emails': []}
 
-        # Obtener correos según el modo
-        if hours_ago is not None:
-            emails = self._email_fetcher.get_emails(
-                hours_ago=hours_ago,
-                buffer_minutes=buffer_minutes
-            )
-        else:
-            emails = self._email_fetcher.get_emails(since_yesterday=True)
+        fetch = self._fetch_emails(hours_ago, buffer_minutes)
+        emails = fetch.emails
 
         if not emails:
-            period = f"últimas {hours_ago}h" if hours_ago else "ayer hasta ahora"
-            print(f"No hay correos en el período ({period})")
-            return {'processed': 0, 'urgent': 0, 'normal': 0, 'errors': 0, 'important_emails': []}
+            if fetch.failed:
+                print("No se pudieron obtener los correos")
+            else:
+                period = f"últimas {hours_ago}h" if hours_ago else "ayer hasta ahora"
+                print(f"No hay correos en el período ({period})")
+                self._save_history_id(fetch.history_id)
+            return {
+                'processed': 0, 'urgent': 0, 'normal': 0,
+                'errors': fetch.failed, 'important_emails': []
+            }
 
         period = f"últimas {hours_ago}h" if hours_ago else "ayer hasta ahora"
         print(f"Encontrados {len(emails)} correos ({period})")
@@ -158,58 +178,73 @@ class EmailProcessor:
         processed_count = 0
         urgent_count = 0
         normal_count = 0
-        error_count = 0
+        # Los correos que no se pudieron descargar también cuentan como error
+        error_count = fetch.failed
         important_emails = []  # Para el resumen horario
 
-        for email in emails:
-            if self._repository and self._repository.is_processed(email.id):
+        # Una sola consulta para todos los correos en lugar de una por correo
+        processed_ids = (
+            self._repository.get_processed_ids([email.id for email in emails])
+            if self._repository else set()
+        )
+        pending = [email for email in emails if email.id not in processed_ids]
+
+        classifications = self._classify_pending(pending)
+
+        classified = []
+        for email, classification in zip(pending, classifications):
+            logger.info("\nProcesando: %s...", email.subject[:50])
+
+            if isinstance(classification, Exception):
+                logger.error("Error procesando correo %s: %s", email.id, classification)
+                error_count += 1
                 continue
 
-            print(f"\nProcesando: {email.subject[:50]}...")
+            logger.info("   Categoría: %s", classification.category)
+            logger.info("   Prioridad: %s", classification.priority)
+            logger.info("   Resumen: %s", classification.summary)
+            if classification.amount:
+                logger.info("   Monto: %s", classification.amount)
 
-            try:
-                classification = self._classifier.classify(
-                    email.subject,
-                    email.body,
-                    email.sender
-                )
+            classified.append((email, classification))
 
-                print(f"   Categoría: {classification.category}")
-                print(f"   Prioridad: {classification.priority}")
-                print(f"   Resumen: {classification.summary}")
-                if classification.amount:
-                    print(f"   Monto: {classification.amount}")
+        # Guardar todo en una transacción y notificar solo lo ya guardado
+        saved = self._save_classifications(classified)
+        error_count += len(classified) - len(saved)
 
-                if self._repository:
-                    self._repository.save_classification(email, classification)
+        for email, classification in saved:
+            processed_count += 1
 
-                processed_count += 1
+            # Trackear correos importantes
+            if classification.priority in ['urgente', 'normal']:
+                email_data = {
+                    'subject': email.subject,
+                    'from': email.sender,
+                    'category': classification.category,
+                    'priority': classification.priority,
+                    'summary': classification.summary,
+                    'amount': classification.amount
+                }
 
-                # Trackear correos importantes
-                if classification.priority in ['urgente', 'normal']:
-                    email_data = {
-                        'subject': email.subject,
-                        'from': email.sender,
-                        'category': classification.category,
-                        'priority': classification.priority,
-                        'summary': classification.summary,
-                        'amount': classification.amount
-                    }
+                if classification.priority == 'urgente':
+                    urgent_count += 1
+                else:
+                    normal_count += 1
 
-                    if classification.priority == 'urgente':
-                        urgent_count += 1
-                    else:
-                        normal_count += 1
+                important_emails.append(email_data)
 
-                    important_emails.append(email_data)
+        # Enviar notificaciones individuales (solo en modo daily)
+        if send_notifications and self._notifier:
+            error_count += self._send_alerts(important_emails)
 
-                    # Enviar notificación individual (solo en modo daily)
-                    if send_notifications and self._notifier:
-                        self._notifier.send_email_alert(email_data)
+        # Con errores se conserva el historyId anterior para reintentarlos
+        if error_count == 0:
+            self._save_history_id(fetch.history_id)
 
-            except Exception as e:
-                print(f"Error procesando correo {email.id}: {e}")
-                error_count += 1
+        # Persistir las respuestas del LLM si el clasificador lo soporta
+        save_cache = getattr(self._classifier, 'save_cache', None)
+        if save_cache is not None:
+            save_cache()
 
         print(f"\nProcesados {processed_count} correos nuevos")
         if urgent_count > 0:
@@ -225,6 +260,133 @@ class EmailProcessor:
             'important_emails': important_emails
         }
 
+    def _fetch_emails(self, hours_ago: Optional[int], buffer_minutes: int) -> FetchResult:
+        """
+        Obtiene los correos a procesar y el historyId para la próxima ejecución.
+
+        Si el fetcher soporta sincronización incremental (sync_emails), le
+        pasa el historyId guardado para pedir solo los correos nuevos. Si
+        no, usa la búsqueda por fecha de get_emails.
+        """
+        # Los correos ya procesados no se descargan
+        exclude = self._repository.get_processed_ids if self._repository else None
+
+        sync_emails = getattr(self._email_fetcher, 'sync_emails', None)
+        if sync_emails is not None and self._repository is not None:
+            return sync_emails(
+                self._repository.get_sync_state(self.HISTORY_STATE_KEY),
+                hours_ago=hours_ago,
+                buffer_minutes=buffer_minutes,
+                exclude=exclude
+            )
+
+        # Obtener correos según el modo
+        if hours_ago is not None:
+            emails = self._email_fetcher.get_emails(
+                hours_ago=hours_ago,
+                buffer_minutes=buffer_minutes,
+                exclude=exclude
+            )
+        else:
+            emails = self._email_fetcher.get_emails(since_yesterday=True, exclude=exclude)
+        return FetchResult(emails=emails)
+
+    def _save_history_id(self, history_id: Optional[str]):
+        """Guarda el historyId desde el que seguirá la próxima ejecución"""
+        if history_id and self._repository:
+            self._repository.set_sync_state(self.HISTORY_STATE_KEY, history_id)
+
+    def _send_alerts(self, alerts: List[Dict]) -> int:
+        """
+        Envía las alertas en paralelo (cada una espera su petición HTTP).
+
+        Returns:
+            Número de alertas que fallaron con excepción
+        """
+        def send(email_data: Dict) -> bool:
+            try:
+                self._notifier.send_email_alert(email_data)
+                return True
+            except Exception as e:
+                logger.error("Error enviando alerta '%s': %s", email_data['subject'][:50], e)
+                return False
+
+        if len(alerts) <= 1:
+            return sum(not send(email_data) for email_data in alerts)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(alerts))) as executor:
+            return sum(not sent for sent in executor.map(send, alerts))
+
+    def _save_classifications(
+        self, classified: List[Tuple[Email, EmailClassification]]
+    ) -> List[Tuple[Email, EmailClassification]]:
+        """
+        Guarda las clasificaciones en una sola operación del repositorio.
+
+        Si el guardado en bloque falla, guarda uno por uno para no perder los
+        demás. Retorna los que quedaron guardados.
+        """
+        if not self._repository or not classified:
+            return classified
+
+        try:
+            self._repository.save_classifications(classified)
+            return classified
+        except Exception as e:
+            print(f"Error guardando en bloque: {e}")
+
+        saved = []
+        for email, classification in classified:
+            try:
+                self._repository.save_classification(email, classification)
+                saved.append((email, classification))
+            except Exception as e:
+                logger.error("Error procesando correo %s: %s", email.id, e)
+        return saved
+
+    def _classify_pending(
+        self, pending: List[Email]
+    ) -> List[Union[EmailClassification, Exception]]:
+        """
+        Clasifica los correos pendientes en paralelo, en el mismo orden.
+
+        Los correos se reparten en hasta max_workers grupos que se clasifican
+        en lote a la vez. Si un lote falla, sus correos se clasifican uno por
+        uno, también en paralelo. Un correo que aun así falla queda con la
+        excepción para contarlo como error.
+        """
+        if not pending:
+            return []
+
+        size = -(-len(pending) // self.max_workers)
+        chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+
+        def classify_chunk(chunk: List[Email]) -> List[Optional[EmailClassification]]:
+            try:
+                return self._classifier.classify_batch(
+                    [(email.subject, email.body, email.sender) for email in chunk]
+                )
+            except Exception as e:
+                logger.error("Error clasificando en lote: %s", e)
+                return [None] * len(chunk)
+
+        def classify_one(email: Email) -> Union[EmailClassification, Exception]:
+            try:
+                return self._classifier.classify(email.subject, email.body, email.sender)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = [
+                classification
+                for chunk_results in executor.map(classify_chunk, chunks)
+                for classification in chunk_results
+            ]
+            failed = [i for i, classification in enumerate(results) if classification is None]
+            for i, classification in zip(failed, executor.map(classify_one, [pending[i] for i in failed])):
+                results[i] = classification
+
+        return results
+
     def send_daily_summary(self) -> bool:
         """
         Envía resumen diario.
@@ -242,17 +404,12 @@ class EmailProcessor:
 
         today = datetime.now().strftime('%Y-%m-%d')
 
-        rows = self._repository.get_daily_stats(today)
-
-        if not rows:
-            print("No hay correos hoy para resumir")
-            return False
-
         urgent = []
         normal = []
         low_priority = []
 
-        for row in rows:
+        # Una pasada sobre las filas, sin cargarlas todas antes de repartirlas
+        for row in self._repository.iter_daily_stats(today):
             email_info = {
                 'subject': row['subject'],
                 'summary': row['summary'] or row['subject'],
@@ -266,9 +423,14 @@ class EmailProcessor:
             else:
                 low_priority.append(email_info)
 
+        total_emails = len(urgent) + len(normal) + len(low_priority)
+        if not total_emails:
+            print("No hay correos hoy para resumir")
+            return False
+
         summary_data = {
             'date': datetime.now().strftime('%d/%m/%Y'),
-            'total_emails': len(rows),
+            'total_emails': total_emails,
             'urgent': urgent,
             'normal': normal,
             'low_priority': low_priority
@@ -5,14 +5,26 @@ Implementaciones de EmailFetcher para obtener correos de diferentes fuentes.
 import base64
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Callable, List, Optional, Set, Tuple
 from pathlib import Path
 
 from ..core.interfaces import EmailFetcher
-from ..core.models import Email
+from ..core.models import Email, FetchResult
 from ..config import GmailConfig
 
+# Caracteres del cuerpo que se conservan de cada correo
+MAX_BODY_CHARS = 2000
+
+# Headers usados para construir Email y su valor si faltan
+HEADER_DEFAULTS = {
+    'Subject': 'Sin asunto',
+    'From': 'Desconocido',
+    'Date': '',
+}
+
 
 class GmailFetcher(EmailFetcher):
     """
@@ -26,13 +38,35 @@ class GmailFetcher(EmailFetcher):
     - token_env: usa token desde variable de entorno GMAIL_TOKEN_JSON
     """
 
-    def __init__(self, config: GmailConfig):
+    # Mensajes por petición batch (Gmail recomienda no superar 50)
+    BATCH_SIZE = 50
+    # Reintentos ante 429/5xx en la descarga con hilos
+    NUM_RETRIES = 3
+    # Máximo de ids por página de messages.list (límite de la API)
+    LIST_PAGE_SIZE = 500
+    # Etiquetas de los mensajes del historial que no se procesan
+    HISTORY_SKIPPED_LABELS = frozenset({'SPAM', 'TRASH', 'DRAFT'})
+
+    def __init__(self, config: GmailConfig, use_batch: bool = True, max_workers: int = 10):
+        """
+        Args:
+            config: Configuración de Gmail
+            use_batch: Descarga los mensajes con peticiones batch. Si False,
+                usa una petición por mensaje en un pool de hilos.
+            max_workers: Hilos del pool cuando use_batch es False
+        """
         self.config = config
+        self.use_batch = use_batch
+        self.max_workers = max_workers
         self.credentials_path = Path(config.credentials_path)
         self.token_path = Path(config.token_path)
+        # Rutas como str para os.path y las librerías de Google
+        self._credentials_file = str(self.credentials_path)
+        self._token_file = str(self.token_path)
         self.scopes = config.scopes
         self.auth_mode = getattr(config, 'auth_mode', 'auto')
         self.service = None
+        self._credentials = None
 
     def _build_date_query(self, since_yesterday: bool = True) -> str:
         """
@@ -140,9 +174,10 @@ class GmailFetcher(EmailFetcher):
         - 'token_env': usa GMAIL_TOKEN_JSON del entorno
         """
         try:
+            # Solo lo necesario para reutilizar o refrescar un token; las
+            # librerías del flujo OAuth se importan si hay que autenticar
             from google.auth.transport.requests import Request
             from google.oauth2.credentials import Credentials
-            from google_auth_oauthlib.flow import InstalledAppFlow, Flow
             from googleapiclient.discovery import build
 
             creds = None
@@ -154,9 +189,9 @@ class GmailFetcher(EmailFetcher):
                     print("Token cargado desde variable de entorno GMAIL_TOKEN_JSON")
 
             # 2. Intentar cargar token desde archivo
-            if not creds and self.token_path.exists():
+            if not creds and os.path.isfile(self._token_file):
                 creds = Credentials.from_authorized_user_file(
-                    str(self.token_path), self.scopes
+                    self._token_file, self.scopes
                 )
 
             # 3. Verificar validez y refrescar si es necesario
@@ -165,8 +200,7 @@ class GmailFetcher(EmailFetcher):
                     print("Refrescando token expirado...")
                     creds.refresh(Request())
                     # Guardar token refrescado
-                    self.token_path.parent.mkdir(parents=True, exist_ok=True)
-                    self.token_path.write_text(creds.to_json())
+                    self._save_token(creds)
                 else:
                     creds = None  # Token inválido sin refresh_token
 
@@ -176,14 +210,16 @@ class GmailFetcher(EmailFetcher):
                     print("Error: modo 'token_env' pero no se encontró GMAIL_TOKEN_JSON válido")
                     return False
 
-                if not self.credentials_path.exists():
+                if not os.path.isfile(self._credentials_file):
                     print(f"No se encontró {self.credentials_path}")
                     print("Descarga credentials.json desde Google Cloud Console")
                     return False
 
+                from google_auth_oauthlib.flow import InstalledAppFlow, Flow
+
                 # Crear flow para OAuth
                 flow = Flow.from_client_secrets_file(
-                    str(self.credentials_path),
+                    self._credentials_file,
                     scopes=self.scopes,
                     redirect_uri='urn:ietf:wg:oauth:2.0:oob'  # Para modo manual
                 )
@@ -193,14 +229,14 @@ class GmailFetcher(EmailFetcher):
                 elif self.auth_mode == 'browser':
                     # Usar InstalledAppFlow para navegador
                     browser_flow = InstalledAppFlow.from_client_secrets_file(
-                        str(self.credentials_path), self.scopes
+                        self._credentials_file, self.scopes
                     )
                     creds = self._authenticate_browser(browser_flow)
                 else:  # auto
                     try:
                         # Intentar con navegador primero
                         browser_flow = InstalledAppFlow.from_client_secrets_file(
-                            str(self.credentials_path), self.scopes
+                            self._credentials_file, self.scopes
                         )
                         creds = self._authenticate_browser(browser_flow)
                     except Exception as browser_error:
@@ -213,17 +249,42 @@ class GmailFetcher(EmailFetcher):
                     return False
 
                 # Guardar token para uso futuro
-                self.token_path.parent.mkdir(parents=True, exist_ok=True)
-                self.token_path.write_text(creds.to_json())
+                self._save_token(creds)
                 print(f"Token guardado en {self.token_path}")
 
-            self.service = build('gmail', 'v1', credentials=creds)
+            # Documento de discovery empaquetado con la librería: evita
+            # descargarlo de Google en cada autenticación
+            self.service = build(
+                'gmail', 'v1', credentials=creds,
+                static_discovery=True, cache_discovery=False
+            )
+            self._credentials = creds
             return True
 
         except Exception as e:
             print(f"Error en autenticación Gmail: {e}")
             return False
 
+    @staticmethod
+    def _extract_headers(headers: List[dict]) -> dict:
+        """
+        Construye un dict nombre -> valor con todos los headers.
+
+        Los nombres se guardan en minúsculas (los headers no distinguen
+        mayúsculas) y, si un header se repite, se conserva el primero. Los
+        de HEADER_DEFAULTS que falten toman su valor por defecto.
+        """
+        found = {h['name'].lower(): h['value'] for h in reversed(headers)}
+        for name, default in HEADER_DEFAULTS.items():
+            found.setdefault(name.lower(), default)
+        return found
+
+    def _save_token(self, creds):
+        """Guarda el token en token_path, creando el directorio si falta"""
+        os.makedirs(os.path.dirname(self._token_file) or '.', exist_ok=True)
+        with open(self._token_file, 'w', encoding='utf-8') as f:
+            f.write(creds.to_json())
+
     def _parse_email_date(self, date_str: str) -> Optional[datetime]:
         """
         Parsea la fecha del header del email.
@@ -246,7 +307,9 @@ class GmailFetcher(EmailFetcher):
         since_yesterday: bool = True,
         custom_query: str = None,
         hours_ago: int = None,
-        buffer_minutes: int = 1
+        buffer_minutes: int = 1,
+        include_body: bool = True,
+        exclude: Callable[[List[str]], Set[str]] = None
     ) -> List[Email]:
         """
         Obtiene correos de Gmail según criterios de fecha.
@@ -262,6 +325,10 @@ class GmailFetcher(EmailFetcher):
             custom_query: Query personalizada de Gmail (sobreescribe since_yesterday)
             hours_ago: Si se especifica, filtra correos de las últimas N horas
             buffer_minutes: Minutos extra para cubrir delays (solo con hours_ago)
+            include_body: Si False, pide solo los headers (format='metadata')
+                         y los correos se retornan con el cuerpo vacío
+            exclude: Recibe los ids listados y retorna los que no se deben
+                     descargar; se consulta antes de pedir los mensajes
 
         Returns:
             Lista de objetos Email
@@ -271,77 +338,349 @@ class GmailFetcher(EmailFetcher):
             return []
 
         try:
-            # Determinar query a usar
-            cutoff_time = None
-            if custom_query:
-                query = custom_query
-            elif hours_ago is not None:
-                query, cutoff_time = self._build_hours_query(hours_ago, buffer_minutes)
-            else:
-                query = self._build_date_query(since_yesterday)
+            query, cutoff_time = self._build_query(
+                since_yesterday, custom_query, hours_ago, buffer_minutes
+            )
+            emails, _ = self._get_window_emails(
+                query, max_results, cutoff_time, include_body, exclude
+            )
+            return emails
 
-            print(f"Query Gmail: {query}")
+        except Exception as e:
+            print(f"Error obteniendo correos: {e}")
+            return []
 
-            results = self.service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
+    def _build_query(
+        self,
+        since_yesterday: bool = True,
+        custom_query: str = None,
+        hours_ago: int = None,
+        buffer_minutes: int = 1
+    ) -> Tuple[str, Optional[datetime]]:
+        """Query de Gmail y hora de corte (solo con hours_ago)"""
+        if custom_query:
+            return custom_query, None
+        if hours_ago is not None:
+            return self._build_hours_query(hours_ago, buffer_minutes)
+        return self._build_date_query(since_yesterday), None
+
+    def _get_window_emails(
+        self,
+        query: str,
+        max_results: int,
+        cutoff_time: Optional[datetime] = None,
+        include_body: bool = True,
+        exclude: Callable[[List[str]], Set[str]] = None
+    ) -> Tuple[List[Email], int]:
+        """
+        Lista y descarga los correos de query.
 
-            messages = results.get('messages', [])
+        Un fallo al listar se propaga. Returns: (correos, mensajes que no
+        se pudieron descargar)
+        """
+        print(f"Query Gmail: {query}")
+
+        emails = []
+        failed = 0
+        remaining = max_results
+        local = threading.local()
+        page = self._list_page(query, min(remaining, self.LIST_PAGE_SIZE))
+        # La siguiente página se pide mientras se descarga la actual
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            while True:
+                message_ids = [msg['id'] for msg in page.get('messages', [])][:remaining]
+                remaining -= len(message_ids)
+
+                page_token = page.get('nextPageToken')
+                next_page = None
+                if page_token and remaining > 0:
+                    next_page = prefetch.submit(
+                        self._list_page, query, min(remaining, self.LIST_PAGE_SIZE),
+                        page_token, local
+                    )
 
-            if not messages:
-                return []
+                if message_ids:
+                    page_emails, page_failed = self._build_emails(
+                        message_ids, include_body, exclude, cutoff_time
+                    )
+                    emails.extend(page_emails)
+                    failed += page_failed
 
-            emails = []
-            for msg in messages:
-                msg_data = self.service.users().messages().get(
-                    userId='me',
-                    id=msg['id'],
-                    format='full'
-                ).execute()
+                if next_page is None:
+                    break
+                page = next_page.result()
 
-                headers = msg_data['payload']['headers']
-                subject = next(
-                    (h['value'] for h in headers if h['name'] == 'Subject'),
-                    'Sin asunto'
-                )
-                sender = next(
-                    (h['value'] for h in headers if h['name'] == 'From'),
-                    'Desconocido'
-                )
-                date = next(
-                    (h['value'] for h in headers if h['name'] == 'Date'),
-                    ''
-                )
+        if cutoff_time:
+            print(f"Filtrados {len(emails)} correos desde {cutoff_time.strftime('%H:%M')}")
 
-                body = self._get_email_body(msg_data['payload'])
+        return emails, failed
 
-                # Filtrar por hora si se especificó hours_ago
-                if cutoff_time and date:
-                    email_datetime = self._parse_email_date(date)
-                    if email_datetime:
-                        # Convertir a naive datetime para comparar
-                        email_naive = email_datetime.replace(tzinfo=None)
-                        if email_naive < cutoff_time:
-                            continue  # Saltear emails anteriores al cutoff
+    def _list_page(self, query: str, page_size: int, page_token: str = None,
+                   local: threading.local = None) -> dict:
+        """
+        Lista una página de ids de mensajes.
 
-                emails.append(Email(
-                    id=msg['id'],
-                    subject=subject,
-                    sender=sender,
-                    body=body,
-                    date=date
-                ))
+        Con local se usa la conexión propia del hilo (ver _thread_http).
+        """
+        params = {'userId': 'me', 'q': query, 'maxResults': page_size}
+        if page_token:
+            params['pageToken'] = page_token
+        request = self.service.users().messages().list(**params)
+        if local is None:
+            return request.execute()
+        return request.execute(http=self._thread_http(local))
+
+    def get_history_id(self) -> Optional[str]:
+        """historyId actual del buzón, punto de partida de get_new_emails"""
+        if not self.service:
+            return None
+        try:
+            profile = self.service.users().getProfile(userId='me').execute()
+            return str(profile['historyId'])
+        except Exception as e:
+            print(f"Error obteniendo historyId: {e}")
+            return None
 
-            if cutoff_time:
-                print(f"Filtrados {len(emails)} correos desde {cutoff_time.strftime('%H:%M')}")
+    def sync_emails(
+        self,
+        start_history_id: Optional[str] = None,
+        max_results: int = 100,
+        hours_ago: int = None,
+        buffer_minutes: int = 1,
+        include_body: bool = True,
+        exclude: Callable[[List[str]], Set[str]] = None
+    ) -> FetchResult:
+        """
+        Obtiene los correos nuevos desde la sincronización anterior.
 
-            return emails
+        Con start_history_id pide solo los agregados desde entonces
+        (get_new_emails). Sin él, o si el historial expiró, usa la búsqueda
+        por fecha (desde ayer o las últimas hours_ago horas).
 
+        Los fallos no se omiten en silencio: se cuentan en failed, y quien
+        llama no debe guardar el nuevo history_id si failed > 0.
+        """
+        if not self.service:
+            print("Gmail no autenticado. Llama a authenticate() primero")
+            return FetchResult(emails=[], failed=1)
+
+        if start_history_id:
+            result = self.get_new_emails(start_history_id, include_body, exclude)
+            if result is not None:
+                return result
+
+        # Se toma antes de listar para no perder los que lleguen mientras tanto
+        history_id = self.get_history_id()
+        query, cutoff_time = self._build_query(True, None, hours_ago, buffer_minutes)
+        try:
+            emails, failed = self._get_window_emails(
+                query, max_results, cutoff_time, include_body, exclude
+            )
         except Exception as e:
             print(f"Error obteniendo correos: {e}")
-            return []
+            return FetchResult(emails=[], failed=1)
+
+        return FetchResult(emails=emails, history_id=history_id, failed=failed)
+
+    def get_new_emails(
+        self,
+        start_history_id: str,
+        include_body: bool = True,
+        exclude: Callable[[List[str]], Set[str]] = None
+    ) -> Optional[FetchResult]:
+        """
+        Obtiene solo los correos agregados desde start_history_id.
+
+        Usa users.history.list en lugar de volver a listar toda la ventana
+        de fechas.
+
+        Returns:
+            FetchResult con el nuevo historyId y los mensajes que no se
+            pudieron descargar. None si el historial ya no está disponible
+            (Gmail lo conserva ~7 días y responde 404) o la consulta falla;
+            en ese caso hay que usar la búsqueda por fecha.
+        """
+        if not self.service:
+            return None
+
+        message_ids = []
+        seen = set()
+        params = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'historyTypes': ['messageAdded'],
+        }
+        try:
+            while True:
+                response = self.service.users().history().list(**params).execute()
+                for record in response.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        message = added['message']
+                        if message['id'] in seen:
+                            continue
+                        # La búsqueda por fecha tampoco incluye spam, papelera ni borradores
+                        if self.HISTORY_SKIPPED_LABELS.intersection(message.get('labelIds', ())):
+                            continue
+                        seen.add(message['id'])
+                        message_ids.append(message['id'])
+
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+                params['pageToken'] = page_token
+        except Exception as e:
+            if getattr(getattr(e, 'resp', None), 'status', None) == 404:
+                print("Historial de Gmail expirado, se usa la búsqueda por fecha")
+            else:
+                print(f"Error obteniendo historial de Gmail: {e}")
+            return None
+
+        history_id = str(response.get('historyId', start_history_id))
+        if not message_ids:
+            return FetchResult(emails=[], history_id=history_id)
+
+        try:
+            emails, failed = self._build_emails(message_ids, include_body, exclude)
+        except Exception as e:
+            print(f"Error obteniendo correos: {e}")
+            return FetchResult(emails=[], history_id=history_id, failed=len(message_ids))
+        return FetchResult(emails=emails, history_id=history_id, failed=failed)
+
+    def _build_emails(
+        self,
+        message_ids: List[str],
+        include_body: bool = True,
+        exclude: Callable[[List[str]], Set[str]] = None,
+        cutoff_time: Optional[datetime] = None
+    ) -> Tuple[List[Email], int]:
+        """
+        Descarga message_ids y los convierte en Email
+
+        Returns:
+            (correos, cantidad de mensajes que no se pudieron descargar)
+        """
+        if exclude is not None:
+            skipped = exclude(message_ids)
+            message_ids = [msg_id for msg_id in message_ids if msg_id not in skipped]
+
+        messages = self._fetch_messages(message_ids, include_body)
+        failed = len(message_ids) - len(messages)
+        if failed:
+            print(f"No se pudieron descargar {failed} correos")
+
+        emails = []
+        for msg_data in messages:
+            headers = self._extract_headers(msg_data['payload']['headers'])
+            subject = headers['subject']
+            sender = headers['from']
+            date = headers['date']
+
+            body = self._get_email_body(msg_data['payload'])
+
+            # Filtrar por hora si se especificó hours_ago
+            if cutoff_time and date:
+                email_datetime = self._parse_email_date(date)
+                if email_datetime:
+                    # Convertir a naive datetime para comparar
+                    email_naive = email_datetime.replace(tzinfo=None)
+                    if email_naive < cutoff_time:
+                        continue  # Saltear emails anteriores al cutoff
+
+            emails.append(Email(
+                id=msg_data['id'],
+                subject=subject,
+                sender=sender,
+                body=body,
+                date=date
+            ))
+        return emails, failed
+
+    def _fetch_messages(self, message_ids: List[str], include_body: bool = True) -> List[dict]:
+        """
+        Descarga los mensajes completos de message_ids.
+
+        Usa peticiones batch o, con use_batch=False, un pool de hilos. Los
+        mensajes que fallan se omiten y el resultado conserva el orden de
+        message_ids. Sin include_body solo se piden los headers que usa
+        get_emails.
+        """
+        if include_body:
+            options = {'format': 'full'}
+        else:
+            options = {'format': 'metadata', 'metadataHeaders': list(HEADER_DEFAULTS)}
+
+        if self.use_batch:
+            return self._fetch_messages_batch(message_ids, options)
+        return self._fetch_messages_threaded(message_ids, options)
+
+    def _fetch_messages_batch(self, message_ids: List[str], options: dict) -> List[dict]:
+        """
+        Cada batch agrupa hasta BATCH_SIZE mensajes en una sola petición HTTP
+        en lugar de una ida y vuelta por mensaje. Si falla la petición batch
+        completa, ese grupo se descarga con el pool de hilos.
+        """
+        results = {}
+
+        def on_message(request_id, response, exception):
+            if exception is not None:
+                print(f"Error obteniendo correo {request_id}: {exception}")
+                return
+            results[request_id] = response
+
+        messages_api = self.service.users().messages()
+        for start in range(0, len(message_ids), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_message)
+            chunk = message_ids[start:start + self.BATCH_SIZE]
+            for message_id in chunk:
+                batch.add(
+                    messages_api.get(userId='me', id=message_id, **options),
+                    request_id=message_id
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"Error en petición batch, descargando uno por uno: {e}")
+                missing = [message_id for message_id in chunk if message_id not in results]
+                for msg_data in self._fetch_messages_threaded(missing, options):
+                    results[msg_data['id']] = msg_data
+
+        return [results[message_id] for message_id in message_ids if message_id in results]
+
+    def _fetch_messages_threaded(self, message_ids: List[str], options: dict) -> List[dict]:
+        """
+        Descarga cada mensaje con su propia petición, max_workers a la vez.
+
+        httplib2 no es thread-safe: cada hilo usa su propia conexión. Las
+        respuestas 429 y 5xx se reintentan con backoff (num_retries).
+        """
+        messages_api = self.service.users().messages()
+        local = threading.local()
+
+        def fetch_one(message_id):
+            try:
+                return messages_api.get(userId='me', id=message_id, **options).execute(
+                    http=self._thread_http(local), num_retries=self.NUM_RETRIES
+                )
+            except Exception as e:
+                print(f"Error obteniendo correo {message_id}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(fetch_one, message_ids))
+
+        return [msg_data for msg_data in results if msg_data is not None]
+
+    def _thread_http(self, local: threading.local):
+        """Conexión autorizada propia del hilo actual (None usa la del servicio)"""
+        if self._credentials is None:
+            return None
+        http = getattr(local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=httplib2.Http())
+            local.http = http
+        return http
 
     def mark_as_read(self, email_id: str) -> bool:
         """Marca un correo como leído"""
@@ -361,22 +700,26 @@ class GmailFetcher(EmailFetcher):
 
     def _get_email_body(self, payload: dict) -> str:
         """Extrae el cuerpo del correo del payload"""
-        body = ""
+        data = None
 
         if 'parts' in payload:
             for part in payload['parts']:
                 if part['mimeType'] == 'text/plain':
                     if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(
-                            part['body']['data']
-                        ).decode('utf-8')
+                        data = part['body']['data']
                         break
         elif 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(
-                payload['body']['data']
-            ).decode('utf-8')
+            data = payload['body']['data']
+
+        if not data:
+            return ""
 
-        return body[:2000]
+        # Solo se decodifica el prefijo necesario para MAX_BODY_CHARS:
+        # hasta 4 bytes UTF-8 por carácter y 4 caracteres base64 por cada 3
+        # bytes. Un carácter cortado al final queda fuera del recorte.
+        max_bytes = MAX_BODY_CHARS * 4
+        raw = base64.urlsafe_b64decode(data[:(max_bytes + 2) // 3 * 4])
+        return raw.decode('utf-8', errors='replace')[:MAX_BODY_CHARS]
 
 
 class MockEmailFetcher(EmailFetcher):
@@ -388,7 +731,7 @@ class MockEmailFetcher(EmailFetcher):
     def __init__(self):
         self.authenticated = False
         self.emails: List[Email] = []
-        self.read_emails: List[str] = []
+        self.read_emails: Set[str] = set()
         self._should_fail_auth = False
 
     def set_emails(self, emails: List[Email]):
@@ -416,7 +759,8 @@ class MockEmailFetcher(EmailFetcher):
         self,
         max_results: int = 100,
         since_yesterday: bool = True,
-        custom_query: str = None
+        custom_query: str = None,
+        exclude: Callable[[List[str]], Set[str]] = None
     ) -> List[Email]:
         """
         Retorna los correos configurados para testing.
@@ -428,12 +772,15 @@ class MockEmailFetcher(EmailFetcher):
             return []
 
         # En mock retornamos todos los correos (simulando comportamiento de fecha)
-        return self.emails[:max_results]
+        emails = self.emails[:max_results]
+        if exclude is not None:
+            skipped = exclude([email.id for email in emails])
+            emails = [email for email in emails if email.id not in skipped]
+        return emails
 
     def mark_as_read(self, email_id: str) -> bool:
         """Marca un correo como leído"""
-        if email_id not in self.read_emails:
-            self.read_emails.append(email_id)
+        self.read_emails.add(email_id)
         return True
 
     def clear(self):
@@ -2,20 +2,18 @@
 Punto de entrada principal para el procesador de correos
 """
 
+import logging
+import signal
 import sys
+import threading
 
 from .core import EmailProcessor
 from .config import load_config_from_env
 
 
-def main():
-    """Función principal para ejecutar el procesador"""
-    processor = EmailProcessor.create_default()
+def run_once(processor: EmailProcessor):
+    """Ejecuta una revisión según el modo configurado"""
     config = processor.config
-
-    if not processor.authenticate():
-        sys.exit(1)
-
     check_mode = config.schedule.check_mode
 
     if check_mode == "hourly":
@@ -57,5 +55,51 @@ def main():
         processor.send_daily_summary()
 
 
+def run_daemon(processor: EmailProcessor, interval_minutes: int,
+               stop: threading.Event = None):
+    """
+    Repite run_once cada interval_minutes con el mismo procesador.
+
+    Así la configuración, la autenticación de Gmail, la base de datos y las
+    conexiones HTTP se preparan una sola vez. Termina con SIGTERM/SIGINT
+    (o al activar stop) y cierra el repositorio al salir.
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+    print(f"Modo daemon: revisión cada {interval_minutes} min")
+    try:
+        while not stop.is_set():
+            try:
+                run_once(processor)
+            except Exception as e:
+                # Un fallo en una revisión no detiene el daemon
+                print(f"Error en la revisión: {e}")
+            stop.wait(interval_minutes * 60)
+    finally:
+        close = getattr(processor.repository, 'close', None)
+        if close is not None:
+            close()
+        print("Daemon detenido")
+
+
+def main():
+    """Función principal para ejecutar el procesador"""
+    # A stdout, junto con los print, para conservar el orden de la salida
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    processor = EmailProcessor.create_default()
+
+    if not processor.authenticate():
+        sys.exit(1)
+
+    interval = processor.config.schedule.daemon_interval_minutes
+    if interval > 0:
+        run_daemon(processor, interval)
+    else:
+        run_once(processor)
+
+
 if __name__ == "__main__":
     main()
@@ -7,6 +7,7 @@ from .base import (
     MockAIProvider,
     create_provider_from_config,
 )
+from .openai_compat import OpenAICompatibleProvider
 from .ollama import OllamaProvider
 from .groq import GroqProvider
 from .cerebras import CerebrasProvider
@@ -17,6 +18,7 @@ __all__ = [
     "AIProviderManager",
     "MockAIProvider",
     "create_provider_from_config",
+    "OpenAICompatibleProvider",
     "OllamaProvider",
     "GroqProvider",
     "CerebrasProvider",
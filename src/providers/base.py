@@ -2,10 +2,95 @@
 Gestor de proveedores de IA y clases base
 """
 
-from typing import Dict, List
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from ..core.interfaces import AIProvider
+from ..core.models import ProviderError
 from ..config import AIProviderConfig
+from .cache import DEFAULT_CACHE_TTL, ResponseCache
+from .rate_limit import ProviderStats
+
+logger = logging.getLogger(__name__)
+
+# Errores al interpretar una respuesta con forma inesperada
+PARSE_ERRORS = (KeyError, IndexError, TypeError, AttributeError, ValueError)
+
+
+# Encabezado fijo (sin el número de tareas) para que todos los lotes
+# compartan el mismo prefijo
+BATCH_PROMPT_HEADER = (
+    "Vas a recibir varias tareas independientes, cada una marcada con un "
+    "identificador (text1, text2, ...). Las instrucciones comunes aplican "
+    "a cada tarea por separado. Responde SOLO con un JSON de la forma "
+    '{"text1": respuesta_1, "text2": respuesta_2, ...}, donde cada valor es '
+    "el objeto JSON que responde la tarea con ese identificador."
+)
+
+
+def _batch_id(index: int) -> str:
+    """Identificador de la tarea index (desde 1) dentro de un lote"""
+    return f"text{index}"
+
+
+def _shared_prefix(prompts: List[str]) -> str:
+    """
+    Parte inicial común a todos los prompts, cortada en el último párrafo
+    completo para no partir la parte propia de cada tarea
+    """
+    if len(prompts) < 2:
+        return ""
+    prefix = os.path.commonprefix(prompts)
+    end = prefix.rfind("\n\n")
+    return prefix[:end + 2] if end >= 0 else ""
+
+
+def pack_batch_prompt(prompts: List[str]) -> str:
+    """
+    Combina varios prompts en uno solo que pide un objeto JSON de respuestas.
+
+    Permite resolver N prompts en una sola petición HTTP. Las instrucciones
+    que comparten todos los prompts se envían una sola vez y cada tarea
+    lleva solo su parte propia, marcada con su identificador.
+    """
+    shared = _shared_prefix(prompts)
+    tasks = [
+        f"### {_batch_id(i)}\n{prompt[len(shared):]}"
+        for i, prompt in enumerate(prompts, 1)
+    ]
+    footer = f"Total de tareas: {len(prompts)}"
+    parts = [BATCH_PROMPT_HEADER]
+    if shared:
+        parts.append(f"Instrucciones comunes:\n{shared.rstrip()}")
+    return "\n\n".join(parts + tasks + [footer])
+
+
+def unpack_batch_response(result, count: int) -> List[Dict]:
+    """
+    Separa la respuesta de un prompt empaquetado en una respuesta por tarea.
+
+    Las respuestas se emparejan por identificador, no por posición.
+
+    Raises:
+        ValueError: Si falta la respuesta de alguna tarea o no es un objeto
+    """
+    if not isinstance(result, dict):
+        raise ValueError("Respuesta por lotes inválida: se esperaba un objeto")
+
+    items = []
+    for i in range(1, count + 1):
+        item = result.get(_batch_id(i))
+        if not isinstance(item, dict):
+            raise ValueError(f"Respuesta por lotes inválida: falta {_batch_id(i)}")
+        items.append(item)
+
+    return items
 
 
 class AIProviderManager(AIProvider):
@@ -14,39 +99,199 @@ class AIProviderManager(AIProvider):
     Permite usar múltiples servicios gratuitos alternándolos
     """
 
-    def __init__(self, providers: List[AIProvider] = None):
+    STRATEGIES = ("round_robin", "latency")
+
+    def __init__(self, providers: List[AIProvider] = None,
+                 hedge_delay: Optional[float] = 10.0, batch_size: int = 8,
+                 cache_size: int = 1024, cache_ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                 strategy: str = "round_robin"):
+        """
+        Args:
+            providers: Proveedores iniciales
+            strategy: "round_robin" alterna los proveedores; "latency" elige
+                el de menor latencia esperada (EWMA × (1 + tasa de fallos))
+            hedge_delay: Segundos de espera en generate_async antes de lanzar
+                el siguiente proveedor en paralelo. None desactiva el hedging.
+            batch_size: Máximo de prompts por petición en generate_batch
+            cache_size: Respuestas a recordar por prompt (0 desactiva la caché)
+            cache_ttl: Segundos de vigencia de cada respuesta cacheada
+        """
+        if strategy not in self.STRATEGIES:
+            raise Exception(f"Estrategia inválida: {strategy}")
+
+        self.strategy = strategy
         self._providers: List[AIProvider] = providers or []
         self._current_index = 0
+        self.hedge_delay = hedge_delay
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stats: Dict[int, ProviderStats] = {}
+        self._cache = ResponseCache(cache_size, ttl=cache_ttl)
+        self._cached_name: Optional[str] = None
 
     @property
     def providers(self) -> List[AIProvider]:
         return self._providers
 
+    @property
+    def cache_hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def cache_misses(self) -> int:
+        return self._cache.misses
+
+    def clear_cache(self):
+        """Vacía la caché de respuestas"""
+        self._cache.clear()
+
     def add_provider(self, provider: AIProvider):
         """Agrega un proveedor a la lista"""
         self._providers.append(provider)
+        self._cached_name = None
         print(f"Proveedor agregado: {provider.get_name()}")
 
     def get_name(self) -> str:
         """Retorna el nombre del gestor"""
-        provider_names = [p.get_name() for p in self._providers]
-        return f"AIProviderManager ({', '.join(provider_names)})"
-
-    def get_next_provider(self) -> AIProvider:
+        if self._cached_name is None:
+            provider_names = [p.get_name() for p in self._providers]
+            self._cached_name = f"AIProviderManager ({', '.join(provider_names)})"
+        return self._cached_name
+
+    def get_stats(self, provider: AIProvider) -> ProviderStats:
+        """Retorna las estadísticas (cuota, latencia, éxito) de un proveedor"""
+        with self._lock:
+            return self._stats_for(provider)
+
+    def _stats_for(self, provider: AIProvider) -> ProviderStats:
+        stats = self._stats.get(id(provider))
+        if stats is None:
+            stats = ProviderStats(getattr(provider, "requests_per_minute", None))
+            self._stats[id(provider)] = stats
+        return stats
+
+    def get_next_provider(self, exclude: Optional[List[AIProvider]] = None) -> AIProvider:
         """
         Obtiene el siguiente proveedor en rotación (Round Robin)
 
+        Salta los proveedores sin cuota local disponible o bloqueados tras
+        un 429. Si ninguno está disponible, sigue la rotación normal.
+        Con la estrategia "latency" elige entre los disponibles el de menor
+        latencia esperada; mientras alguno no tenga métricas se prueba ese.
+
+        Args:
+            exclude: Proveedores ya intentados para esta petición
+
         Returns:
             El siguiente proveedor disponible
         """
         if not self._providers:
             raise Exception("No hay proveedores configurados")
 
-        provider = self._providers[self._current_index]
-        self._current_index = (self._current_index + 1) % len(self._providers)
+        exclude = exclude or []
+        with self._lock:
+            count = len(self._providers)
+            order = [(self._current_index + offset) % count for offset in range(count)]
+            untried = [
+                i for i in order
+                if not any(self._providers[i] is tried for tried in exclude)
+            ] or order
+            candidates = [i for i in untried if self._stats_for(self._providers[i]).is_available()]
+
+            index = untried[0]
+            if candidates:
+                index = candidates[0]
+                if self.strategy == "latency":
+                    stats = [self._stats_for(self._providers[c]) for c in candidates]
+                    if all(s.has_metrics for s in stats):
+                        best = min(range(len(candidates)), key=lambda i: stats[i].expected_latency())
+                        index = candidates[best]
+
+            provider = self._providers[index]
+            self._current_index = (index + 1) % count
+            self._stats_for(provider).acquire()
 
         return provider
 
+    def _call(self, provider: AIProvider, method, arg):
+        """Ejecuta una llamada al proveedor registrando latencia y errores"""
+        stats = self.get_stats(provider)
+        start = time.monotonic()
+        try:
+            result = method(arg)
+        except Exception as e:
+            stats.record_failure(e)
+            raise
+        stats.record_success(time.monotonic() - start)
+        return result
+
+    async def _call_async(self, provider: AIProvider, prompt: str,
+                          settled: Optional[threading.Event] = None) -> Dict:
+        stats = self.get_stats(provider)
+        if settled is not None and type(provider).generate_async is AIProvider.generate_async:
+            # Un generate en un hilo no se puede interrumpir una vez enviado:
+            # si la carrera ya terminó antes de que el hilo arranque, no se
+            # llama al proveedor y se devuelve la cuota reservada
+            def call():
+                if settled.is_set():
+                    stats.release()
+                    raise asyncio.CancelledError()
+                return provider.generate(prompt)
+            pending = asyncio.to_thread(call)
+        else:
+            pending = provider.generate_async(prompt)
+
+        start = time.monotonic()
+        try:
+            result = await pending
+        except Exception as e:
+            stats.record_failure(e)
+            raise
+        stats.record_success(time.monotonic() - start)
+        return result
+
+    def warmup(self, timeout: float = 3.0) -> Dict[str, bool]:
+        """
+        Verifica en paralelo que los proveedores responden.
+
+        Los que fallan o no contestan a tiempo quedan con el circuito abierto,
+        así la primera clasificación no espera el timeout de un proveedor caído.
+        También deja abiertas las conexiones TLS para las llamadas reales.
+
+        Args:
+            timeout: Segundos máximos de espera por la verificación
+
+        Returns:
+            Dict nombre del proveedor -> si respondió correctamente
+        """
+        if not self._providers:
+            return {}
+
+        executor = ThreadPoolExecutor(max_workers=len(self._providers))
+        futures = {
+            provider: executor.submit(provider.health_check, timeout)
+            for provider in self._providers
+        }
+        results: Dict[str, bool] = {}
+        deadline = time.monotonic() + timeout
+        try:
+            for provider, future in futures.items():
+                try:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    healthy = future.result(timeout=remaining)
+                except Exception:
+                    # Error o sin respuesta a tiempo
+                    healthy = False
+
+                results[provider.get_name()] = healthy
+                if not healthy:
+                    logger.warning("Proveedor no disponible: %s", provider.get_name())
+                    self.get_stats(provider).open_circuit()
+        finally:
+            executor.shutdown(wait=False)
+
+        return results
+
     def reset_rotation(self):
         """Reinicia la rotación al primer proveedor"""
         self._current_index = 0
@@ -65,22 +310,163 @@ class AIProviderManager(AIProvider):
         if not self._providers:
             raise Exception("No hay proveedores configurados")
 
+        cached = self._cache.get(prompt)
+        if cached is not None:
+            return cached
+
         attempts = len(self._providers)
         last_error = None
+        tried: List[AIProvider] = []
 
         for _ in range(attempts):
-            provider = self.get_next_provider()
+            provider = self.get_next_provider(exclude=tried)
+            tried.append(provider)
 
             try:
-                print(f"Usando: {provider.get_name()}")
-                return provider.generate(prompt)
+                logger.info("Usando: %s", provider.get_name())
+                result = self._call(provider, provider.generate, prompt)
+                self._cache.put(prompt, result)
+                return result
             except Exception as e:
-                print(f"Error con {provider.get_name()}: {e}")
+                logger.warning("Error con %s: %s", provider.get_name(), e)
                 last_error = e
                 continue
 
         raise Exception(f"Todos los proveedores fallaron. Último error: {last_error}")
 
+    def generate_batch(self, prompts: List[str]) -> List[Dict]:
+        """
+        Genera respuestas para varios prompts agrupándolos en lotes.
+
+        Cada lote de hasta batch_size prompts se envía al siguiente proveedor
+        en rotación; si falla, se reintenta el lote completo con el siguiente.
+
+        Args:
+            prompts: Lista de prompts
+
+        Returns:
+            Lista de respuestas en el mismo orden que los prompts
+        """
+        if not self._providers:
+            raise Exception("No hay proveedores configurados")
+
+        results: List[Dict] = []
+        for start in range(0, len(prompts), self.batch_size):
+            chunk = prompts[start:start + self.batch_size]
+            last_error = None
+            tried: List[AIProvider] = []
+
+            for _ in range(len(self._providers)):
+                provider = self.get_next_provider(exclude=tried)
+                tried.append(provider)
+
+                try:
+                    logger.info("Usando: %s (lote de %d)", provider.get_name(), len(chunk))
+                    results.extend(self._call(provider, provider.generate_batch, chunk))
+                    break
+                except Exception as e:
+                    logger.warning("Error con %s: %s", provider.get_name(), e)
+                    last_error = e
+            else:
+                raise Exception(f"Todos los proveedores fallaron. Último error: {last_error}")
+
+        return results
+
+    async def generate_async(self, prompt: str) -> Dict:
+        """
+        Genera una respuesta sin bloquear el event loop, con hedging entre proveedores.
+
+        Lanza el siguiente proveedor en rotación; si no responde en hedge_delay
+        segundos lanza otro en paralelo. Si uno falla, lanza el siguiente de
+        inmediato. La primera respuesta exitosa gana y el resto se cancela;
+        los intentos que aún no enviaron su petición ya no la envían.
+
+        Args:
+            prompt: El prompt a enviar
+
+        Returns:
+            Dict con la respuesta del modelo
+        """
+        if not self._providers:
+            raise Exception("No hay proveedores configurados")
+
+        cached = self._cache.get(prompt)
+        if cached is not None:
+            return cached
+
+        attempts = len(self._providers)
+        in_flight: Dict[asyncio.Task, AIProvider] = {}
+        tried: List[AIProvider] = []
+        last_error = None
+        launched = 0
+        # Se activa al terminar la carrera; los intentos que aún no salieron
+        # lo revisan antes de llamar al proveedor
+        settled = threading.Event()
+
+        def launch():
+            nonlocal launched
+            provider = self.get_next_provider(exclude=tried)
+            tried.append(provider)
+            logger.info("Usando: %s", provider.get_name())
+            task = asyncio.ensure_future(self._call_async(provider, prompt, settled))
+            in_flight[task] = provider
+            launched += 1
+
+        launch()
+        try:
+            while in_flight:
+                can_hedge = self.hedge_delay is not None and launched < attempts
+                done, _ = await asyncio.wait(
+                    in_flight,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                        self._cache.put(prompt, result)
+                        return result
+                    except Exception as e:
+                        logger.warning("Error con %s: %s", provider.get_name(), e)
+                        last_error = e
+                        if launched < attempts:
+                            launch()
+        finally:
+            settled.set()
+            for task in in_flight:
+                task.cancel()
+
+        raise Exception(f"Todos los proveedores fallaron. Último error: {last_error}")
+
+    async def generate_many(self, prompts: List[str], concurrency: int = 4) -> List:
+        """
+        Genera respuestas para varios prompts de forma concurrente.
+
+        Cada prompt usa generate_async (con rotación, failover y caché); como
+        máximo concurrency llamadas están en curso al mismo tiempo.
+
+        Args:
+            prompts: Lista de prompts
+            concurrency: Máximo de llamadas simultáneas
+
+        Returns:
+            Lista en el mismo orden que prompts con el Dict de respuesta o la
+            excepción si todos los proveedores fallaron para ese prompt
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(prompt: str) -> Dict:
+            async with semaphore:
+                return await self.generate_async(prompt)
+
+        return await asyncio.gather(*(run(p) for p in prompts), return_exceptions=True)
+
 
 class MockAIProvider(AIProvider):
     """
@@ -100,6 +486,8 @@ class MockAIProvider(AIProvider):
         self.calls: List[str] = []
         self.should_fail = False
         self.failure_message = "Mock failure"
+        self.failure_status = None
+        self._pattern: Optional[re.Pattern] = None
 
     def get_name(self) -> str:
         return self._name
@@ -107,28 +495,51 @@ class MockAIProvider(AIProvider):
     def set_response(self, prompt_contains: str, response: Dict):
         """Configura respuesta para prompts que contengan cierto texto"""
         self.responses[prompt_contains] = response
+        self._pattern = None
 
     def set_default_response(self, response: Dict):
         """Configura la respuesta por defecto"""
         self.default_response = response
 
-    def set_failure(self, should_fail: bool = True, message: str = "Mock failure"):
-        """Configura para simular fallo"""
+    def set_failure(self, should_fail: bool = True, message: str = "Mock failure",
+                    status_code: Optional[int] = None):
+        """Configura para simular fallo (con status HTTP si se indica)"""
         self.should_fail = should_fail
         self.failure_message = message
+        self.failure_status = status_code
 
     def generate(self, prompt: str) -> Dict:
         """Retorna la respuesta configurada"""
         self.calls.append(prompt)
 
         if self.should_fail:
+            if self.failure_status is not None:
+                raise ProviderError(self._name, self.failure_message,
+                                    status_code=self.failure_status)
             raise Exception(self.failure_message)
 
-        for key, response in self.responses.items():
-            if key in prompt:
-                return response
-
-        return self.default_response
+        if not self.responses:
+            return self.default_response
+
+        # Una sola pasada de regex sobre el prompt. El lookahead permite
+        # coincidencias solapadas; gana la clave registrada primero.
+        if self._pattern is None:
+            alternatives = '|'.join(map(re.escape, self.responses))
+            self._pattern = re.compile(f'(?=({alternatives}))')
+            self._key_order = {key: i for i, key in enumerate(self.responses)}
+            self._ordered_responses = list(self.responses.values())
+
+        best = None
+        for match in self._pattern.finditer(prompt):
+            index = self._key_order[match.group(1)]
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+
+        if best is None:
+            return self.default_response
+        return self._ordered_responses[best]
 
     def get_calls(self) -> List[str]:
         """Retorna los prompts recibidos"""
@@ -137,16 +548,22 @@ class MockAIProvider(AIProvider):
     def clear(self):
         """Limpia configuraciones y llamadas"""
         self.responses.clear()
+        self._pattern = None
         self.calls.clear()
         self.should_fail = False
 
 
-def create_provider_from_config(config: AIProviderConfig = None) -> AIProviderManager:
+def create_provider_from_config(config: AIProviderConfig = None,
+                                warmup: bool = False,
+                                cache_size: int = 1024) -> AIProviderManager:
     """
     Crea un gestor de proveedores basado en la configuración.
 
     Args:
         config: Configuración de proveedores. Si es None, carga desde .env
+        warmup: Verificar en paralelo que los proveedores responden
+        cache_size: Respuestas a recordar en el gestor (0 la desactiva, p.ej.
+            cuando el clasificador ya tiene su propia caché)
 
     Returns:
         AIProviderManager configurado con los proveedores disponibles
@@ -158,66 +575,42 @@ def create_provider_from_config(config: AIProviderConfig = None) -> AIProviderMa
     from .openrouter import OpenRouterProvider
 
     if config is None:
-        from ..config import load_config_from_env
-        app_config = load_config_from_env()
-        config = app_config.ai_provider
+        from ..config import get_app_config
+        config = get_app_config().ai_provider
 
-    manager = AIProviderManager()
+    manager = AIProviderManager(cache_size=cache_size)
     provider_type = config.provider_type.lower()
 
     print(f"\nConfigurando proveedores de IA (modo: {provider_type})")
     print("=" * 60)
 
-    if provider_type == 'ollama':
-        manager.add_provider(OllamaProvider(config=config.ollama))
-
-    elif provider_type == 'api':
-        added = False
-
-        if config.groq.api_key:
-            manager.add_provider(GroqProvider(config=config.groq))
-            added = True
-
-        if config.cerebras.api_key:
-            manager.add_provider(CerebrasProvider(config=config.cerebras))
-            added = True
-
-        if config.gemini.api_key:
-            manager.add_provider(GeminiProvider(config=config.gemini))
-            added = True
-
-        if config.openrouter.api_key:
-            manager.add_provider(OpenRouterProvider(config=config.openrouter))
-            added = True
+    if provider_type not in ('ollama', 'api', 'auto'):
+        raise Exception(f"AI_PROVIDER inválido: {provider_type}. Usa 'ollama', 'api' o 'auto'")
 
-        if not added:
+    # Proveedores remotos en orden de preferencia; solo se usan si tienen API key
+    api_candidates = [
+        (config.groq, GroqProvider),
+        (config.cerebras, CerebrasProvider),
+        (config.gemini, GeminiProvider),
+        (config.openrouter, OpenRouterProvider),
+    ]
+
+    if provider_type != 'ollama':
+        for provider_config, provider_class in api_candidates:
+            if provider_config.api_key:
+                manager.add_provider(provider_class(config=provider_config))
+
+    if not manager.providers:
+        if provider_type == 'api':
             raise Exception("Modo 'api' seleccionado pero no hay API keys configuradas")
-
-    elif provider_type == 'auto':
-        added = False
-
-        if config.groq.api_key:
-            manager.add_provider(GroqProvider(config=config.groq))
-            added = True
-
-        if config.cerebras.api_key:
-            manager.add_provider(CerebrasProvider(config=config.cerebras))
-            added = True
-
-        if config.gemini.api_key:
-            manager.add_provider(GeminiProvider(config=config.gemini))
-            added = True
-
-        if config.openrouter.api_key:
-            manager.add_provider(OpenRouterProvider(config=config.openrouter))
-            added = True
-
-        if not added:
+        if provider_type == 'auto':
             print("No hay API keys, usando Ollama local como fallback")
-            manager.add_provider(OllamaProvider(config=config.ollama))
+        manager.add_provider(OllamaProvider(config=config.ollama))
 
-    else:
-        raise Exception(f"AI_PROVIDER inválido: {provider_type}. Usa 'ollama', 'api' o 'auto'")
+    if warmup:
+        health = manager.warmup()
+        available = sum(health.values())
+        print(f"Proveedores disponibles: {available}/{len(health)}")
 
     print("=" * 60)
     print(f"Total de proveedores configurados: {len(manager.providers)}\n")
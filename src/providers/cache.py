@@ -0,0 +1,158 @@
+"""
+Caché LRU de respuestas de IA indexada por hash del prompt.
+"""
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from ..utils import json_dumps, json_loads
+
+# Horas del día que cambian entre correos de la misma plantilla. Las fechas
+# no se reemplazan: un vencimiento distinto debe dar otro resumen
+_TIME_RE = re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?(?:\s?[ap]\.?m\.?)?', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Vigencia por defecto de las respuestas cacheadas (7 días)
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normaliza un prompt para la clave de caché.
+
+    Colapsa espacios y reemplaza las horas del día, así los correos de una
+    misma plantilla que solo difieren en la hora comparten entrada.
+    """
+    prompt = _TIME_RE.sub('<t>', prompt)
+    return _WHITESPACE_RE.sub(' ', prompt).strip()
+
+
+class ResponseCache:
+    """
+    Caché LRU acotada de respuestas por prompt.
+
+    Guarda y devuelve copias para que modificar un resultado no altere la caché.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Args:
+            max_size: Máximo de respuestas guardadas (0 desactiva la caché)
+            ttl: Segundos de vigencia de cada respuesta (None = sin vencimiento)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str) -> bytes:
+        normalized = normalize_prompt(prompt)
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, prompt: str) -> Optional[Dict]:
+        """Retorna una copia de la respuesta cacheada o None"""
+        if self.max_size <= 0:
+            return None
+        key = self.make_key(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, prompt: str, result: Dict):
+        """Guarda una respuesta, descartando la menos usada si está llena"""
+        if self.max_size <= 0:
+            return
+        key = self.make_key(prompt)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        value = copy.deepcopy(result)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self, path: str):
+        """
+        Guarda las respuestas en un archivo JSON para reutilizarlas en otra
+        ejecución
+
+        Se escribe a un archivo temporal y se reemplaza, así un corte a
+        mitad de escritura no deja el archivo corrupto. El vencimiento se
+        guarda en hora del sistema para que siga contando entre ejecuciones.
+        """
+        now = time.monotonic()
+        wall_offset = time.time() - now
+        with self._lock:
+            entries = {
+                key.hex(): [
+                    expires_at + wall_offset if expires_at != float('inf') else None,
+                    value
+                ]
+                for key, (expires_at, value) in self._entries.items()
+                if expires_at >= now
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json_dumps(entries))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        """
+        Carga respuestas guardadas con save
+
+        Conservan su vencimiento original (acotado al ttl actual); las ya
+        vencidas se descartan.
+
+        Returns:
+            Número de respuestas cargadas; 0 si el archivo no existe o es inválido
+        """
+        if self.max_size <= 0:
+            return 0
+        now = time.monotonic()
+        wall_offset = time.time() - now
+        max_expires_at = now + self.ttl if self.ttl is not None else float('inf')
+        try:
+            with open(path, 'rb') as f:
+                entries = json_loads(f.read())
+            items = []
+            for key, (expires_at, value) in entries.items():
+                expires_at = expires_at - wall_offset if expires_at is not None else float('inf')
+                if expires_at >= now:
+                    items.append((bytes.fromhex(key), min(expires_at, max_expires_at), value))
+        except (OSError, ValueError, AttributeError, TypeError):
+            return 0
+
+        with self._lock:
+            for key, expires_at, value in items[-self.max_size:]:
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return len(items[-self.max_size:])
+
+    def clear(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -2,59 +2,89 @@
 Proveedor de IA para Google Gemini API
 """
 
-import json
-from typing import Dict
+from typing import Dict, List
 
 from ..core.interfaces import AIProvider
+from ..core.models import HttpError, ProviderError
 from ..config import GeminiConfig
-from ..utils import RequestsHttpClient
+from ..utils import get_shared_http_client, json_loads
+from .base import PARSE_ERRORS, pack_batch_prompt, unpack_batch_response
 
 
 class GeminiProvider(AIProvider):
     """Proveedor para Google Gemini API - Hasta 60 llamadas/minuto gratis"""
 
+    requests_per_minute = 60
+
     def __init__(self, config: GeminiConfig = None, http_client=None,
                  api_key: str = None, model: str = None):
         if config:
             self.api_key = config.api_key
             self.model = config.model
             self.base_url = config.base_url
+            if config.requests_per_minute:
+                self.requests_per_minute = config.requests_per_minute
         else:
             self.api_key = api_key or ""
             self.model = model or "gemini-1.5-flash"
             self.base_url = "https://generativelanguage.googleapis.com/v1beta"
 
-        self.http_client = http_client or RequestsHttpClient()
+        self.http_client = http_client or get_shared_http_client()
+
+        # Partes constantes de cada petición, calculadas una sola vez
+        self._url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
+        self._headers = {"Content-Type": "application/json"}
+        self._generation_config = {
+            "temperature": 0.1,
+            "responseMimeType": "application/json"
+        }
+        self._name = f"Gemini ({self.model})"
 
     def get_name(self) -> str:
-        return f"Gemini ({self.model})"
+        return self._name
+
+    def health_check(self, timeout: float = 3.0) -> bool:
+        """Consulta los datos del modelo (valida también la API key)"""
+        try:
+            response = self.http_client.get(
+                f"{self.base_url}/models/{self.model}?key={self.api_key}",
+                timeout=timeout
+            )
+        except HttpError:
+            return False
+        return response.status_code == 200
 
     def generate(self, prompt: str) -> Dict:
         """Genera respuesta usando Gemini API"""
         try:
-            url = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
-
             response = self.http_client.post(
-                url,
-                headers={"Content-Type": "application/json"},
+                self._url,
+                headers=self._headers,
                 json={
                     "contents": [{
                         "parts": [{"text": prompt}]
                     }],
-                    "generationConfig": {
-                        "temperature": 0.1,
-                        "responseMimeType": "application/json"
-                    }
+                    "generationConfig": self._generation_config
                 },
                 timeout=30
             )
+        except HttpError as e:
+            raise ProviderError("Gemini", e, original=e) from e
 
-            if response.status_code == 200:
-                result = response.json()
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                return json.loads(content)
-            else:
-                raise Exception(f"Gemini error: {response.status_code}")
+        if response.status_code != 200:
+            raise ProviderError("Gemini", f"Gemini error: {response.status_code}",
+                                status_code=response.status_code)
+
+        try:
+            result = response.json()
+            content = result['candidates'][0]['content']['parts'][0]['text']
+            return json_loads(content)
+        except PARSE_ERRORS as e:
+            raise ProviderError("Gemini", e, original=e) from e
 
-        except Exception as e:
-            raise Exception(f"Error en Gemini: {e}")
+    def generate_batch(self, prompts: List[str]) -> List[Dict]:
+        """Resuelve varios prompts en una sola petición"""
+        if len(prompts) == 1:
+            return [self.generate(prompts[0])]
+        result = self.generate(pack_batch_prompt(prompts))
+        return unpack_batch_response(result, len(prompts))
@@ -2,38 +2,61 @@
 Proveedor de IA para Ollama local
 """
 
-import json
-import re
 from typing import Dict
 
 from ..core.interfaces import AIProvider
+from ..core.models import HttpError, ProviderError
 from ..config import OllamaConfig
-from ..utils import RequestsHttpClient
+from ..utils import get_shared_http_client, json_loads
+from .base import PARSE_ERRORS
+
+
+def _strip_code_fence(text: str) -> str:
+    """Quita el bloque markdown ```json ... ``` que algunos modelos agregan"""
+    if text.startswith('```json'):
+        text = text[7:]
+    elif text.startswith('```'):
+        text = text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    return text.strip()
 
 
 class OllamaProvider(AIProvider):
     """Proveedor para Ollama local"""
 
     def __init__(self, config: OllamaConfig = None, http_client=None,
-                 host: str = None, model: str = None):
+                 host: str = None, model: str = None, num_predict: int = 512):
         """
         Args:
             config: Configuración de Ollama
             http_client: Cliente HTTP inyectable
             host: Host de Ollama (legacy, para compatibilidad)
             model: Modelo a usar (legacy, para compatibilidad)
+            num_predict: Máximo de tokens que puede generar el modelo
         """
         if config:
             self.host = config.host
             self.model = config.model
+            self.num_predict = config.num_predict
         else:
             self.host = host or "http://localhost:11434"
             self.model = model or "llama3.2"
+            self.num_predict = num_predict
 
-        self.http_client = http_client or RequestsHttpClient()
+        self.http_client = http_client or get_shared_http_client()
+        self._name = f"Ollama ({self.model})"
 
     def get_name(self) -> str:
-        return f"Ollama ({self.model})"
+        return self._name
+
+    def health_check(self, timeout: float = 3.0) -> bool:
+        """Consulta los modelos instalados en Ollama"""
+        try:
+            response = self.http_client.get(f"{self.host}/api/tags", timeout=timeout)
+        except HttpError:
+            return False
+        return response.status_code == 200
 
     def generate(self, prompt: str) -> Dict:
         """Genera respuesta usando Ollama local"""
@@ -44,24 +67,32 @@ class OllamaProvider(AIProvider):
                     "model": self.model,
                     "prompt": prompt,
                     "stream": False,
-                    "format": "json"
+                    "format": "json",
+                    "options": {"num_predict": self.num_predict}
                 },
                 timeout=30
             )
+        except HttpError as e:
+            raise ProviderError("Ollama", e, original=e) from e
 
-            if response.status_code == 200:
-                result = response.json()
-                response_text = result.get('response', '{}')
-                return self._parse_response(response_text)
-            else:
-                raise Exception(f"Ollama error: {response.status_code}")
+        if response.status_code != 200:
+            raise ProviderError("Ollama", f"Ollama error: {response.status_code}",
+                                status_code=response.status_code)
 
-        except Exception as e:
-            raise Exception(f"Error en Ollama: {e}")
+        try:
+            result = response.json()
+            response_text = result.get('response', '{}')
+            return self._parse_response(response_text)
+        except PARSE_ERRORS as e:
+            raise ProviderError("Ollama", e, original=e) from e
 
     def _parse_response(self, response_text: str) -> Dict:
         """Parsea y limpia la respuesta JSON"""
+        # Con format=json Ollama devuelve JSON puro: se parsea directamente
+        if response_text and response_text[0] in '{[':
+            return json_loads(response_text)
+
         response_text = response_text.strip()
         if response_text.startswith('```'):
-            response_text = re.sub(r'```json\s*|\s*```', '', response_text)
-        return json.loads(response_text)
+            response_text = _strip_code_fence(response_text)
+        return json_loads(response_text)
@@ -0,0 +1,140 @@
+"""
+Base común para proveedores con API compatible con OpenAI (chat/completions)
+"""
+
+import gzip
+from typing import Dict, List, Optional
+
+from ..core.interfaces import AIProvider
+from ..core.models import HttpError, ProviderError
+from ..utils import get_shared_http_client, json_loads, json_dumps
+from .base import PARSE_ERRORS, pack_batch_prompt, unpack_batch_response
+
+
+class OpenAICompatibleProvider(AIProvider):
+    """
+    Proveedor genérico para APIs compatibles con OpenAI.
+
+    Las subclases solo definen nombre, modelo y URL por defecto y, si hace
+    falta, headers adicionales.
+    """
+
+    provider_name: str = "OpenAI"
+    default_model: str = ""
+    default_base_url: str = ""
+    # Headers adicionales propios del proveedor
+    extra_headers: Dict[str, str] = {}
+    # Incluir el cuerpo de la respuesta en el mensaje de error
+    include_error_body: bool = False
+
+    def __init__(self, config=None, http_client=None,
+                 api_key: str = None, model: str = None,
+                 compress_threshold: Optional[int] = None):
+        """
+        Args:
+            config: Configuración del proveedor
+            http_client: Cliente HTTP inyectable
+            api_key: API key (si no se pasa config)
+            model: Modelo a usar (si no se pasa config)
+            compress_threshold: Bytes a partir de los cuales el cuerpo se
+                envía comprimido con gzip. None lo desactiva (por defecto),
+                ya que no todos los servidores aceptan Content-Encoding.
+                Si no se pasa, se toma de config.
+        """
+        if config:
+            self.api_key = config.api_key
+            self.model = config.model
+            self.base_url = config.base_url
+            if config.requests_per_minute:
+                self.requests_per_minute = config.requests_per_minute
+            if compress_threshold is None:
+                compress_threshold = getattr(config, 'compress_threshold', None)
+        else:
+            self.api_key = api_key or ""
+            self.model = model or self.default_model
+            self.base_url = self.default_base_url
+
+        self.http_client = http_client or get_shared_http_client()
+
+        # Partes constantes de cada petición, calculadas una sola vez
+        self._url = f"{self.base_url}/chat/completions"
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            **self.extra_headers,
+        }
+        self._base_payload = {
+            "model": self.model,
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"}
+        }
+        self.compress_threshold = compress_threshold
+        self._gzip_headers = {**self._headers, "Content-Encoding": "gzip"}
+        self._name = f"{self.provider_name} ({self.model})"
+
+    def get_name(self) -> str:
+        return self._name
+
+    def health_check(self, timeout: float = 3.0) -> bool:
+        """Consulta el listado de modelos (valida también la API key)"""
+        try:
+            response = self.http_client.get(
+                f"{self.base_url}/models",
+                headers=self._headers,
+                timeout=timeout
+            )
+        except HttpError:
+            return False
+        return response.status_code == 200
+
+    def generate(self, prompt: str) -> Dict:
+        """Genera respuesta usando el endpoint chat/completions"""
+        payload = {
+            **self._base_payload,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        try:
+            response = self._post(payload)
+        except HttpError as e:
+            raise ProviderError(self.provider_name, e, original=e) from e
+
+        if response.status_code != 200:
+            message = f"{self.provider_name} error: {response.status_code}"
+            if self.include_error_body:
+                message = f"{message} - {response.text}"
+            raise ProviderError(self.provider_name, message, status_code=response.status_code)
+
+        try:
+            result = response.json()
+            content = result['choices'][0]['message']['content']
+            return json_loads(content)
+        except PARSE_ERRORS as e:
+            raise ProviderError(self.provider_name, e, original=e) from e
+
+    def _post(self, payload: Dict):
+        """Envía el payload, comprimido con gzip si supera el umbral"""
+        if self.compress_threshold is not None:
+            body = json_dumps(payload)
+            if len(body) > self.compress_threshold:
+                return self.http_client.post(
+                    self._url,
+                    headers=self._gzip_headers,
+                    data=gzip.compress(body, compresslevel=1),
+                    timeout=30
+                )
+
+        return self.http_client.post(
+            self._url,
+            headers=self._headers,
+            json=payload,
+            timeout=30
+        )
+
+    def generate_batch(self, prompts: List[str]) -> List[Dict]:
+        """Resuelve varios prompts en una sola petición"""
+        if len(prompts) == 1:
+            return [self.generate(prompts[0])]
+        result = self.generate(pack_batch_prompt(prompts))
+        return unpack_batch_response(result, len(prompts))
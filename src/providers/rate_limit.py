@@ -0,0 +1,165 @@
+"""
+Control local de cuota y estado de salud de los proveedores de IA.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket para respetar el límite de peticiones por minuto.
+
+    Se recarga a rate tokens por segundo hasta un máximo de burst.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, rpm: int, headroom: float = 1.0) -> "TokenBucket":
+        """
+        Crea un bucket a partir de un límite de peticiones por minuto
+
+        headroom < 1 deja margen bajo el límite real del servidor.
+        """
+        effective = rpm * headroom
+        return cls(rate=effective / 60, burst=max(1.0, float(int(effective))))
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def try_consume(self) -> bool:
+        """Consume un token si hay disponible"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def refund(self):
+        """Devuelve un token consumido que no llegó a usarse"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def drain(self):
+        """Vacía el bucket (p.ej. tras recibir un 429)"""
+        with self._lock:
+            self._tokens = 0
+            self._updated = time.monotonic()
+
+
+class ProviderStats:
+    """Estadísticas de un proveedor: cuota, latencia y tasa de éxito"""
+
+    # Peso de la última observación en las medias móviles
+    ALPHA = 0.2
+    # Espera por defecto tras un 429 (la respuesta no expone Retry-After)
+    RATE_LIMIT_COOLDOWN = 60.0
+    # Fracción del límite documentado que se usa localmente
+    RATE_HEADROOM = 0.95
+    # Fallos consecutivos que abren el circuito y espera máxima
+    FAILURE_THRESHOLD = 3
+    MAX_OPEN_SECONDS = 300.0
+    # Resultados recientes usados para la tasa de fallos
+    OUTCOME_WINDOW = 20
+
+    def __init__(self, requests_per_minute: Optional[int] = None):
+        self.bucket = (
+            TokenBucket.per_minute(requests_per_minute, self.RATE_HEADROOM)
+            if requests_per_minute else None
+        )
+        self.ewma_latency = 0.0
+        self.latency_samples = 0
+        self.blocked_until = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._outcomes = deque(maxlen=self.OUTCOME_WINDOW)
+
+    def is_available(self) -> bool:
+        """Indica si el proveedor puede recibir una petición ahora"""
+        now = time.monotonic()
+        if now < self.blocked_until or now < self.open_until:
+            return False
+        return self.bucket is None or self.bucket.tokens >= 1
+
+    def acquire(self):
+        """Descuenta una petición de la cuota"""
+        if self.bucket is not None:
+            self.bucket.try_consume()
+
+    def release(self):
+        """Devuelve a la cuota una petición que finalmente no se envió"""
+        if self.bucket is not None:
+            self.bucket.refund()
+
+    @property
+    def has_metrics(self) -> bool:
+        """Indica si ya se registró alguna llamada"""
+        return bool(self._outcomes)
+
+    @property
+    def failure_rate(self) -> float:
+        """Fracción de fallos entre los últimos OUTCOME_WINDOW resultados"""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def expected_latency(self) -> float:
+        """
+        Latencia esperada penalizada por fallos: menor es mejor
+
+        Un proveedor que aún no respondió con éxito vale infinito.
+        """
+        if not self.latency_samples:
+            return float('inf')
+        return self.ewma_latency * (1 + self.failure_rate)
+
+    def record_success(self, elapsed: float):
+        if self.latency_samples:
+            self.ewma_latency = (1 - self.ALPHA) * self.ewma_latency + self.ALPHA * elapsed
+        else:
+            # La primera muestra fija la media en lugar de promediarse con 0
+            self.ewma_latency = elapsed
+        self.latency_samples += 1
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, error: Exception):
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.FAILURE_THRESHOLD:
+            # Circuit breaker: la espera se duplica con cada fallo adicional
+            self.open_circuit()
+        if getattr(error, "status_code", None) == 429:
+            self.block(self.RATE_LIMIT_COOLDOWN)
+
+    def open_circuit(self):
+        """Abre el circuito como si se hubiera alcanzado el umbral de fallos"""
+        self.consecutive_failures = max(self.consecutive_failures, self.FAILURE_THRESHOLD)
+        wait = min(self.MAX_OPEN_SECONDS, 2 ** self.consecutive_failures)
+        self.open_until = time.monotonic() + wait
+
+    def block(self, seconds: float):
+        """Marca el proveedor como no disponible durante seconds"""
+        self.blocked_until = time.monotonic() + seconds
+        if self.bucket is not None:
+            self.bucket.drain()
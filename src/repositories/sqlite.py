@@ -4,14 +4,24 @@ Permite abstraer el acceso a datos y facilita testing.
 """
 
 import sqlite3
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import Iterable, Iterator, List, Dict, Optional, Set, Tuple
+from datetime import datetime, timedelta
 from pathlib import Path
 
 from ..core.interfaces import EmailRepository
 from ..core.models import Email, EmailClassification
 from ..config import DatabaseConfig
 
+_INSERT_CLASSIFICATION = '''
+    INSERT OR REPLACE INTO processed_emails
+    (gmail_id, subject, sender, category, priority, priority_rank, summary, amount)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Orden de las prioridades en el resumen diario (el resto va al final)
+_PRIORITY_RANK = {'urgente': 0, 'normal': 1}
+_DEFAULT_PRIORITY_RANK = 2
+
 
 class SQLiteEmailRepository(EmailRepository):
     """
@@ -19,6 +29,9 @@ class SQLiteEmailRepository(EmailRepository):
     Esta es la implementación real para producción.
     """
 
+    # Parámetros por consulta (SQLite antiguos limitan a 999)
+    MAX_QUERY_PARAMS = 500
+
     def __init__(self, config: DatabaseConfig):
         self.db_path = config.path
         self._connection: Optional[sqlite3.Connection] = None
@@ -30,6 +43,12 @@ class SQLiteEmailRepository(EmailRepository):
             db_dir = Path(self.db_path).parent
             db_dir.mkdir(parents=True, exist_ok=True)
             self._connection = sqlite3.connect(self.db_path)
+            # WAL: las escrituras no bloquean lecturas y cada commit no
+            # espera un fsync de la base completa
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('PRAGMA temp_store=MEMORY')
+            self._connection.execute('PRAGMA cache_size=-20000')
         return self._connection
 
     def close(self):
@@ -51,6 +70,7 @@ class SQLiteEmailRepository(EmailRepository):
                 sender TEXT,
                 category TEXT,
                 priority TEXT,
+                priority_rank INTEGER DEFAULT 2,
                 summary TEXT,
                 amount TEXT,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -58,6 +78,26 @@ class SQLiteEmailRepository(EmailRepository):
             )
         ''')
 
+        # Bases creadas antes de existir priority_rank
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(processed_emails)')}
+        if 'priority_rank' not in columns:
+            cursor.execute(
+                'ALTER TABLE processed_emails ADD COLUMN priority_rank INTEGER DEFAULT 2'
+            )
+            cursor.execute('''
+                UPDATE processed_emails SET priority_rank = CASE priority
+                    WHEN 'urgente' THEN 0
+                    WHEN 'normal' THEN 1
+                    ELSE 2
+                END
+            ''')
+
+        # Las consultas del resumen diario filtran por rango de processed_at
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_processed_at
+            ON processed_emails(processed_at)
+        ''')
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS daily_stats (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -70,6 +110,13 @@ class SQLiteEmailRepository(EmailRepository):
             )
         ''')
 
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
         conn.commit()
 
     def is_processed(self, email_id: str) -> bool:
@@ -83,54 +130,73 @@ class SQLiteEmailRepository(EmailRepository):
         result = cursor.fetchone()
         return result is not None
 
+    def get_processed_ids(self, email_ids: Iterable[str]) -> Set[str]:
+        """
+        Retorna cuáles de email_ids ya fueron procesados
+
+        Una consulta con IN por cada MAX_QUERY_PARAMS ids en lugar de una
+        por correo.
+        """
+        email_ids = list(email_ids)
+        conn = self._get_connection()
+        processed = set()
+        for start in range(0, len(email_ids), self.MAX_QUERY_PARAMS):
+            chunk = email_ids[start:start + self.MAX_QUERY_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'SELECT gmail_id FROM processed_emails WHERE gmail_id IN ({placeholders})',
+                chunk
+            )
+            processed.update(row[0] for row in cursor)
+        return processed
+
     def save_classification(self, email: Email, classification: EmailClassification) -> None:
         """Guarda la clasificación en la base de datos"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        self.save_classifications([(email, classification)])
 
-        cursor.execute('''
-            INSERT OR REPLACE INTO processed_emails
-            (gmail_id, subject, sender, category, priority, summary, amount)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            email.id,
-            email.subject,
-            email.sender,
-            classification.category,
-            classification.priority,
-            classification.summary,
-            classification.amount
-        ))
+    def save_classifications(
+        self, items: List[Tuple[Email, EmailClassification]]
+    ) -> None:
+        """
+        Guarda varias clasificaciones en una sola transacción
 
-        conn.commit()
+        Un solo commit para todo el lote en lugar de uno por correo.
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.executemany(_INSERT_CLASSIFICATION, [
+                (
+                    email.id,
+                    email.subject,
+                    email.sender,
+                    classification.category,
+                    classification.priority,
+                    _PRIORITY_RANK.get(classification.priority, _DEFAULT_PRIORITY_RANK),
+                    classification.summary,
+                    classification.amount
+                )
+                for email, classification in items
+            ])
 
     def get_daily_stats(self, date: str) -> List[Dict]:
         """Obtiene estadísticas del día"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        return [dict(row) for row in self.iter_daily_stats(date)]
 
+    def iter_daily_stats(self, date: str) -> Iterator[sqlite3.Row]:
+        """Recorre las estadísticas del día fila por fila desde el cursor"""
+        cursor = self._get_connection().cursor()
+        cursor.row_factory = sqlite3.Row
+
+        # Rango [día, día siguiente) en lugar de DATE(processed_at) = ?:
+        # la función sobre la columna impediría usar idx_processed_at
+        next_day = (datetime.fromisoformat(date) + timedelta(days=1)).strftime('%Y-%m-%d')
         cursor.execute('''
             SELECT priority, subject, summary, amount
             FROM processed_emails
-            WHERE DATE(processed_at) = ?
-            ORDER BY
-                CASE priority
-                    WHEN 'urgente' THEN 1
-                    WHEN 'normal' THEN 2
-                    ELSE 3
-                END
-        ''', (date,))
-
-        rows = cursor.fetchall()
-        return [
-            {
-                'priority': row[0],
-                'subject': row[1],
-                'summary': row[2],
-                'amount': row[3]
-            }
-            for row in rows
-        ]
+            WHERE processed_at >= ? AND processed_at < ?
+            ORDER BY priority_rank
+        ''', (date, next_day))
+        return cursor
 
     def get_all_processed(self) -> List[Dict]:
         """Obtiene todos los correos procesados"""
@@ -158,6 +224,22 @@ class SQLiteEmailRepository(EmailRepository):
             for row in rows
         ]
 
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """Obtiene un valor de estado de sincronización"""
+        row = self._get_connection().execute(
+            'SELECT value FROM sync_state WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_sync_state(self, key: str, value: str) -> None:
+        """Guarda un valor de estado de sincronización"""
+        conn = self._get_connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                (key, value)
+            )
+
 
 class InMemoryEmailRepository(EmailRepository):
     """
@@ -167,6 +249,7 @@ class InMemoryEmailRepository(EmailRepository):
 
     def __init__(self):
         self.emails: Dict[str, Dict] = {}
+        self.sync_state: Dict[str, str] = {}
         self.initialized = False
 
     def init_database(self) -> None:
@@ -177,6 +260,10 @@ class InMemoryEmailRepository(EmailRepository):
         """Verifica si un correo ya fue procesado"""
         return email_id in self.emails
 
+    def get_processed_ids(self, email_ids: Iterable[str]) -> Set[str]:
+        """Retorna cuáles de email_ids ya fueron procesados"""
+        return self.emails.keys() & set(email_ids)
+
     def save_classification(self, email: Email, classification: EmailClassification) -> None:
         """Guarda la clasificación en memoria"""
         self.emails[email.id] = {
@@ -201,9 +288,18 @@ class InMemoryEmailRepository(EmailRepository):
                 })
         return results
 
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """Obtiene un valor de estado de sincronización"""
+        return self.sync_state.get(key)
+
+    def set_sync_state(self, key: str, value: str) -> None:
+        """Guarda un valor de estado de sincronización"""
+        self.sync_state[key] = value
+
     def clear(self):
         """Limpia todos los datos (útil entre tests)"""
         self.emails.clear()
+        self.sync_state.clear()
 
     def get_all(self) -> Dict[str, Dict]:
         """Retorna todos los datos almacenados"""
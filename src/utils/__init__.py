@@ -2,9 +2,17 @@
 Módulo de utilidades
 """
 
-from .http import RequestsHttpClient, MockHttpClient
+from .http import RequestsHttpClient, HttpxHttpClient, MockHttpClient, get_shared_http_client
+from .serialization import json_loads, json_dumps
+from .text import KeywordMatcher, clean_text
 
 __all__ = [
     "RequestsHttpClient",
+    "HttpxHttpClient",
     "MockHttpClient",
+    "get_shared_http_client",
+    "json_loads",
+    "json_dumps",
+    "KeywordMatcher",
+    "clean_text",
 ]
@@ -2,27 +2,101 @@
 Cliente HTTP abstracto para permitir testing con mocks.
 """
 
-from typing import Dict, Optional
+import threading
+from typing import Dict, Optional, Union
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401 - requerido por httpx para HTTP/2
+except ImportError:  # pragma: no cover - depende del entorno
+    httpx = None
 
 from ..core.models import HttpResponse, HttpError
+from .serialization import json_dumps
+
+
+def _encode_json(headers: Optional[Dict], payload: Dict):
+    """
+    Serializa el payload con json_dumps (orjson si está instalado)
+
+    Returns:
+        (headers con Content-Type, cuerpo en bytes)
+    """
+    if not headers or 'Content-Type' not in headers:
+        headers = {**(headers or {}), 'Content-Type': 'application/json'}
+    return headers, json_dumps(payload)
+
+
+def _response_text(response: requests.Response) -> str:
+    """
+    Decodifica el cuerpo sin la detección de charset de requests
+
+    response.text adivina la codificación recorriendo el contenido cuando el
+    servidor no la declara; las APIs JSON usan UTF-8.
+    """
+    return response.content.decode(response.encoding or 'utf-8', errors='replace')
 
 
 class RequestsHttpClient:
     """
     Implementación del cliente HTTP usando la librería requests.
     Esta es la implementación real para producción.
+
+    Mantiene una sesión persistente para reutilizar conexiones TCP/TLS
+    (keep-alive) entre peticiones al mismo host.
     """
 
-    def __init__(self, timeout: int = 30):
+    # Errores transitorios del servidor que vale la pena reintentar.
+    # 429 no se reintenta aquí: lo maneja la rotación de proveedores.
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, timeout: int = 30, pool_connections: int = 8,
+                 pool_maxsize: int = 16, retries: int = 0,
+                 backoff_factor: float = 0.3):
+        """
+        Args:
+            timeout: Timeout por defecto en segundos
+            pool_connections: Hosts distintos con pool propio
+            pool_maxsize: Conexiones reutilizables por host
+            retries: Reintentos ante errores de conexión y 5xx (0 = ninguno)
+            backoff_factor: Base de la espera exponencial entre reintentos
+        """
         self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=retries,
+                # Un timeout de lectura puede significar que el servidor ya
+                # procesó la petición: repetirla gastaría cuota y tokens
+                read=0,
+                backoff_factor=backoff_factor,
+                status_forcelist=self.RETRY_STATUSES,
+                allowed_methods=None,
+                raise_on_status=False
+            )
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def close(self):
+        """Cierra la sesión y sus conexiones abiertas"""
+        self._session.close()
 
     def post(self, url: str, headers: Optional[Dict] = None,
-             json: Optional[Dict] = None, data: Optional[Dict] = None,
+             json: Optional[Dict] = None, data: Optional[Union[Dict, bytes]] = None,
              timeout: Optional[int] = None) -> HttpResponse:
         """Realiza una petición POST"""
+        if json is not None and data is None:
+            headers, data = _encode_json(headers, json)
+            json = None
+
         try:
-            response = requests.post(
+            response = self._session.post(
                 url,
                 headers=headers,
                 json=json,
@@ -31,7 +105,8 @@ class RequestsHttpClient:
             )
             return HttpResponse(
                 status_code=response.status_code,
-                text=response.text
+                text=_response_text(response),
+                content=response.content
             )
         except requests.exceptions.RequestException as e:
             raise HttpError(f"Error en petición POST a {url}: {e}")
@@ -41,7 +116,7 @@ class RequestsHttpClient:
             timeout: Optional[int] = None) -> HttpResponse:
         """Realiza una petición GET"""
         try:
-            response = requests.get(
+            response = self._session.get(
                 url,
                 headers=headers,
                 params=params,
@@ -49,12 +124,116 @@ class RequestsHttpClient:
             )
             return HttpResponse(
                 status_code=response.status_code,
-                text=response.text
+                text=_response_text(response),
+                content=response.content
             )
         except requests.exceptions.RequestException as e:
             raise HttpError(f"Error en petición GET a {url}: {e}")
 
 
+class HttpxHttpClient:
+    """
+    Cliente HTTP sobre httpx con HTTP/2.
+
+    Con HTTP/2 las peticiones concurrentes (p.ej. desde generate_many) al
+    mismo host se multiplexan sobre una sola conexión TCP/TLS.
+    Requiere: pip install 'httpx[http2]'
+    """
+
+    def __init__(self, timeout: int = 30, max_connections: int = 32,
+                 max_keepalive_connections: int = 16, retries: int = 0):
+        if httpx is None:
+            raise Exception("httpx no está instalado. Ejecuta: pip install 'httpx[http2]'")
+
+        self.timeout = timeout
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self._client = httpx.Client(
+            timeout=timeout,
+            transport=httpx.HTTPTransport(http2=True, limits=limits, retries=retries)
+        )
+
+    def close(self):
+        """Cierra el cliente y sus conexiones abiertas"""
+        self._client.close()
+
+    def post(self, url: str, headers: Optional[Dict] = None,
+             json: Optional[Dict] = None, data: Optional[Union[Dict, bytes]] = None,
+             timeout: Optional[int] = None) -> HttpResponse:
+        """Realiza una petición POST"""
+        if json is not None and data is None:
+            headers, data = _encode_json(headers, json)
+            json = None
+
+        # httpx separa cuerpos en bytes (content) de formularios (data)
+        content = data if isinstance(data, (bytes, bytearray)) else None
+        if content is not None:
+            data = None
+
+        try:
+            response = self._client.post(
+                url,
+                headers=headers,
+                json=json,
+                data=data,
+                content=content,
+                timeout=timeout or self.timeout
+            )
+            return HttpResponse(
+                status_code=response.status_code,
+                text=response.text,
+                content=response.content
+            )
+        except httpx.HTTPError as e:
+            raise HttpError(f"Error en petición POST a {url}: {e}")
+
+    def get(self, url: str, headers: Optional[Dict] = None,
+            params: Optional[Dict] = None,
+            timeout: Optional[int] = None) -> HttpResponse:
+        """Realiza una petición GET"""
+        try:
+            response = self._client.get(
+                url,
+                headers=headers,
+                params=params,
+                timeout=timeout or self.timeout
+            )
+            return HttpResponse(
+                status_code=response.status_code,
+                text=response.text,
+                content=response.content
+            )
+        except httpx.HTTPError as e:
+            raise HttpError(f"Error en petición GET a {url}: {e}")
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_http_client():
+    """
+    Retorna un cliente HTTP compartido por todo el proceso.
+
+    Se crea la primera vez que se pide, así todos los proveedores usan un
+    único pool de conexiones en lugar de uno cada uno. Usa HttpxHttpClient
+    (HTTP/2) si httpx[http2] está instalado y RequestsHttpClient si no.
+    Reintenta errores de conexión (y 5xx con requests), ya que las llamadas
+    a los modelos no tienen efectos secundarios.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                if httpx is not None:
+                    _shared_client = HttpxHttpClient(retries=2)
+                else:
+                    _shared_client = RequestsHttpClient(retries=2)
+    return _shared_client
+
+
 class MockHttpClient:
     """
     Cliente HTTP mock para testing.
@@ -78,7 +257,7 @@ class MockHttpClient:
         )
 
     def post(self, url: str, headers: Optional[Dict] = None,
-             json: Optional[Dict] = None, data: Optional[Dict] = None,
+             json: Optional[Dict] = None, data: Optional[Union[Dict, bytes]] = None,
              timeout: Optional[int] = None) -> HttpResponse:
         """Simula una petición POST"""
         self.calls.append({
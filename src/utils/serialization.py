@@ -0,0 +1,50 @@
+"""
+Serialización JSON con aceleración opcional.
+Usa orjson o msgspec si están instalados y recurre a la librería estándar si no.
+"""
+
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depende del entorno
+    msgspec = None
+
+import json as _stdlib_json
+
+# Decoder sin esquema: las respuestas siguen siendo dicts para el resto del código
+_msgspec_decoder = msgspec.json.Decoder() if msgspec is not None else None
+
+
+def json_loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    Parsea un documento JSON desde str o bytes.
+
+    orjson y msgspec aceptan bytes directamente, evitando decodificar a str
+    antes de parsear.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if _msgspec_decoder is not None:
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            # Igual que orjson y json: los errores de parseo son ValueError
+            raise ValueError(str(e)) from e
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return _stdlib_json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serializa un objeto a JSON en bytes UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return _stdlib_json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,90 @@
+"""
+Utilidades de texto: limpieza de cuerpos de correo y búsqueda de varios
+grupos de keywords en una sola pasada.
+Usa pyahocorasick si está instalado y una expresión regular combinada si no.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, Set
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - depende del entorno
+    ahocorasick = None
+
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def clean_text(text: str) -> str:
+    """
+    Quita etiquetas HTML y colapsa espacios, tabs y saltos de línea
+
+    split/join recorre el texto una sola vez en C en lugar de encadenar
+    varias sustituciones.
+    """
+    if '<' in text:
+        text = _HTML_TAG_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+class KeywordMatcher:
+    """
+    Detecta qué grupos de keywords aparecen en un texto.
+
+    Todas las keywords de todos los grupos se buscan en un solo recorrido
+    del texto, en lugar de un recorrido por keyword. La búsqueda distingue
+    mayúsculas: el texto y las keywords deben venir ya normalizados.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        """
+        Args:
+            groups: Nombre del grupo -> keywords que lo activan
+        """
+        tags: Dict[str, Set[str]] = {}
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                if keyword:
+                    tags.setdefault(keyword, set()).add(group)
+
+        # Una keyword que contiene a otra implica también los grupos de esa
+        # otra; así basta con el match más largo en cada posición
+        self._tags: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset().union(*(
+                groups_of for other, groups_of in tags.items() if other in keyword
+            ))
+            for keyword in tags
+        }
+        self._group_count = len({g for groups_of in tags.values() for g in groups_of})
+
+        self._automaton = None
+        self._regex = None
+        if not self._tags:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, groups_of in self._tags.items():
+                self._automaton.add_word(keyword, groups_of)
+            self._automaton.make_automaton()
+        else:
+            # Lookahead: prueba cada posición; las más largas primero
+            alternation = '|'.join(
+                map(re.escape, sorted(self._tags, key=len, reverse=True))
+            )
+            self._regex = re.compile(f'(?=({alternation}))')
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """Retorna los grupos con al menos una keyword presente en text"""
+        if self._automaton is not None:
+            matches = (groups_of for _, groups_of in self._automaton.iter(text))
+        elif self._regex is not None:
+            matches = (self._tags[m.group(1)] for m in self._regex.finditer(text))
+        else:
+            return frozenset()
+
+        found: Set[str] = set()
+        for groups_of in matches:
+            found |= groups_of
+            if len(found) == self._group_count:
+                break
+        return frozenset(found)
@@ -2,6 +2,11 @@
 Pruebas unitarias para AIProviders.
 """
 
+import asyncio
+import gzip
+import threading
+import time
+
 import pytest
 import json
 from src.providers import (
@@ -12,7 +17,8 @@ from src.providers import (
 )
 from src.config import (
     AIProviderConfig, OllamaConfig, GroqConfig,
-    CerebrasConfig, GeminiConfig, OpenRouterConfig
+    CerebrasConfig, GeminiConfig, OpenRouterConfig,
+    load_config_from_env, get_app_config
 )
 from src.utils import MockHttpClient
 from src.core.models import HttpResponse
@@ -53,6 +59,20 @@ class TestOllamaProvider:
         assert result["category"] == "pago"
         assert result["priority"] == "urgente"
 
+    def test_limits_generated_tokens(self, mock_http_client):
+        """Limita la cantidad de tokens generados con num_predict"""
+        mock_http_client.set_json_response(
+            "http://localhost:11434/api/generate",
+            200,
+            {"response": "{}"}
+        )
+
+        provider = OllamaProvider(num_predict=64, http_client=mock_http_client)
+        provider.generate("Test")
+
+        payload = mock_http_client.get_calls("POST")[0]["json"]
+        assert payload["options"]["num_predict"] == 64
+
     def test_generate_with_markdown_response(self, mock_http_client):
         """Maneja respuesta con markdown"""
         response_data = {
@@ -101,6 +121,20 @@ class TestOllamaProvider:
         assert provider.host == "http://custom:11434"
         assert provider.model == "custom-model"
 
+    def test_shares_default_http_client(self):
+        """Los proveedores sin cliente explícito comparten uno solo"""
+        ollama = OllamaProvider()
+        groq = GroqProvider(api_key="test")
+
+        assert ollama.http_client is groq.http_client
+
+    def test_health_check(self, mock_http_client):
+        """health_check consulta /api/tags"""
+        provider = OllamaProvider(http_client=mock_http_client)
+
+        assert provider.health_check() is True
+        assert mock_http_client.get_calls("GET")[0]["url"] == "http://localhost:11434/api/tags"
+
 
 class TestGroqProvider:
     """Pruebas para GroqProvider"""
@@ -159,6 +193,97 @@ class TestGroqProvider:
         assert len(calls) == 1
         assert calls[0]["headers"]["Authorization"] == "Bearer my_api_key"
 
+    def test_compresses_large_payloads(self, mock_http_client):
+        """Comprime con gzip los cuerpos que superan el umbral"""
+        mock_http_client.set_json_response(
+            "https://api.groq.com/openai/v1/chat/completions",
+            200,
+            {"choices": [{"message": {"content": "{}"}}]}
+        )
+
+        provider = GroqProvider(
+            api_key="test",
+            http_client=mock_http_client,
+            compress_threshold=300
+        )
+        provider.generate("x" * 500)
+        provider.generate("corto")
+
+        large, small = mock_http_client.get_calls("POST")
+        assert large["headers"]["Content-Encoding"] == "gzip"
+        body = json.loads(gzip.decompress(large["data"]))
+        assert body["messages"][0]["content"] == "x" * 500
+        assert "Content-Encoding" not in small["headers"]
+        assert small["json"]["messages"][0]["content"] == "corto"
+
+    def test_generate_batch_single_request(self, mock_http_client):
+        """Resuelve varios prompts en una sola petición"""
+        response_data = {
+            "choices": [{
+                "message": {
+                    "content": json.dumps({
+                        "text2": {"category": "b"}, "text1": {"category": "a"}
+                    })
+                }
+            }]
+        }
+        mock_http_client.set_json_response(
+            "https://api.groq.com/openai/v1/chat/completions",
+            200,
+            response_data
+        )
+
+        provider = GroqProvider(api_key="test", http_client=mock_http_client)
+
+        results = provider.generate_batch(["Prompt A", "Prompt B"])
+
+        assert [r["category"] for r in results] == ["a", "b"]
+        assert len(mock_http_client.get_calls("POST")) == 1
+
+    def test_generate_batch_sends_shared_instructions_once(self, mock_http_client):
+        """Las instrucciones comunes van una sola vez y cada tarea con su id"""
+        response_data = {
+            "choices": [{
+                "message": {
+                    "content": json.dumps({
+                        "text1": {"category": "a"}, "text2": {"category": "b"}
+                    })
+                }
+            }]
+        }
+        mock_http_client.set_json_response(
+            "https://api.groq.com/openai/v1/chat/completions",
+            200,
+            response_data
+        )
+
+        provider = GroqProvider(api_key="test", http_client=mock_http_client)
+        instructions = "Clasifica el correo.\n\n"
+        provider.generate_batch([instructions + "Correo A", instructions + "Correo B"])
+
+        content = mock_http_client.get_calls("POST")[0]["json"]["messages"][0]["content"]
+        assert content.count("Clasifica el correo.") == 1
+        assert "### text1\nCorreo A" in content
+        assert "### text2\nCorreo B" in content
+
+    def test_generate_batch_missing_id(self, mock_http_client):
+        """Falla si la respuesta no tiene un resultado por prompt"""
+        response_data = {
+            "choices": [{
+                "message": {"content": json.dumps({"text1": {"category": "a"}})}
+            }]
+        }
+        mock_http_client.set_json_response(
+            "https://api.groq.com/openai/v1/chat/completions",
+            200,
+            response_data
+        )
+
+        provider = GroqProvider(api_key="test", http_client=mock_http_client)
+
+        with pytest.raises(ValueError):
+            provider.generate_batch(["Prompt A", "Prompt B"])
+
 
 class TestCerebrasProvider:
     """Pruebas para CerebrasProvider"""
@@ -392,6 +517,394 @@ class TestAIProviderManager:
 
         assert result["source"] == "p1"
 
+    def test_generate_async_uses_first_provider(self):
+        """generate_async respeta la rotación"""
+        p1 = MockAIProvider("P1")
+        p1.set_default_response({"source": "p1"})
+
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+
+        manager = AIProviderManager([p1, p2])
+
+        result = asyncio.run(manager.generate_async("Test"))
+
+        assert result["source"] == "p1"
+        assert len(p2.get_calls()) == 0
+
+    def test_generate_async_failover_on_error(self):
+        """generate_async pasa al siguiente proveedor si uno falla"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "P1 failed")
+
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+
+        manager = AIProviderManager([p1, p2], hedge_delay=None)
+
+        result = asyncio.run(manager.generate_async("Test"))
+
+        assert result["source"] == "p2"
+
+    def test_generate_async_hedges_slow_provider(self):
+        """generate_async lanza otro proveedor si el primero tarda"""
+        class SlowProvider(MockAIProvider):
+            def generate(self, prompt):
+                time.sleep(0.2)
+                return super().generate(prompt)
+
+        p1 = SlowProvider("P1")
+        p1.set_default_response({"source": "p1"})
+
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+
+        manager = AIProviderManager([p1, p2], hedge_delay=0.01)
+
+        result = asyncio.run(manager.generate_async("Test"))
+
+        assert result["source"] == "p2"
+
+    def test_settled_hedge_does_not_call_provider(self):
+        """Un intento que arranca con la carrera ya resuelta no llama al proveedor"""
+        p1 = MockAIProvider("P1")
+        p1.requests_per_minute = 60
+        manager = AIProviderManager([p1], hedge_delay=0.01)
+        assert manager.get_next_provider() == p1
+        stats = manager.get_stats(p1)
+        tokens = stats.bucket.tokens
+
+        settled = threading.Event()
+        settled.set()
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(manager._call_async(p1, "Test", settled))
+
+        assert p1.get_calls() == []
+        assert stats.bucket.tokens > tokens
+
+    def test_generate_async_all_providers_fail(self):
+        """generate_async lanza error cuando todos fallan"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "P1 failed")
+
+        manager = AIProviderManager([p1])
+
+        with pytest.raises(Exception) as exc_info:
+            asyncio.run(manager.generate_async("Test"))
+
+        assert "Todos los proveedores fallaron" in str(exc_info.value)
+
+    def test_generate_many_keeps_order(self):
+        """generate_many devuelve las respuestas en el orden de los prompts"""
+        p1 = MockAIProvider("P1")
+        p1.set_response("uno", {"n": 1})
+        p1.set_response("dos", {"n": 2})
+
+        manager = AIProviderManager([p1])
+
+        results = asyncio.run(manager.generate_many(["uno", "dos"]))
+
+        assert [r["n"] for r in results] == [1, 2]
+
+    def test_generate_many_runs_concurrently(self):
+        """generate_many solapa las llamadas lentas"""
+        class SlowProvider(MockAIProvider):
+            def generate(self, prompt):
+                time.sleep(0.1)
+                return super().generate(prompt)
+
+        manager = AIProviderManager([SlowProvider("P1")], hedge_delay=None)
+
+        start = time.monotonic()
+        asyncio.run(manager.generate_many([f"p{i}" for i in range(4)], concurrency=4))
+
+        assert time.monotonic() - start < 0.35
+
+    def test_generate_many_returns_errors(self):
+        """Los fallos se devuelven en la posición del prompt"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "P1 failed")
+
+        manager = AIProviderManager([p1])
+
+        results = asyncio.run(manager.generate_many(["a"]))
+
+        assert isinstance(results[0], Exception)
+
+    def test_generate_batch_splits_in_chunks(self):
+        """generate_batch agrupa los prompts según batch_size"""
+        p1 = MockAIProvider("P1")
+        p1.set_default_response({"category": "ok"})
+
+        manager = AIProviderManager([p1], batch_size=2)
+
+        results = manager.generate_batch(["a", "b", "c"])
+
+        assert len(results) == 3
+        assert p1.calls == ["a", "b", "c"]
+
+    def test_generate_batch_failover(self):
+        """generate_batch reintenta el lote con el siguiente proveedor"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "P1 failed")
+
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+
+        manager = AIProviderManager([p1, p2])
+
+        results = manager.generate_batch(["a", "b"])
+
+        assert [r["source"] for r in results] == ["p2", "p2"]
+
+    def test_skips_provider_without_quota(self):
+        """La rotación salta proveedores que agotaron su cuota local"""
+        p1 = MockAIProvider("P1")
+        p1.requests_per_minute = 1
+        p2 = MockAIProvider("P2")
+
+        manager = AIProviderManager([p1, p2])
+
+        assert manager.get_next_provider() == p1
+        assert manager.get_next_provider() == p2
+        assert manager.get_next_provider() == p2
+
+    def test_local_quota_keeps_headroom(self):
+        """El bucket local queda un poco por debajo del límite documentado"""
+        groq = GroqProvider(config=GroqConfig(api_key="k", requests_per_minute=100))
+        manager = AIProviderManager([groq])
+
+        stats = manager.get_stats(groq)
+
+        assert groq.requests_per_minute == 100
+        assert stats.bucket.burst == 95
+
+    def test_rate_limited_provider_is_blocked(self):
+        """Un error 429 bloquea al proveedor y se usa el siguiente"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "rate limit", status_code=429)
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+
+        manager = AIProviderManager([p1, p2])
+        manager.generate("Test")
+
+        assert not manager.get_stats(p1).is_available()
+        assert manager.get_next_provider() == p2
+        assert manager.get_next_provider() == p2
+
+    def test_429_in_message_does_not_block(self):
+        """Solo el status 429 bloquea, no un '429' dentro del mensaje"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "timeout tras 429 ms")
+
+        manager = AIProviderManager([p1, MockAIProvider("P2")])
+        manager.generate("Test")
+
+        assert manager.get_stats(p1).is_available()
+
+    def test_records_provider_stats(self):
+        """Registra la tasa de fallos de cada proveedor"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "boom")
+        p2 = MockAIProvider("P2")
+
+        manager = AIProviderManager([p1, p2])
+        manager.generate("Test")
+
+        assert manager.get_stats(p1).failure_rate > 0
+        assert manager.get_stats(p2).failure_rate == 0
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        """Tras varios fallos seguidos el proveedor se omite temporalmente"""
+        p1 = MockAIProvider("P1")
+        p1.set_failure(True, "HTTP 503")
+        p2 = MockAIProvider("P2")
+
+        manager = AIProviderManager([p1, p2], cache_size=0)
+        for i in range(3):
+            manager.generate(f"Test {i}")
+
+        assert not manager.get_stats(p1).is_available()
+        assert manager.get_next_provider() == p2
+        assert manager.get_next_provider() == p2
+
+    def test_success_closes_circuit(self):
+        """Un éxito reinicia el contador de fallos"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1])
+        stats = manager.get_stats(p1)
+
+        stats.record_failure(Exception("boom"))
+        stats.record_failure(Exception("boom"))
+        stats.record_success(0.1)
+        stats.record_failure(Exception("boom"))
+
+        assert stats.consecutive_failures == 1
+        assert stats.is_available()
+
+    def test_latency_strategy_prefers_fastest_provider(self):
+        """Con strategy="latency" se elige el proveedor de menor latencia esperada"""
+        p1 = MockAIProvider("P1")
+        p2 = MockAIProvider("P2")
+        manager = AIProviderManager([p1, p2], strategy="latency")
+
+        manager.get_stats(p1).record_success(2.0)
+        manager.get_stats(p2).record_success(0.1)
+
+        assert manager.get_next_provider() == p2
+        assert manager.get_next_provider() == p2
+
+    def test_latency_strategy_penalizes_failures(self):
+        """La tasa de fallos reciente encarece al proveedor más rápido"""
+        p1 = MockAIProvider("P1")
+        p2 = MockAIProvider("P2")
+        manager = AIProviderManager([p1, p2], strategy="latency")
+
+        fast = manager.get_stats(p1)
+        fast.record_success(0.1)
+        fast.record_failure(Exception("boom"))
+        fast.record_success(0.1)
+        fast.record_failure(Exception("boom"))
+        fast.record_success(0.1)
+        manager.get_stats(p2).record_success(0.12)
+
+        assert fast.failure_rate == pytest.approx(0.4)
+        assert manager.get_next_provider() == p2
+
+    def test_latency_strategy_rotates_until_all_measured(self):
+        """Sin métricas de todos los proveedores se sigue la rotación"""
+        p1 = MockAIProvider("P1")
+        p2 = MockAIProvider("P2")
+        manager = AIProviderManager([p1, p2], strategy="latency")
+
+        manager.generate("Test 1")
+        manager.generate("Test 2")
+
+        assert len(p1.get_calls()) == 1
+        assert len(p2.get_calls()) == 1
+
+    def test_latency_strategy_fails_over_to_other_provider(self):
+        """Si el proveedor más rápido falla, se intenta con otro"""
+        p1 = MockAIProvider("P1")
+        p2 = MockAIProvider("P2")
+        p2.set_default_response({"source": "p2"})
+        manager = AIProviderManager([p1, p2], strategy="latency", cache_size=0)
+        manager.get_stats(p1).record_success(0.01)
+        manager.get_stats(p2).record_success(1.0)
+        p1.set_failure(True, "P1 failed")
+
+        assert manager.generate("Test") == {"source": "p2"}
+
+    def test_invalid_strategy(self):
+        """Una estrategia desconocida lanza error"""
+        with pytest.raises(Exception) as exc_info:
+            AIProviderManager([], strategy="random")
+
+        assert "Estrategia inválida" in str(exc_info.value)
+
+    def test_warmup_opens_circuit_of_unhealthy_providers(self):
+        """warmup marca como no disponibles a los proveedores caídos"""
+        class DownProvider(MockAIProvider):
+            def health_check(self, timeout=3.0):
+                return False
+
+        p1 = DownProvider("P1")
+        p2 = MockAIProvider("P2")
+        manager = AIProviderManager([p1, p2])
+
+        health = manager.warmup(timeout=1.0)
+
+        assert health == {"P1": False, "P2": True}
+        assert manager.get_next_provider() == p2
+
+    def test_warmup_treats_slow_provider_as_unhealthy(self):
+        """Un proveedor que no responde a tiempo queda como no disponible"""
+        class SlowProvider(MockAIProvider):
+            def health_check(self, timeout=3.0):
+                time.sleep(0.3)
+                return True
+
+        p1 = SlowProvider("P1")
+        manager = AIProviderManager([p1])
+
+        assert manager.warmup(timeout=0.05) == {"P1": False}
+
+    def test_get_name_updates_after_add_provider(self):
+        """El nombre del gestor refleja proveedores agregados después"""
+        manager = AIProviderManager([MockAIProvider("P1")])
+        assert manager.get_name() == "AIProviderManager (P1)"
+
+        manager.add_provider(MockAIProvider("P2"))
+
+        assert manager.get_name() == "AIProviderManager (P1, P2)"
+
+    def test_caches_repeated_prompts(self):
+        """Un prompt repetido se responde desde caché"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1])
+
+        first = manager.generate("Mismo prompt")
+        first["category"] = "modificado"
+        second = manager.generate("Mismo prompt")
+
+        assert len(p1.calls) == 1
+        assert second["category"] == "notificacion"
+        assert manager.cache_hits == 1
+        assert manager.cache_misses == 1
+
+    def test_cache_ignores_times_and_whitespace(self):
+        """Prompts que solo difieren en la hora o en espacios comparten entrada"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1])
+
+        manager.generate("Pago recibido el 12/03/2024 a las 10:15")
+        manager.generate("Pago recibido  el 12/03/2024 a las 18:40\n")
+
+        assert len(p1.calls) == 1
+
+    def test_cache_keeps_dates_apart(self):
+        """Prompts con fechas distintas no comparten entrada"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1])
+
+        manager.generate("Tu pago vence el 05/11/2026")
+        manager.generate("Tu pago vence el 05/12/2026")
+
+        assert len(p1.calls) == 2
+
+    def test_cache_entries_expire(self):
+        """Las respuestas cacheadas vencen según cache_ttl"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1], cache_ttl=0.01)
+
+        manager.generate("Mismo prompt")
+        time.sleep(0.02)
+        manager.generate("Mismo prompt")
+
+        assert len(p1.calls) == 2
+
+    def test_cache_disabled(self):
+        """cache_size=0 desactiva la caché"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1], cache_size=0)
+
+        manager.generate("Mismo prompt")
+        manager.generate("Mismo prompt")
+
+        assert len(p1.calls) == 2
+
+    def test_cache_evicts_least_recent(self):
+        """La caché descarta la entrada menos usada al llenarse"""
+        p1 = MockAIProvider("P1")
+        manager = AIProviderManager([p1], cache_size=1)
+
+        manager.generate("A")
+        manager.generate("B")
+        manager.generate("A")
+
+        assert p1.calls == ["A", "B", "A"]
+
 
 class TestMockAIProvider:
     """Pruebas para MockAIProvider"""
@@ -426,6 +939,25 @@ class TestMockAIProvider:
         assert result1["priority"] == "urgente"
         assert result2["priority"] == "normal"
 
+    def test_first_registered_key_wins(self):
+        """Si varias claves coinciden gana la registrada primero"""
+        provider = MockAIProvider()
+        provider.set_response("cargo", {"category": "cargo"})
+        provider.set_response("cargo pendiente", {"category": "pendiente"})
+        provider.set_response("argo", {"category": "argo"})
+
+        result = provider.generate("Aviso de cargo pendiente")
+
+        assert result["category"] == "cargo"
+
+    def test_overlapping_keys(self):
+        """Detecta claves que se solapan con otras coincidencias"""
+        provider = MockAIProvider()
+        provider.set_response("argo", {"category": "argo"})
+        provider.set_response("cargo", {"category": "cargo"})
+
+        assert provider.generate("un cargo")["category"] == "argo"
+
     def test_records_calls(self):
         """Registra llamadas"""
         provider = MockAIProvider()
@@ -467,6 +999,62 @@ class TestMockAIProvider:
 class TestCreateProviderFromConfig:
     """Pruebas para create_provider_from_config"""
 
+    def test_load_config_from_mapping(self):
+        """La configuración se puede construir desde un dict de variables"""
+        config = load_config_from_env({
+            'AI_PROVIDER': 'api',
+            'GROQ_API_KEY': 'gsk_test',
+            'GROQ_RPM': '30',
+            'CHECK_INTERVAL_HOURS': '4',
+        })
+
+        assert config.ai_provider.provider_type == 'api'
+        assert config.ai_provider.groq.api_key == 'gsk_test'
+        assert config.ai_provider.groq.requests_per_minute == 30
+        assert config.ai_provider.cerebras.api_key == ''
+        assert config.schedule.check_interval_hours == 4
+
+    def test_dotenv_is_reloaded_only_when_changed(self, monkeypatch, tmp_path):
+        """El .env solo se vuelve a leer si cambia su mtime"""
+        import os
+        import dotenv
+        from src.config import settings
+
+        env_file = tmp_path / ".env"
+        env_file.write_text("X=1\n")
+        loads = []
+        monkeypatch.setattr(dotenv, "find_dotenv", lambda: str(env_file))
+        monkeypatch.setattr(dotenv, "load_dotenv", lambda *a, **kw: loads.append(a))
+        monkeypatch.setattr(settings, "_dotenv_loaded", None)
+
+        settings._load_dotenv_if_changed()
+        settings._load_dotenv_if_changed()
+        assert len(loads) == 1
+
+        stat = env_file.stat()
+        os.utime(env_file, (stat.st_atime, stat.st_mtime + 10))
+        settings._load_dotenv_if_changed()
+        assert len(loads) == 2
+
+    def test_app_config_is_loaded_once(self, monkeypatch):
+        """get_app_config reutiliza la configuración salvo con reload"""
+        from src.config import settings
+        calls = []
+
+        def fake_load():
+            calls.append(1)
+            return settings.AppConfig()
+
+        monkeypatch.setattr(settings, "load_config_from_env", fake_load)
+        monkeypatch.setattr(settings, "_app_config", None)
+
+        first = get_app_config()
+        assert get_app_config() is first
+        assert len(calls) == 1
+
+        assert get_app_config(reload=True) is not first
+        assert len(calls) == 2
+
     def test_create_ollama_provider(self):
         """Crea proveedor Ollama"""
         config = AIProviderConfig(
@@ -491,6 +1079,30 @@ class TestCreateProviderFromConfig:
 
         assert len(manager.providers) == 2
 
+    def test_compress_threshold_from_env(self):
+        """GROQ_COMPRESS_THRESHOLD llega hasta el proveedor creado"""
+        config = load_config_from_env({
+            'AI_PROVIDER': 'api',
+            'GROQ_API_KEY': 'gsk_test',
+            'GROQ_COMPRESS_THRESHOLD': '2048',
+        })
+
+        manager = create_provider_from_config(config.ai_provider)
+
+        assert config.ai_provider.cerebras.compress_threshold is None
+        assert manager.providers[0].compress_threshold == 2048
+
+    def test_create_without_cache(self):
+        """cache_size=0 crea el gestor sin caché propia"""
+        config = AIProviderConfig(provider_type="ollama", ollama=OllamaConfig())
+        manager = create_provider_from_config(config, cache_size=0)
+        manager.providers[0] = MockAIProvider("P1")
+
+        manager.generate("Mismo prompt")
+        manager.generate("Mismo prompt")
+
+        assert len(manager.providers[0].calls) == 2
+
     def test_create_auto_with_apis(self):
         """Modo auto usa APIs disponibles"""
         config = AIProviderConfig(
@@ -2,11 +2,17 @@
 Pruebas unitarias para BankEmailClassifier.
 """
 
+import asyncio
+import os
+import time
+from dataclasses import replace
+
 import pytest
 from src.classifiers import BankEmailClassifier, MockEmailClassifier
 from src.providers import MockAIProvider
 from src.core import EmailClassification
-from src.config import ClassifierConfig
+from src.config import ClassifierConfig, load_classification_rules
+from src.utils import KeywordMatcher, clean_text
 
 
 class TestExtractAmount:
@@ -60,6 +66,23 @@ class TestExtractAmount:
 
         assert result == "$100.00"
 
+    def test_pattern_order_wins_over_position(self):
+        """El primer patrón configurado gana aunque otro aparezca antes en el texto"""
+        config = ClassifierConfig(amount_patterns=[r'\$\s*[\d,]+', r'[\d,]+\s*pesos'])
+        classifier = BankEmailClassifier(config=config)
+
+        result = classifier.extract_amount("500 pesos o $20")
+
+        assert result == "$20"
+
+    def test_inline_flag_patterns_still_work(self):
+        """Patrones que no se pueden combinar se prueban uno por uno"""
+        config = ClassifierConfig(amount_patterns=[r'(?i)usd\s*\d+', r'\$\d+'])
+        classifier = BankEmailClassifier(config=config)
+
+        assert classifier._any_amount_re is None
+        assert classifier.extract_amount("Cargo de $35") == "$35"
+
 
 class TestDetectPriorityByKeywords:
     """Pruebas para detección de prioridad por keywords"""
@@ -188,6 +211,92 @@ class TestClassifyWithLLM:
         assert len(mock_provider.get_calls()) == 1
         assert "Test" in mock_provider.get_calls()[0]
 
+    def test_prompt_puts_email_data_at_the_end(self, classifier_config):
+        """Las instrucciones son un prefijo común a todos los correos"""
+        classifier = BankEmailClassifier(config=classifier_config)
+
+        first = classifier._build_prompt("Pago", "Cuerpo 1", "a@test.com")
+        second = classifier._build_prompt("Oferta", "Cuerpo 2", "b@test.com")
+
+        prefix = first[:first.index("Remitente: a@test.com")]
+        assert second.startswith(prefix)
+        assert first.endswith("Cuerpo: Cuerpo 1")
+
+    def test_repeated_email_uses_cache(self, classifier_config):
+        """Un correo repetido no vuelve a consultar al proveedor"""
+        mock_provider = MockAIProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        first = classifier.classify_with_llm("Test", "Test body", "test@test.com")
+        second = classifier.classify_with_llm("Test", "Test body", "test@test.com")
+
+        assert first == second
+        assert len(mock_provider.get_calls()) == 1
+
+        classifier.clear_cache()
+        classifier.classify_with_llm("Test", "Test body", "test@test.com")
+        assert len(mock_provider.get_calls()) == 2
+
+    def test_cache_persists_between_instances(self, classifier_config, tmp_path):
+        """La caché guardada se reutiliza en otra ejecución"""
+        cache_path = str(tmp_path / "llm_cache.json")
+        first_provider = MockAIProvider()
+        classifier = BankEmailClassifier(
+            config=classifier_config, ai_provider=first_provider, cache_path=cache_path
+        )
+        first = classifier.classify_with_llm("Test", "Test body", "test@test.com")
+        classifier.save_cache()
+
+        second_provider = MockAIProvider()
+        restored = BankEmailClassifier(
+            config=classifier_config, ai_provider=second_provider, cache_path=cache_path
+        )
+
+        assert restored.classify_with_llm("Test", "Test body", "test@test.com") == first
+        assert second_provider.get_calls() == []
+
+    def test_saved_cache_keeps_its_expiry(self, classifier_config, tmp_path):
+        """Las respuestas guardadas vencen según su ttl original, no al recargarse"""
+        cache_path = str(tmp_path / "llm_cache.json")
+        classifier = BankEmailClassifier(
+            config=classifier_config, ai_provider=MockAIProvider(),
+            cache_path=cache_path, cache_ttl=0.05
+        )
+        classifier.classify_with_llm("Test", "Test body", "test@test.com")
+        classifier.save_cache()
+        time.sleep(0.1)
+
+        second_provider = MockAIProvider()
+        restored = BankEmailClassifier(
+            config=classifier_config, ai_provider=second_provider, cache_path=cache_path
+        )
+        restored.classify_with_llm("Test", "Test body", "test@test.com")
+
+        assert len(second_provider.get_calls()) == 1
+
+    def test_invalid_cache_file_is_ignored(self, classifier_config, tmp_path):
+        """Un archivo de caché corrupto no impide crear el clasificador"""
+        cache_path = tmp_path / "llm_cache.json"
+        cache_path.write_text("{no es json", encoding="utf-8")
+
+        classifier = BankEmailClassifier(config=classifier_config, cache_path=str(cache_path))
+
+        assert len(classifier._cache) == 0
+
+    def test_failures_are_not_cached(self, classifier_config):
+        """El resultado de respaldo tras un error no queda en la caché"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_failure(True, "API Error")
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        classifier.classify_with_llm("Test", "Test body", "test@test.com")
+        mock_provider.set_failure(False)
+        mock_provider.set_default_response({"category": "movimiento"})
+
+        result = classifier.classify_with_llm("Test", "Test body", "test@test.com")
+
+        assert result["category"] == "movimiento"
+
     def test_classify_fallback_on_ai_failure(self, classifier_config):
         """Usa fallback cuando AI falla"""
         mock_provider = MockAIProvider()
@@ -259,6 +368,17 @@ class TestFallbackClassification:
 
         assert result["category"] == "promocion"
 
+    def test_fallback_category_follows_table_order(self, classifier_config):
+        """La categoría sale del orden de la tabla, no de la posición en el texto"""
+        classifier = BankEmailClassifier(config=classifier_config)
+
+        result = classifier._fallback_classification(
+            subject="Oferta exclusiva",
+            body="Recibe un resumen de tu compra"
+        )
+
+        assert result["category"] == "pago"
+
     def test_fallback_default_notification(self, classifier_config):
         """Fallback usa notificacion por defecto"""
         classifier = BankEmailClassifier(config=classifier_config)
@@ -311,6 +431,21 @@ class TestClassify:
         assert result.category == "pago"
         assert result.priority == "normal"
         assert result.amount == "$100.00"
+        assert result.confidence is None
+
+    def test_classify_keeps_llm_confidence(self, classifier_config):
+        """La confianza del LLM se conserva, acotada a [0, 1]"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_response("Asunto: Cargo", {"category": "pago", "confidence": 0.83})
+        mock_provider.set_response("Asunto: Aviso", {"category": "otro", "confidence": "7"})
+
+        classifier = BankEmailClassifier(
+            config=classifier_config,
+            ai_provider=mock_provider
+        )
+
+        assert classifier.classify("Cargo", "Cuerpo", "a@test.com").confidence == 0.83
+        assert classifier.classify("Aviso", "Cuerpo", "b@test.com").confidence == 1.0
 
     def test_classify_extracts_amount(self, classifier_config):
         """classify extrae el monto correctamente"""
@@ -347,6 +482,239 @@ class TestClassify:
         assert result.amount is None
 
 
+class TestFastClassify:
+    """Pruebas para la clasificación sin LLM"""
+
+    def test_promo_sender_skips_llm(self, classifier_config):
+        """Correo promocional evidente no llama al LLM"""
+        mock_provider = MockAIProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        result = classifier.classify(
+            subject="Nueva oferta para ti",
+            body="Aprovecha la promoción",
+            sender="promociones@banco.com"
+        )
+
+        assert result.category == "promocion"
+        assert result.priority == "sin_prioridad"
+        assert mock_provider.get_calls() == []
+
+    def test_requires_keyword_and_sender(self, classifier_config):
+        """Sin keyword de baja prioridad se consulta al LLM"""
+        mock_provider = MockAIProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        classifier.classify(
+            subject="Estado de cuenta",
+            body="Tu estado de cuenta está listo",
+            sender="promociones@banco.com"
+        )
+
+        assert len(mock_provider.get_calls()) == 1
+
+    def test_high_priority_sender_always_uses_llm(self, classifier_config):
+        """Un remitente de alta prioridad consulta al LLM aunque también sea de baja"""
+        config = replace(
+            classifier_config,
+            high_priority_senders=['promociones@banco.com'],
+            low_priority_senders=['banco.com'],
+        )
+        mock_provider = MockAIProvider()
+        classifier = BankEmailClassifier(config=config, ai_provider=mock_provider)
+
+        classifier.classify(
+            subject="Nueva oferta para ti",
+            body="Aprovecha la promoción",
+            sender="promociones@banco.com"
+        )
+
+        assert len(mock_provider.get_calls()) == 1
+
+    def test_fast_path_disabled(self, classifier_config):
+        """fast_path=False siempre consulta al LLM"""
+        mock_provider = MockAIProvider()
+        classifier = BankEmailClassifier(
+            config=classifier_config,
+            ai_provider=mock_provider,
+            fast_path=False
+        )
+
+        classifier.classify(
+            subject="Nueva oferta para ti",
+            body="Aprovecha la promoción",
+            sender="promociones@banco.com"
+        )
+
+        assert len(mock_provider.get_calls()) == 1
+
+
+class TestClassifyBatch:
+    """Pruebas para clasificación en lote"""
+
+    def test_classify_batch_keeps_order(self, classifier_config):
+        """classify_batch retorna una clasificación por correo en orden"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_response("Asunto: Promo", {"category": "promocion", "priority": "sin_prioridad"})
+        mock_provider.set_response("Asunto: Cargo", {"category": "pago", "priority": "urgente"})
+
+        classifier = BankEmailClassifier(
+            config=classifier_config,
+            ai_provider=mock_provider
+        )
+
+        results = classifier.classify_batch([
+            ("Cargo de $100.00", "Se realizó un cargo", "banco@test.com"),
+            ("Promo del mes", "Descuentos", "promo@test.com"),
+        ])
+
+        assert [r.category for r in results] == ["pago", "promocion"]
+        assert results[0].amount == "$100.00"
+        assert results[1].amount is None
+
+    def test_classify_batch_uses_provider_batch(self, classifier_config):
+        """classify_batch envía los correos en lotes de batch_size"""
+        class BatchProvider(MockAIProvider):
+            def __init__(self):
+                super().__init__()
+                self.batches = []
+
+            def generate_batch(self, prompts):
+                self.batches.append(len(prompts))
+                return super().generate_batch(prompts)
+
+        provider = BatchProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=provider)
+
+        emails = [(f"Correo {i}", "cuerpo", "a@test.com") for i in range(5)]
+        results = classifier.classify_batch(emails, batch_size=2)
+
+        assert len(results) == 5
+        assert provider.batches == [2, 2, 1]
+
+    def test_classify_batch_only_sends_uncached_emails(self, classifier_config):
+        """classify_batch solo envía al proveedor los correos sin caché"""
+        class BatchProvider(MockAIProvider):
+            def __init__(self):
+                super().__init__()
+                self.batches = []
+
+            def generate_batch(self, prompts):
+                self.batches.append(len(prompts))
+                return super().generate_batch(prompts)
+
+        provider = BatchProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=provider)
+        classifier.classify_with_llm("Correo 0", "cuerpo", "a@test.com")
+
+        emails = [(f"Correo {i}", "cuerpo", "a@test.com") for i in range(3)]
+        results = classifier.classify_batch(emails)
+
+        assert len(results) == 3
+        assert provider.batches == [2]
+
+    def test_classify_batch_sends_duplicates_once(self, classifier_config):
+        """Correos de la misma plantilla se envían una sola vez en el lote"""
+        class BatchProvider(MockAIProvider):
+            def __init__(self):
+                super().__init__()
+                self.batches = []
+
+            def generate_batch(self, prompts):
+                self.batches.append(len(prompts))
+                return super().generate_batch(prompts)
+
+        provider = BatchProvider()
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=provider)
+
+        emails = [
+            ("Compra aprobada", "Compra el 01/02/2024 a las 10:15", "a@test.com"),
+            ("Compra aprobada", "Compra el 01/02/2024 a las 18:40", "a@test.com"),
+            ("Transferencia", "Recibiste una transferencia", "a@test.com"),
+        ]
+        results = classifier.classify_batch_with_llm(emails)
+
+        assert provider.batches == [2]
+        assert results[0] == results[1]
+        assert results[0] is not results[1]
+
+    def test_classify_batch_falls_back_on_failure(self, classifier_config):
+        """Si el lote falla, clasifica cada correo con el fallback"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_failure(True, "API Error")
+
+        classifier = BankEmailClassifier(
+            config=classifier_config,
+            ai_provider=mock_provider
+        )
+
+        results = classifier.classify_batch([
+            ("Pago de tarjeta", "Realiza tu pago", "banco@test.com"),
+            ("Transferencia recibida", "Depósito", "banco@test.com"),
+        ])
+
+        assert [r.category for r in results] == ["pago", "transferencia"]
+
+
+class TestDetectPriorityBySender:
+    """Pruebas para prioridad por remitente"""
+
+    def test_sender_lists(self):
+        """Detecta remitentes de alta y baja prioridad"""
+        config = ClassifierConfig(
+            high_priority_senders=['alertas@banco.com'],
+            low_priority_senders=['tienda.com']
+        )
+        classifier = BankEmailClassifier(config=config)
+
+        assert classifier.detect_priority_by_sender("Banco <ALERTAS@banco.com>") == "urgente"
+        assert classifier.detect_priority_by_sender("ventas@tienda.com") == "sin_prioridad"
+        assert classifier.detect_priority_by_sender("otro@test.com") is None
+
+    def test_high_priority_wins(self):
+        """Si coincide en ambas listas gana la alta prioridad"""
+        config = ClassifierConfig(
+            high_priority_senders=['seguridad@banco.com'],
+            low_priority_senders=['banco.com']
+        )
+        classifier = BankEmailClassifier(config=config)
+
+        assert classifier.detect_priority_by_sender("seguridad@banco.com") == "urgente"
+
+
+class TestClassifyMany:
+    """Pruebas para clasificación concurrente"""
+
+    def test_classify_many_keeps_order(self, classifier_config):
+        """Retorna una clasificación por correo en el mismo orden"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_response("Asunto: Cargo", {"category": "pago", "priority": "urgente"})
+        mock_provider.set_default_response({"category": "movimiento", "priority": "normal"})
+
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        results = asyncio.run(classifier.classify_many([
+            ("Cargo de $100.00", "Compra", "banco@test.com"),
+            ("Retiro", "Cajero", "banco@test.com"),
+        ]))
+
+        assert [r.category for r in results] == ["pago", "movimiento"]
+        assert results[0].amount == "$100.00"
+
+    def test_classify_many_falls_back_on_failure(self, classifier_config):
+        """Si el proveedor falla se usa la clasificación de respaldo"""
+        mock_provider = MockAIProvider()
+        mock_provider.set_failure(True, "API Error")
+
+        classifier = BankEmailClassifier(config=classifier_config, ai_provider=mock_provider)
+
+        results = asyncio.run(classifier.classify_many([
+            ("Transferencia recibida", "Depósito", "banco@test.com"),
+        ]))
+
+        assert results[0].category == "transferencia"
+
+
 class TestCustomKeywords:
     """Pruebas con keywords personalizados"""
 
@@ -384,6 +752,152 @@ class TestCustomKeywords:
 
         assert result == "sin_prioridad"
 
+    def test_keyword_lists_are_immutable(self):
+        """Las listas de la configuración se guardan como tuplas"""
+        config = ClassifierConfig(urgent_keywords=['alerta'], rules_path="/no/existe.yaml")
+        other = ClassifierConfig(rules_path="/no/existe.yaml")
+
+        assert config.urgent_keywords == ('alerta',)
+        assert isinstance(config.low_priority_keywords, tuple)
+        # Los defaults se comparten entre configuraciones
+        assert config.amount_patterns is other.amount_patterns
+
+    def test_keywords_are_normalized(self):
+        """Las keywords se guardan en minúsculas y sin duplicados"""
+        config = ClassifierConfig(
+            urgent_keywords=['URGENTE', 'Pago', 'urgente'],
+            high_priority_senders=['Alertas@Banco.com'],
+            rules_path="/no/existe.yaml"
+        )
+
+        assert config.urgent_keywords == ('urgente', 'pago')
+        assert config.high_priority_senders == ('alertas@banco.com',)
+
+    def test_keywords_are_stripped(self):
+        """Se quitan espacios sobrantes y keywords vacías"""
+        config = ClassifierConfig(
+            low_priority_keywords=['  Oferta ', '', '   ', 'oferta'],
+            rules_path="/no/existe.yaml"
+        )
+
+        assert config.low_priority_keywords == ('oferta',)
+
+    def test_config_is_frozen(self):
+        """La configuración no se puede modificar una vez creada"""
+        import dataclasses
+        config = ClassifierConfig(rules_path="/no/existe.yaml")
+
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            config.urgent_keywords = ('otra',)
+
+
+class TestClassificationRules:
+    """Pruebas para la carga de reglas desde YAML"""
+
+    def test_rules_are_cached_until_file_changes(self, tmp_path):
+        """El archivo se relee solo cuando cambia su mtime"""
+        rules_file = tmp_path / "rules.yaml"
+        rules_file.write_text("urgent_keywords:\n  - alerta\n", encoding="utf-8")
+
+        first = load_classification_rules(str(rules_file))
+        second = load_classification_rules(str(rules_file))
+        assert first is second
+        assert first["urgent_keywords"] == ("alerta",)
+
+        rules_file.write_text("urgent_keywords:\n  - critico\n", encoding="utf-8")
+        stat = rules_file.stat()
+        os.utime(rules_file, (stat.st_atime, stat.st_mtime + 10))
+
+        assert load_classification_rules(str(rules_file))["urgent_keywords"] == ("critico",)
+
+    def test_rules_are_read_only(self, tmp_path):
+        """Las reglas compartidas no se pueden modificar"""
+        rules_file = tmp_path / "rules.yaml"
+        rules_file.write_text("urgent_keywords: [alerta]\n", encoding="utf-8")
+
+        rules = load_classification_rules(str(rules_file))
+
+        with pytest.raises(TypeError):
+            rules["urgent_keywords"] = []
+
+    def test_missing_file_returns_empty_rules(self, tmp_path):
+        """Sin archivo se usan las reglas por defecto"""
+        assert dict(load_classification_rules(str(tmp_path / "no_existe.yaml"))) == {}
+
+
+class TestKeywordMatcher:
+    """Pruebas para la búsqueda de keywords en una pasada"""
+
+    def test_finds_all_matching_groups(self):
+        """Retorna todos los grupos con alguna keyword en el texto"""
+        matcher = KeywordMatcher({
+            "urgente": ["pago pendiente"],
+            "promo": ["oferta"],
+            "otro": ["nada"],
+        })
+
+        assert matcher.find("tienes un pago pendiente y una oferta") == {"urgente", "promo"}
+
+    def test_overlapping_keywords_match_both_groups(self):
+        """Una keyword contenida en otra más larga también cuenta"""
+        matcher = KeywordMatcher({
+            "urgente": ["pago pendiente"],
+            "pago": ["pago"],
+            "aviso": ["pendiente"],
+        })
+
+        assert matcher.find("su pago pendiente") == {"urgente", "pago", "aviso"}
+
+    def test_no_keywords(self):
+        """Sin keywords nunca hay coincidencias"""
+        matcher = KeywordMatcher({"urgente": []})
+
+        assert matcher.find("urgente") == frozenset()
+
+
+class TestCleanText:
+    """Pruebas para la limpieza del cuerpo del correo"""
+
+    def test_strips_html_and_collapses_whitespace(self):
+        """Quita etiquetas y deja un solo espacio entre palabras"""
+        text = "<p>Pago de\r\n<b>$100</b></p>\t\tgracias  "
+
+        assert clean_text(text) == "Pago de $100 gracias"
+
+    def test_prompt_uses_clean_body(self, classifier_config):
+        """El prompt lleva el cuerpo limpio"""
+        classifier = BankEmailClassifier(config=classifier_config)
+
+        prompt = classifier._build_prompt("Pago", "<div>Monto:\n $50</div>", "a@test.com")
+
+        assert prompt.endswith("Cuerpo: Monto: $50")
+
+    def test_prompt_only_cleans_start_of_long_body(self, classifier_config):
+        """Solo se procesa el inicio de cuerpos muy largos"""
+        classifier = BankEmailClassifier(config=classifier_config)
+        body = "<p>" + "a " * 5000 + "</p>" + "FIN"
+
+        prompt = classifier._build_prompt("Asunto" * 100, body, "a@test.com")
+
+        assert "FIN" not in prompt
+        assert "Asunto: " + "Asunto" * 33 + "As\n" in prompt
+
+
+class TestEmailClassificationModel:
+    """Pruebas para el modelo de clasificación"""
+
+    def test_classification_is_immutable(self, urgent_classification):
+        """No se pueden modificar los campos de una clasificación"""
+        with pytest.raises(AttributeError):
+            urgent_classification.priority = "normal"
+
+    def test_equal_classifications_share_hash(self):
+        """Clasificaciones iguales son intercambiables en sets y dicts"""
+        first = EmailClassification(category="pago", priority="urgente", summary="Pago")
+        second = EmailClassification(category="pago", priority="urgente", summary="Pago")
+
+        assert len({first, second}) == 1
+
 
 class TestMockEmailClassifier:
     """Pruebas para el clasificador mock"""
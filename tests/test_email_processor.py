@@ -8,7 +8,7 @@ from src.fetchers import MockEmailFetcher
 from src.repositories import InMemoryEmailRepository
 from src.classifiers import MockEmailClassifier
 from src.notifiers import MockNotifier
-from src.core import Email, EmailClassification
+from src.core import Email, EmailClassification, FetchResult
 
 
 class TestEmailProcessorInit:
@@ -339,6 +339,272 @@ class TestProcessEmailsWithErrors:
         assert result['processed'] == 2
 
 
+class TestParallelClassification:
+    """Pruebas de la clasificación en paralelo"""
+
+    def test_splits_pending_emails_between_workers(
+        self, mock_email_fetcher, in_memory_repository
+    ):
+        """Reparte los correos en un lote por worker y conserva el orden"""
+        for i in range(8):
+            mock_email_fetcher.add_email(
+                Email(id=str(i), subject=f"Correo {i}", sender="a@b.com", body="x")
+            )
+
+        classifier = MockEmailClassifier()
+        batches = []
+        original_batch = classifier.classify_batch
+
+        def classify_batch(emails):
+            batches.append(len(emails))
+            return original_batch(emails)
+
+        classifier.classify_batch = classify_batch
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=classifier,
+            max_workers=4
+        )
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['processed'] == 8
+        assert sorted(batches) == [2, 2, 2, 2]
+
+    def test_classifies_one_by_one_when_batch_fails(
+        self, mock_email_fetcher, in_memory_repository
+    ):
+        """Si el lote falla, clasifica cada correo por separado"""
+        mock_email_fetcher.add_email(Email(id="1", subject="A", sender="a@b.com", body="x"))
+        mock_email_fetcher.add_email(Email(id="2", subject="B", sender="a@b.com", body="x"))
+
+        classifier = MockEmailClassifier()
+
+        def failing_batch(emails):
+            raise Exception("lote no disponible")
+
+        classifier.classify_batch = failing_batch
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=classifier
+        )
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['processed'] == 2
+        assert result['errors'] == 0
+        assert len(classifier.get_calls()) == 2
+
+
+class TestParallelAlerts:
+    """Pruebas del envío de alertas en paralelo"""
+
+    def test_sends_every_alert(
+        self, mock_email_fetcher, in_memory_repository,
+        mock_classifier, mock_notifier, urgent_classification
+    ):
+        """Envía una alerta por cada correo importante"""
+        for i in range(6):
+            mock_email_fetcher.add_email(
+                Email(id=str(i), subject=f"Correo {i}", sender="a@b.com", body="x")
+            )
+        mock_classifier.set_default_classification(urgent_classification)
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=mock_classifier,
+            notifier=mock_notifier
+        )
+        result = processor.process_emails(send_notifications=True)
+
+        assert result['urgent'] == 6
+        assert sorted(a['subject'] for a in mock_notifier.alerts) == [
+            f"Correo {i}" for i in range(6)
+        ]
+
+    def test_counts_failed_alerts_as_errors(
+        self, mock_email_fetcher, in_memory_repository,
+        mock_classifier, mock_notifier, urgent_classification
+    ):
+        """Una alerta que falla cuenta como error sin afectar a las demás"""
+        mock_email_fetcher.add_email(Email(id="1", subject="A", sender="a@b.com", body="x"))
+        mock_email_fetcher.add_email(Email(id="2", subject="B", sender="a@b.com", body="x"))
+        mock_classifier.set_default_classification(urgent_classification)
+        original_alert = mock_notifier.send_email_alert
+
+        def send_email_alert(email_data):
+            if email_data['subject'] == "A":
+                raise Exception("Telegram no disponible")
+            return original_alert(email_data)
+
+        mock_notifier.send_email_alert = send_email_alert
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=mock_classifier,
+            notifier=mock_notifier
+        )
+        result = processor.process_emails(send_notifications=True)
+
+        assert result['processed'] == 2
+        assert result['errors'] == 1
+        assert [a['subject'] for a in mock_notifier.alerts] == ["B"]
+
+
+class TestBulkSave:
+    """Pruebas del guardado en bloque de clasificaciones"""
+
+    def test_saves_all_classifications_at_once(
+        self, mock_email_fetcher, in_memory_repository, mock_classifier
+    ):
+        """Guarda todos los correos con una sola llamada al repositorio"""
+        for i in range(3):
+            mock_email_fetcher.add_email(
+                Email(id=str(i), subject=f"Correo {i}", sender="a@b.com", body="x")
+            )
+        batches = []
+        original_save = in_memory_repository.save_classifications
+
+        def save_classifications(items):
+            batches.append(len(items))
+            original_save(items)
+
+        in_memory_repository.save_classifications = save_classifications
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=mock_classifier
+        )
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['processed'] == 3
+        assert batches == [3]
+
+    def test_falls_back_to_single_saves(
+        self, mock_email_fetcher, in_memory_repository, mock_classifier
+    ):
+        """Si el guardado en bloque falla, guarda uno por uno"""
+        mock_email_fetcher.add_email(Email(id="1", subject="A", sender="a@b.com", body="x"))
+        mock_email_fetcher.add_email(Email(id="2", subject="B", sender="a@b.com", body="x"))
+
+        def failing_save(items):
+            raise Exception("base de datos bloqueada")
+
+        in_memory_repository.save_classifications = failing_save
+
+        processor = EmailProcessor(
+            email_fetcher=mock_email_fetcher,
+            repository=in_memory_repository,
+            classifier=mock_classifier
+        )
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['processed'] == 2
+        assert in_memory_repository.get_processed_ids(["1", "2"]) == {"1", "2"}
+
+
+class SyncFetcher(MockEmailFetcher):
+    """Fetcher mock con sincronización incremental por historyId"""
+
+    def __init__(self, result):
+        super().__init__()
+        self.authenticate()
+        self.result = result
+        self.sync_calls = []
+
+    def sync_emails(self, start_history_id=None, hours_ago=None, buffer_minutes=1,
+                    exclude=None):
+        self.sync_calls.append(start_history_id)
+        return self.result
+
+
+class TestIncrementalSync:
+    """Pruebas de la sincronización incremental con historyId"""
+
+    def make_processor(self, fetcher, repository, classifier=None):
+        return EmailProcessor(
+            email_fetcher=fetcher, repository=repository,
+            classifier=classifier or MockEmailClassifier()
+        )
+
+    def test_saves_history_id_after_successful_run(self, in_memory_repository):
+        """Sin fallos guarda el historyId retornado"""
+        fetcher = SyncFetcher(FetchResult(
+            emails=[Email(id="1", subject="A", sender="a@b.com", body="x")], history_id="100"
+        ))
+
+        result = self.make_processor(fetcher, in_memory_repository).process_emails(
+            send_notifications=False
+        )
+
+        assert result['processed'] == 1
+        assert fetcher.sync_calls == [None]
+        assert in_memory_repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "100"
+
+    def test_passes_saved_history_id(self, in_memory_repository):
+        """Pide los correos desde el historyId guardado"""
+        in_memory_repository.set_sync_state(EmailProcessor.HISTORY_STATE_KEY, "100")
+        fetcher = SyncFetcher(FetchResult(emails=[], history_id="200"))
+
+        self.make_processor(fetcher, in_memory_repository).process_emails(
+            send_notifications=False
+        )
+
+        assert fetcher.sync_calls == ["100"]
+        assert in_memory_repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "200"
+
+    def test_keeps_history_id_when_listing_fails(self, in_memory_repository):
+        """Si no se pudo listar no avanza el historyId y cuenta el error"""
+        in_memory_repository.set_sync_state(EmailProcessor.HISTORY_STATE_KEY, "100")
+        fetcher = SyncFetcher(FetchResult(emails=[], history_id="999", failed=1))
+
+        result = self.make_processor(fetcher, in_memory_repository).process_emails(
+            send_notifications=False
+        )
+
+        assert result['errors'] == 1
+        assert in_memory_repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "100"
+
+    def test_keeps_history_id_when_downloads_fail(self, in_memory_repository):
+        """Si algún correo no se descargó no avanza el historyId"""
+        in_memory_repository.set_sync_state(EmailProcessor.HISTORY_STATE_KEY, "100")
+        fetcher = SyncFetcher(FetchResult(
+            emails=[Email(id="1", subject="A", sender="a@b.com", body="x")],
+            history_id="200", failed=1
+        ))
+
+        result = self.make_processor(fetcher, in_memory_repository).process_emails(
+            send_notifications=False
+        )
+
+        assert result['processed'] == 1
+        assert result['errors'] == 1
+        assert in_memory_repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "100"
+
+    def test_keeps_history_id_when_there_are_errors(self, in_memory_repository):
+        """Con errores de clasificación no avanza el historyId"""
+        in_memory_repository.set_sync_state(EmailProcessor.HISTORY_STATE_KEY, "100")
+        fetcher = SyncFetcher(FetchResult(
+            emails=[Email(id="2", subject="B", sender="a@b.com", body="x")], history_id="200"
+        ))
+
+        class FailingClassifier(MockEmailClassifier):
+            def classify(self, subject, body, sender=""):
+                raise Exception("LLM no disponible")
+
+        result = self.make_processor(
+            fetcher, in_memory_repository, FailingClassifier()
+        ).process_emails(send_notifications=False)
+
+        assert result['errors'] == 1
+        assert in_memory_repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "100"
+
+
 class TestDailySummary:
     """Pruebas de resumen diario"""
 
@@ -10,7 +10,7 @@ from src.providers import (
     MockAIProvider, create_provider_from_config
 )
 from src.utils import MockHttpClient
-from src.core.models import HttpResponse, HttpError
+from src.core.models import HttpResponse, HttpError, ProviderError
 from src.classifiers import BankEmailClassifier
 from src.core import EmailClassification
 
@@ -153,6 +153,22 @@ class TestAIProviderErrors:
             provider.generate("Test")
 
         assert "429" in str(exc_info.value)
+        assert exc_info.value.status_code == 429
+
+    def test_provider_error_keeps_original(self):
+        """ProviderError conserva la excepción original encadenada"""
+        class FailingHttpClient:
+            def post(self, *args, **kwargs):
+                raise HttpError("timeout")
+
+        provider = GroqProvider(api_key="key", http_client=FailingHttpClient())
+
+        with pytest.raises(ProviderError) as exc_info:
+            provider.generate("Test")
+
+        assert exc_info.value.provider == "Groq"
+        assert isinstance(exc_info.value.original, HttpError)
+        assert exc_info.value.__cause__ is exc_info.value.original
 
     def test_provider_manager_all_fail_with_details(self):
         """Manager reporta detalles cuando todos fallan"""
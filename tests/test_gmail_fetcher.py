@@ -0,0 +1,489 @@
+"""
+Pruebas de GmailFetcher con un servicio de Gmail simulado.
+"""
+
+import base64
+
+from src.classifiers import MockEmailClassifier
+from src.config import GmailConfig
+from src.core import EmailProcessor
+from src.fetchers import GmailFetcher, MockEmailFetcher
+from src.fetchers.gmail import MAX_BODY_CHARS
+from src.repositories import InMemoryEmailRepository
+
+
+def make_message(message_id, subject="Asunto", sender="banco@test.com",
+                 date="Mon, 1 Jan 2024 10:00:00 +0000", body="Cuerpo"):
+    """Construye un mensaje con el formato de la API de Gmail"""
+    return {
+        'id': message_id,
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': sender},
+                {'name': 'Date', 'value': date},
+            ],
+            'body': {'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')},
+        },
+    }
+
+
+class FakeRequest:
+    def __init__(self, service, kwargs):
+        self.service = service
+        self.kwargs = kwargs
+
+    def execute(self, http=None, num_retries=0):
+        self.service.executed += 1
+        if 'q' in self.kwargs:
+            self.service.list_calls.append(self.kwargs)
+            if self.service.list_error is not None:
+                raise self.service.list_error
+            start = int(self.kwargs.get('pageToken', 0))
+            end = start + self.kwargs['maxResults']
+            page = {'messages': [{'id': m['id']} for m in self.service.stored[start:end]]}
+            if end < len(self.service.stored):
+                page['nextPageToken'] = str(end)
+            return page
+        message_id = self.kwargs['id']
+        if message_id in self.service.failing:
+            raise Exception(f"no encontrado: {message_id}")
+        return next(m for m in self.service.stored if m['id'] == message_id)
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class BrokenBatch:
+    def add(self, request, request_id=None):
+        pass
+
+    def execute(self):
+        raise Exception("batch no disponible")
+
+
+class FakeGmailService:
+    """Servicio de Gmail en memoria que registra las peticiones"""
+
+    def __init__(self, messages, failing=()):
+        self.stored = messages
+        self.failing = set(failing)
+        self.executed = 0
+        self.batches = []
+        self.history_pages = []
+        self.history_error = None
+        self.list_calls = []
+        self.list_error = None
+        self.profile_history_id = "999"
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, **kwargs):
+        return FakeRequest(self, kwargs)
+
+    def get(self, **kwargs):
+        return FakeRequest(self, kwargs)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def history(self):
+        return FakeHistory(self)
+
+    def getProfile(self, userId):
+        service = self
+
+        class Request:
+            def execute(self):
+                return {'historyId': service.profile_history_id}
+
+        return Request()
+
+
+class FakeHistory:
+    """users().history() con una página por cada elemento de service.history_pages"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, **kwargs):
+        service = self.service
+
+        class Request:
+            def execute(self):
+                if service.history_error is not None:
+                    raise service.history_error
+                index = int(kwargs.get('pageToken', 0))
+                page = dict(service.history_pages[index])
+                if index + 1 < len(service.history_pages):
+                    page['nextPageToken'] = str(index + 1)
+                return page
+
+        return Request()
+
+
+def history_page(*message_ids, history_id="200", labels=('INBOX',)):
+    """Página de users.history.list con mensajes agregados"""
+    return {
+        'history': [
+            {'messagesAdded': [{'message': {'id': m, 'labelIds': list(labels)}}]}
+            for m in message_ids
+        ],
+        'historyId': history_id,
+    }
+
+
+class HttpError404(Exception):
+    """Imita el HttpError de googleapiclient con resp.status"""
+
+    class resp:
+        status = 404
+
+
+def make_fetcher(service, **kwargs):
+    fetcher = GmailFetcher(GmailConfig(), **kwargs)
+    fetcher.service = service
+    return fetcher
+
+
+class TestGmailFetcherBatch:
+    """Pruebas de la descarga de mensajes en batch"""
+
+    def test_fetches_messages_in_single_batch(self):
+        """Descarga todos los mensajes en una sola petición batch"""
+        service = FakeGmailService([make_message(str(i)) for i in range(5)])
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(custom_query="is:unread")
+
+        assert [e.id for e in emails] == ['0', '1', '2', '3', '4']
+        assert service.batches == [5]
+
+    def test_splits_large_batches(self):
+        """Divide en varios batch cuando se supera BATCH_SIZE"""
+        count = GmailFetcher.BATCH_SIZE + 3
+        service = FakeGmailService([make_message(str(i)) for i in range(count)])
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(max_results=count, custom_query="is:unread")
+
+        assert len(emails) == count
+        assert service.batches == [GmailFetcher.BATCH_SIZE, 3]
+
+    def test_skips_failed_messages(self):
+        """Omite los mensajes que fallan sin perder el resto"""
+        service = FakeGmailService(
+            [make_message('a'), make_message('b'), make_message('c')],
+            failing={'b'}
+        )
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(custom_query="is:unread")
+
+        assert [e.id for e in emails] == ['a', 'c']
+
+    def test_parses_headers_and_body(self):
+        """Extrae asunto, remitente, fecha y cuerpo"""
+        service = FakeGmailService([
+            make_message('x', subject="Pago", sender="a@b.com", body="Hola mundo")
+        ])
+        fetcher = make_fetcher(service)
+
+        email = fetcher.get_emails(custom_query="is:unread")[0]
+
+        assert email.subject == "Pago"
+        assert email.sender == "a@b.com"
+        assert email.body == "Hola mundo"
+
+    def test_excluded_messages_are_not_fetched(self):
+        """Los ids excluidos no se descargan"""
+        service = FakeGmailService([make_message(str(i)) for i in range(4)])
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(custom_query="is:unread", exclude=lambda ids: {'1', '2'})
+
+        assert [e.id for e in emails] == ['0', '3']
+        assert service.batches == [2]
+
+
+class TestGmailFetcherPagination:
+    """Pruebas del listado de mensajes en varias páginas"""
+
+    def test_follows_pages_until_max_results(self, monkeypatch):
+        """Recorre las páginas sin pasar de max_results"""
+        monkeypatch.setattr(GmailFetcher, 'LIST_PAGE_SIZE', 4)
+        service = FakeGmailService([make_message(str(i)) for i in range(12)])
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(max_results=10, custom_query="is:unread")
+
+        assert [e.id for e in emails] == [str(i) for i in range(10)]
+        assert [call['maxResults'] for call in service.list_calls] == [4, 4, 2]
+        assert [call.get('pageToken') for call in service.list_calls] == [None, '4', '8']
+
+
+class TestGmailFetcherHistory:
+    """Pruebas de la descarga incremental con historyId"""
+
+    def test_fetches_only_added_messages(self):
+        """Descarga los mensajes agregados en todas las páginas"""
+        service = FakeGmailService([make_message(str(i)) for i in range(4)])
+        service.history_pages = [history_page('1'), history_page('3', '1', history_id="250")]
+        fetcher = make_fetcher(service)
+
+        result = fetcher.get_new_emails("100")
+
+        assert [e.id for e in result.emails] == ['1', '3']
+        assert result.history_id == "250"
+        assert result.failed == 0
+
+    def test_skips_spam_and_drafts(self):
+        """Omite mensajes de spam, papelera y borradores"""
+        service = FakeGmailService([make_message('a'), make_message('b')])
+        service.history_pages = [{
+            'history': history_page('a')['history'] + history_page('b', labels=('SPAM',))['history'],
+            'historyId': "200",
+        }]
+        fetcher = make_fetcher(service)
+
+        result = fetcher.get_new_emails("100")
+
+        assert [e.id for e in result.emails] == ['a']
+
+    def test_expired_history_returns_none(self):
+        """Con historial expirado indica que hay que usar la búsqueda por fecha"""
+        service = FakeGmailService([])
+        service.history_error = HttpError404("historyId demasiado antiguo")
+        fetcher = make_fetcher(service)
+
+        assert fetcher.get_new_emails("1") is None
+
+    def test_reports_failed_downloads(self):
+        """Los mensajes que no se pudieron descargar se cuentan como fallos"""
+        service = FakeGmailService([make_message('a'), make_message('b')], failing={'b'})
+        service.history_pages = [history_page('a', 'b')]
+        fetcher = make_fetcher(service)
+
+        result = fetcher.get_new_emails("100")
+
+        assert [e.id for e in result.emails] == ['a']
+        assert result.failed == 1
+
+
+class TestGmailFetcherSync:
+    """Pruebas de sync_emails y su uso desde el procesador"""
+
+    def test_without_history_uses_date_window(self):
+        """Sin historyId lista por fecha y retorna el historyId actual"""
+        service = FakeGmailService([make_message('a')])
+        fetcher = make_fetcher(service)
+
+        result = fetcher.sync_emails(None)
+
+        assert [e.id for e in result.emails] == ['a']
+        assert result.history_id == "999"
+        assert result.failed == 0
+
+    def test_expired_history_falls_back_to_date_window(self):
+        """Si el historial expiró usa la búsqueda por fecha"""
+        service = FakeGmailService([make_message('a')])
+        service.history_error = HttpError404("historyId demasiado antiguo")
+        fetcher = make_fetcher(service)
+
+        result = fetcher.sync_emails("1")
+
+        assert [e.id for e in result.emails] == ['a']
+        assert result.history_id == "999"
+
+    def test_listing_failure_is_reported(self):
+        """Un fallo al listar se reporta en lugar de parecer un buzón vacío"""
+        service = FakeGmailService([make_message('a')])
+        service.list_error = Exception("timeout de red")
+        fetcher = make_fetcher(service)
+
+        result = fetcher.sync_emails(None)
+
+        assert result.emails == []
+        assert result.failed == 1
+
+    def test_processor_keeps_history_id_when_listing_fails(self):
+        """Un fallo al listar no hace que el procesador salte la ventana"""
+        service = FakeGmailService([make_message('a')])
+        service.list_error = Exception("timeout de red")
+        repository = InMemoryEmailRepository()
+        processor = EmailProcessor(
+            email_fetcher=make_fetcher(service), repository=repository,
+            classifier=MockEmailClassifier()
+        )
+
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['errors'] == 1
+        assert repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) is None
+
+    def test_processor_keeps_history_id_when_download_fails(self):
+        """Un mensaje que no se descargó se vuelve a pedir en la próxima ejecución"""
+        service = FakeGmailService([make_message('a'), make_message('b')], failing={'b'})
+        service.history_pages = [history_page('a', 'b', history_id="200")]
+        repository = InMemoryEmailRepository()
+        repository.set_sync_state(EmailProcessor.HISTORY_STATE_KEY, "100")
+        processor = EmailProcessor(
+            email_fetcher=make_fetcher(service), repository=repository,
+            classifier=MockEmailClassifier()
+        )
+
+        result = processor.process_emails(send_notifications=False)
+
+        assert result['processed'] == 1
+        assert result['errors'] == 1
+        assert repository.get_sync_state(EmailProcessor.HISTORY_STATE_KEY) == "100"
+
+
+class TestMockEmailFetcher:
+    """Pruebas del fetcher mock"""
+
+    def test_mark_as_read_is_idempotent(self):
+        """Marcar dos veces el mismo correo lo registra una sola vez"""
+        fetcher = MockEmailFetcher()
+
+        fetcher.mark_as_read("1")
+        fetcher.mark_as_read("1")
+        fetcher.mark_as_read("2")
+
+        assert fetcher.read_emails == {"1", "2"}
+
+    def test_clear_resets_read_emails(self):
+        """clear() olvida los correos marcados como leídos"""
+        fetcher = MockEmailFetcher()
+        fetcher.mark_as_read("1")
+
+        fetcher.clear()
+
+        assert "1" not in fetcher.read_emails
+
+
+    def test_falls_back_to_threads_when_batch_fails(self):
+        """Si la petición batch falla, descarga los mensajes uno por uno"""
+        service = FakeGmailService([make_message('a'), make_message('b')])
+        service.new_batch_http_request = lambda callback=None: BrokenBatch()
+        fetcher = make_fetcher(service)
+
+        emails = fetcher.get_emails(custom_query="is:unread")
+
+        assert [e.id for e in emails] == ['a', 'b']
+
+
+class TestGmailFetcherThreaded:
+    """Pruebas de la descarga de mensajes con hilos"""
+
+    def test_fetches_in_order_without_batch(self):
+        """Sin batch descarga cada mensaje y conserva el orden"""
+        service = FakeGmailService([make_message(str(i)) for i in range(20)])
+        fetcher = make_fetcher(service, use_batch=False, max_workers=4)
+
+        emails = fetcher.get_emails(custom_query="is:unread")
+
+        assert [e.id for e in emails] == [str(i) for i in range(20)]
+        assert service.batches == []
+
+    def test_skips_failed_messages(self):
+        """Omite los mensajes que fallan"""
+        service = FakeGmailService(
+            [make_message('a'), make_message('b'), make_message('c')],
+            failing={'a'}
+        )
+        fetcher = make_fetcher(service, use_batch=False)
+
+        emails = fetcher.get_emails(custom_query="is:unread")
+
+        assert [e.id for e in emails] == ['b', 'c']
+
+
+class TestExtractHeaders:
+    """Pruebas de la extracción de headers"""
+
+    def test_uses_defaults_for_missing_headers(self):
+        """Los headers ausentes toman su valor por defecto"""
+        headers = GmailFetcher._extract_headers([{'name': 'X-Otro', 'value': '1'}])
+
+        assert headers == {
+            'x-otro': '1', 'subject': 'Sin asunto', 'from': 'Desconocido', 'date': ''
+        }
+
+    def test_keeps_first_occurrence(self):
+        """Con headers repetidos se usa el primero"""
+        headers = GmailFetcher._extract_headers([
+            {'name': 'Subject', 'value': 'Primero'},
+            {'name': 'Subject', 'value': 'Segundo'},
+        ])
+
+        assert headers['subject'] == 'Primero'
+
+    def test_header_names_are_case_insensitive(self):
+        """Encuentra los headers sin importar mayúsculas"""
+        headers = GmailFetcher._extract_headers([
+            {'name': 'SUBJECT', 'value': 'Alerta'},
+            {'name': 'from', 'value': 'banco@test.com'},
+        ])
+
+        assert headers['subject'] == 'Alerta'
+        assert headers['from'] == 'banco@test.com'
+
+
+class TestEmailBody:
+    """Pruebas de la extracción del cuerpo"""
+
+    def test_truncates_long_body(self):
+        """Los cuerpos largos se recortan a MAX_BODY_CHARS"""
+        body = "ñá" * 5000
+        payload = make_message('x', body=body)['payload']
+
+        result = make_fetcher(None)._get_email_body(payload)
+
+        assert result == body[:MAX_BODY_CHARS]
+
+    def test_reads_text_plain_part(self):
+        """En mensajes multipart usa la parte text/plain"""
+        data = base64.urlsafe_b64encode("texto plano".encode('utf-8')).decode('ascii')
+        payload = {'parts': [
+            {'mimeType': 'text/html', 'body': {'data': data}},
+            {'mimeType': 'text/plain', 'body': {'data': data}},
+        ]}
+
+        assert make_fetcher(None)._get_email_body(payload) == "texto plano"
+
+    def test_metadata_only_fetch(self):
+        """Sin include_body solo se piden headers"""
+        service = FakeGmailService([make_message('x')])
+        requested = []
+        original_get = service.get
+
+        def get(**kwargs):
+            requested.append(kwargs)
+            return original_get(**kwargs)
+
+        service.get = get
+        make_fetcher(service).get_emails(custom_query="is:unread", include_body=False)
+
+        assert requested[0]['format'] == 'metadata'
+        assert set(requested[0]['metadataHeaders']) == {'Subject', 'From', 'Date'}
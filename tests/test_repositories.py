@@ -0,0 +1,191 @@
+"""
+Pruebas de los repositorios de correos procesados.
+"""
+
+import sqlite3
+
+import pytest
+
+from src.config import DatabaseConfig
+from src.core import Email, EmailClassification
+from src.repositories import SQLiteEmailRepository, InMemoryEmailRepository
+
+
+def make_email(email_id, subject="Asunto"):
+    return Email(id=email_id, subject=subject, sender="banco@test.com", body="Cuerpo")
+
+
+def make_classification(priority="normal"):
+    return EmailClassification(category="pago", priority=priority, summary="Resumen")
+
+
+@pytest.fixture
+def sqlite_repository(tmp_path):
+    """Repositorio SQLite sobre un archivo temporal"""
+    repository = SQLiteEmailRepository(DatabaseConfig(path=str(tmp_path / "emails.db")))
+    repository.init_database()
+    yield repository
+    repository.close()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def repository(request, sqlite_repository):
+    """Ambas implementaciones del repositorio"""
+    if request.param == "sqlite":
+        return sqlite_repository
+    memory = InMemoryEmailRepository()
+    memory.init_database()
+    return memory
+
+
+class TestProcessedIds:
+    """Pruebas de la consulta de correos ya procesados"""
+
+    def test_returns_only_processed_ids(self, repository):
+        """Retorna solo los ids guardados"""
+        repository.save_classification(make_email("1"), make_classification())
+        repository.save_classification(make_email("3"), make_classification())
+
+        assert repository.get_processed_ids(["1", "2", "3"]) == {"1", "3"}
+
+    def test_empty_input(self, repository):
+        """Sin ids no hay resultados"""
+        assert repository.get_processed_ids([]) == set()
+
+    def test_more_ids_than_query_limit(self, sqlite_repository):
+        """Divide la consulta cuando hay más ids que parámetros permitidos"""
+        count = SQLiteEmailRepository.MAX_QUERY_PARAMS + 10
+        for i in range(0, count, 2):
+            sqlite_repository.save_classification(make_email(str(i)), make_classification())
+
+        processed = sqlite_repository.get_processed_ids(str(i) for i in range(count))
+
+        assert processed == {str(i) for i in range(0, count, 2)}
+        assert all(sqlite_repository.is_processed(email_id) for email_id in processed)
+
+
+class TestConnection:
+    """Pruebas de la configuración de la conexión SQLite"""
+
+    def test_uses_wal_journal(self, sqlite_repository):
+        """La base se abre en modo WAL con synchronous=NORMAL"""
+        conn = sqlite_repository._get_connection()
+
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+
+class TestSaveClassifications:
+    """Pruebas del guardado en bloque"""
+
+    def test_saves_all_items(self, repository):
+        """Guarda todas las clasificaciones del lote"""
+        repository.save_classifications([
+            (make_email("1"), make_classification("urgente")),
+            (make_email("2"), make_classification("normal")),
+        ])
+
+        assert repository.get_processed_ids(["1", "2"]) == {"1", "2"}
+
+    def test_failed_batch_saves_nothing(self, sqlite_repository):
+        """Si una fila falla, no se guarda ninguna del lote"""
+        broken = Email(id=None, subject="x", sender="x", body="x")
+
+        with pytest.raises(Exception):
+            sqlite_repository.save_classifications([
+                (make_email("1"), make_classification()),
+                (broken, make_classification()),
+            ])
+
+        assert not sqlite_repository.is_processed("1")
+
+
+class TestDailyStats:
+    """Pruebas de las estadísticas diarias"""
+
+    def test_returns_only_rows_of_the_day(self, sqlite_repository):
+        """Filtra por el día de processed_at, ordenado por prioridad"""
+        sqlite_repository.save_classifications([
+            (make_email("1", "Bajo"), make_classification("sin_prioridad")),
+            (make_email("2", "Urgente"), make_classification("urgente")),
+            (make_email("3", "Ayer"), make_classification("urgente")),
+        ])
+        conn = sqlite_repository._get_connection()
+        with conn:
+            conn.execute("UPDATE processed_emails SET processed_at = '2024-01-01 23:59:59'")
+            conn.execute(
+                "UPDATE processed_emails SET processed_at = '2023-12-31 23:59:59' "
+                "WHERE gmail_id = '3'"
+            )
+
+        rows = sqlite_repository.get_daily_stats("2024-01-01")
+
+        assert [row['subject'] for row in rows] == ["Urgente", "Bajo"]
+
+    def test_adds_priority_rank_to_existing_database(self, tmp_path):
+        """Una base sin priority_rank se migra y ordena igual"""
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE processed_emails (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "gmail_id TEXT UNIQUE NOT NULL, subject TEXT, sender TEXT, category TEXT, "
+            "priority TEXT, summary TEXT, amount TEXT, "
+            "processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, notified BOOLEAN DEFAULT 0)"
+        )
+        conn.executemany(
+            "INSERT INTO processed_emails (gmail_id, subject, priority, processed_at) "
+            "VALUES (?, ?, ?, '2024-01-01 10:00:00')",
+            [("1", "Bajo", "sin_prioridad"), ("2", "Normal", "normal"), ("3", "Urgente", "urgente")]
+        )
+        conn.commit()
+        conn.close()
+
+        repository = SQLiteEmailRepository(DatabaseConfig(path=path))
+        repository.init_database()
+        rows = repository.get_daily_stats("2024-01-01")
+        repository.close()
+
+        assert [row['subject'] for row in rows] == ["Urgente", "Normal", "Bajo"]
+
+    def test_iter_rows_are_accessible_by_name(self, sqlite_repository):
+        """iter_daily_stats recorre las mismas filas que get_daily_stats"""
+        sqlite_repository.save_classifications([
+            (make_email("1", "Aviso"), make_classification("normal")),
+            (make_email("2", "Pago"), make_classification("urgente")),
+        ])
+        conn = sqlite_repository._get_connection()
+        with conn:
+            conn.execute("UPDATE processed_emails SET processed_at = '2024-01-01 10:00:00'")
+
+        rows = sqlite_repository.iter_daily_stats("2024-01-01")
+
+        assert [(row['priority'], row['subject']) for row in rows] == [
+            ("urgente", "Pago"), ("normal", "Aviso")
+        ]
+        assert sqlite_repository.get_daily_stats("2024-01-01")[0]['subject'] == "Pago"
+
+    def test_uses_processed_at_index(self, sqlite_repository):
+        """La consulta por día puede usar el índice de processed_at"""
+        plan = sqlite_repository._get_connection().execute(
+            "EXPLAIN QUERY PLAN SELECT subject FROM processed_emails "
+            "WHERE processed_at >= ? AND processed_at < ?",
+            ("2024-01-01", "2024-01-02")
+        ).fetchall()
+
+        assert any("idx_processed_at" in row[-1] for row in plan)
+
+
+class TestSyncState:
+    """Pruebas del estado de sincronización"""
+
+    def test_missing_key_returns_none(self, repository):
+        """Una clave no guardada retorna None"""
+        assert repository.get_sync_state("gmail_history_id") is None
+
+    def test_set_replaces_previous_value(self, repository):
+        """Guardar de nuevo reemplaza el valor"""
+        repository.set_sync_state("gmail_history_id", "100")
+        repository.set_sync_state("gmail_history_id", "200")
+
+        assert repository.get_sync_state("gmail_history_id") == "200"
+